@@ -49,9 +49,79 @@ class Settings(BaseSettings):
         else:
             return "https://api.openai.com/v1/chat/completions"
 
-    # Almacenamiento
+    # Generación de propuestas: "single" (una llamada y luego PDF),
+    # "streaming" (se maqueta el PDF mientras el LLM genera) o
+    # "sections" (una llamada por sección, en paralelo)
+    PROPOSAL_MODE: str = os.getenv("PROPOSAL_MODE", "single")
+    PROPOSAL_SECTION_CONCURRENCY: int = int(
+        os.getenv("PROPOSAL_SECTION_CONCURRENCY", "4")
+    )
+
+    # Presentación de preguntas: "llm" (el LLM formula cada pregunta) o "local"
+    # (se arman desde el cuestionario y el LLM solo se usa para aclaraciones)
+    QUESTION_MODE: str = os.getenv("QUESTION_MODE", "llm")
+
+    # Prefetch especulativo: tras una pregunta de opción múltiple se precalcula
+    # el siguiente turno para las SPECULATIVE_MAX_OPTIONS opciones más elegidas
+    SPECULATIVE_PREFETCH: bool = os.getenv("SPECULATIVE_PREFETCH", "False").lower() in (
+        "true",
+        "1",
+        "t",
+    )
+    SPECULATIVE_MAX_OPTIONS: int = int(os.getenv("SPECULATIVE_MAX_OPTIONS", "2"))
+    SPECULATIVE_MAX_IN_FLIGHT: int = int(os.getenv("SPECULATIVE_MAX_IN_FLIGHT", "8"))
+
+    # Respuestas recientes guardadas por idempotency_key (reintentos del cliente)
+    IDEMPOTENCY_CACHE_SIZE: int = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "1000"))
+
+    # Control de admisión de peticiones que llaman al LLM: máximo en curso, cola
+    # de espera (lugares y segundos) y límite por IP (token bucket)
+    LLM_MAX_IN_FLIGHT: int = int(os.getenv("LLM_MAX_IN_FLIGHT", "8"))
+    LLM_MAX_QUEUE: int = int(os.getenv("LLM_MAX_QUEUE", "16"))
+    LLM_QUEUE_TIMEOUT: float = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))
+    RATE_LIMIT_PER_MINUTE: float = float(os.getenv("RATE_LIMIT_PER_MINUTE", "30"))
+    RATE_LIMIT_BURST: int = int(os.getenv("RATE_LIMIT_BURST", "10"))
+    # IPs de los proxies de confianza (separadas por comas): solo si la petición
+    # llega de uno de ellos se usa X-Forwarded-For para identificar al cliente
+    TRUSTED_PROXIES: List[str] = [
+        ip.strip() for ip in os.getenv("TRUSTED_PROXIES", "").split(",") if ip.strip()
+    ]
+
+    # Almacenamiento: "memory" (un solo worker) o "redis" (estado compartido
+    # entre workers e instancias)
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "memory")
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
     CONVERSATION_TIMEOUT: int = 60 * 60 * 24  # 24 horas
+
+    # Compresión de respuestas (br si está instalado brotli-asgi, si no gzip) a
+    # partir de COMPRESSION_MIN_SIZE bytes
+    COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1000"))
+    # Caché del navegador para la estructura del cuestionario (segundos)
+    QUESTIONNAIRE_CACHE_MAX_AGE: int = int(
+        os.getenv("QUESTIONNAIRE_CACHE_MAX_AGE", str(60 * 60 * 24))
+    )
     UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "uploads")
+    # Tamaño máximo de un documento subido y tamaño de los bloques de escritura
+    MAX_UPLOAD_SIZE: int = int(os.getenv("MAX_UPLOAD_SIZE", str(20 * 1024 * 1024)))
+    UPLOAD_CHUNK_SIZE: int = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+    # Análisis de documentos en segundo plano: workers y documentos en cola
+    DOCUMENT_WORKERS: int = int(os.getenv("DOCUMENT_WORKERS", "2"))
+    DOCUMENT_QUEUE_SIZE: int = int(os.getenv("DOCUMENT_QUEUE_SIZE", "32"))
+    # Resultados de extracción guardados por sha256 del documento
+    EXTRACTION_CACHE_SIZE: int = int(os.getenv("EXTRACTION_CACHE_SIZE", "256"))
+    # Cada cuánto (s) se eliminan los documentos de conversaciones caducadas
+    DOCUMENT_SWEEP_INTERVAL: int = int(os.getenv("DOCUMENT_SWEEP_INTERVAL", "300"))
+
+    # Retroalimentación: se encola en memoria y se escribe por lotes en un JSONL
+    FEEDBACK_LOG: str = os.getenv(
+        "FEEDBACK_LOG", os.path.join(UPLOAD_DIR, "feedback", "feedback.jsonl")
+    )
+    FEEDBACK_BATCH_SIZE: int = int(os.getenv("FEEDBACK_BATCH_SIZE", "100"))
+    FEEDBACK_FLUSH_INTERVAL: float = float(os.getenv("FEEDBACK_FLUSH_INTERVAL", "2"))
+    FEEDBACK_QUEUE_SIZE: int = int(os.getenv("FEEDBACK_QUEUE_SIZE", "10000"))
+    # Token (cabecera X-Admin-Token) de los endpoints de administración; vacío
+    # los deshabilita
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
 
 
 # Crear instancia de configuración
@@ -1,11 +1,20 @@
 # app/main.py
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 import uvicorn
 import logging
 
-from app.routes import chat, documents, feedback
+from app.routes import chat, documents, feedback, questionnaire
 from app.config import settings
+from app.utils.prompt_cache import prompt_cache_stats
+from app.services.admission_control import admission_controller
+from app.services.document_analysis import document_analysis_queue
+from app.services.feedback_service import feedback_log
+from app.utils.alerts import notification_dispatcher
 
 # Configuración de logging
 logging.basicConfig(
@@ -14,11 +23,30 @@ logging.basicConfig(
 )
 logger = logging.getLogger("hydrous")
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Workers del análisis de documentos en segundo plano
+    await document_analysis_queue.start()
+    # Escritura por lotes de la retroalimentación
+    await feedback_log.start()
+    # Envío de alertas (incluidas las encoladas antes de arrancar)
+    await notification_dispatcher.start()
+    yield
+    await document_analysis_queue.stop()
+    await feedback_log.stop()
+    # Correos pendientes de alertas y notificaciones
+    await notification_dispatcher.stop()
+
+
 # Inicializar aplicación
 app = FastAPI(
     title="Hydrous AI Chatbot API",
     description="Backend para el chatbot de soluciones de agua Hydrous",
     version="1.0.0",
+    # orjson serializa las respuestas más rápido que el codificador JSON estándar
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
 # Configurar CORS
@@ -31,6 +59,17 @@ app.add_middleware(
     expose_headers=["Content-Disposition"],  # Importante para las descargas
 )
 
+# Compresión de respuestas grandes (markdown de las respuestas, cuestionario).
+# Brotli es opcional: con brotli-asgi instalado se usa br y gzip como respaldo
+try:
+    from brotli_asgi import BrotliMiddleware
+
+    app.add_middleware(
+        BrotliMiddleware, minimum_size=settings.COMPRESSION_MIN_SIZE, gzip_fallback=True
+    )
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=settings.COMPRESSION_MIN_SIZE)
+
 # Incluir rutas
 app.include_router(chat.router, prefix=f"{settings.API_V1_STR}/chat", tags=["chat"])
 app.include_router(
@@ -39,12 +78,25 @@ app.include_router(
 app.include_router(
     feedback.router, prefix=f"{settings.API_V1_STR}/feedback", tags=["feedback"]
 )
+app.include_router(
+    questionnaire.router,
+    prefix=f"{settings.API_V1_STR}/questionnaire",
+    tags=["questionnaire"],
+)
 
 
 @app.get(f"{settings.API_V1_STR}/health")
 async def health_check():
     """Endpoint para verificar que la API está funcionando"""
-    return {"status": "ok", "version": app.version}
+    return {
+        "status": "ok",
+        "version": app.version,
+        "prompt_cache": prompt_cache_stats.snapshot(),
+        "admission": admission_controller.snapshot(),
+        "documents": document_analysis_queue.snapshot(),
+        "feedback": feedback_log.snapshot(),
+        "notifications": notification_dispatcher.snapshot(),
+    }
 
 
 if __name__ == "__main__":
@@ -1,39 +1,175 @@
 # app/models/conversation.py
-from pydantic import BaseModel, Field
+from collections.abc import MutableMapping
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import Any, Dict, Iterator, List, Optional
 import uuid
 
-from app.models.message import Message
-
-# Quitar: from app.models.conversation_state import ConversationState
-
-
-class Conversation(BaseModel):
-    """Representa una conversación completa."""
-
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    messages: List[Message] = Field(default_factory=list)
-    # --- Cambiar state por metadata simple ---
-    # Quitar: state: ConversationState = Field(default_factory=ConversationState)
-    metadata: Dict[str, Any] = Field(
-        default_factory=lambda: {
-            "current_question_id": None,
-            "collected_data": {},
-            "selected_sector": None,
-            "selected_subsector": None,
-            "questionnaire_path": [],  # Podemos seguir usando esto para referencia
-            "is_complete": False,
-            "has_proposal": False,
-            "proposal_text": None,
-            "pdf_path": None,
-            "client_name": "Cliente",
-            "last_error": None,
-            # Puedes añadir más campos según necesites
-        }
+from pydantic import BaseModel
+
+from app.models.message import (
+    Message,
+    MessageResponse,
+    datetime_to_ms,
+    ms_to_datetime,
+    now_ms,
+)
+
+# Valores iniciales de la metadata de una conversación nueva
+DEFAULT_METADATA = {
+    "current_question_id": None,
+    "collected_data": {},
+    "selected_sector": None,
+    "selected_subsector": None,
+    "questionnaire_path": [],
+    "is_complete": False,
+    "has_proposal": False,
+    "proposal_text": None,
+    "pdf_path": None,
+    "client_name": "Cliente",
+    "last_error": None,
+}
+
+
+class ConversationMetadata(MutableMapping):
+    """
+    Metadata tipada de una conversación. Se usa como un dict (get, [], update...)
+    pero las claves conocidas se guardan en __slots__; las demás van a `_extra`.
+    Una clave conocida sin asignar se comporta como ausente.
+    """
+
+    current_question_id: Optional[str]
+    current_question_asked_summary: Optional[str]
+    collected_data: Dict[str, Any]
+    response_summaries: Dict[str, Dict[str, str]]
+    digest: Dict[str, str]
+    selected_sector: Optional[str]
+    selected_subsector: Optional[str]
+    questionnaire_path: List[str]
+    is_complete: bool
+    has_proposal: bool
+    proposal_text: Optional[str]
+    pdf_path: Optional[str]
+    client_name: str
+    last_error: Optional[str]
+    used_insights: List[str]
+    documents: Dict[str, Dict[str, Any]]
+    document_facts: Dict[str, Dict[str, Any]]
+
+    # Explícito: con PEP 649/749 (Python 3.14) __annotations__ ya no existe en
+    # el cuerpo de la clase mientras se define
+    FIELDS = (
+        "current_question_id",
+        "current_question_asked_summary",
+        "collected_data",
+        "response_summaries",
+        "digest",
+        "selected_sector",
+        "selected_subsector",
+        "questionnaire_path",
+        "is_complete",
+        "has_proposal",
+        "proposal_text",
+        "pdf_path",
+        "client_name",
+        "last_error",
+        "used_insights",
+        "documents",
+        "document_facts",
     )
-    # --------------------------------------
+    __slots__ = FIELDS + ("_extra",)
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None, **kwargs):
+        self._extra: Optional[Dict[str, Any]] = None
+        if data is None and not kwargs:
+            # Valores por defecto, con copia de los contenedores para no compartirlos
+            for key, value in DEFAULT_METADATA.items():
+                self[key] = value.copy() if isinstance(value, (dict, list)) else value
+            return
+        for key, value in dict(data or {}, **kwargs).items():
+            self[key] = value
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self.FIELDS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key: str, value: Any):
+        if key in self.FIELDS:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key: str):
+        if key in self.FIELDS:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is not None:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        for key in self.FIELDS:
+            if hasattr(self, key):
+                yield key
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.items())
+
+    def __repr__(self) -> str:
+        return repr(self.to_dict())
+
+
+class Conversation:
+    """
+    Representa una conversación completa (uso interno, con __slots__). La fecha
+    de creación se guarda como milisegundos; en la API se usa ConversationResponse.
+    """
+
+    __slots__ = ("id", "ts", "messages", "_metadata")
+
+    def __init__(
+        self,
+        id: Optional[str] = None,
+        created_at: Optional[datetime] = None,
+        messages: Optional[List[Message]] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        ts: Optional[int] = None,
+    ):
+        self.id = id or str(uuid.uuid4())
+        if ts is None:
+            ts = datetime_to_ms(created_at) if created_at else now_ms()
+        self.ts = ts
+        self.messages: List[Message] = messages if messages is not None else []
+        self.metadata = metadata
+
+    @property
+    def created_at(self) -> datetime:
+        return ms_to_datetime(self.ts)
+
+    @property
+    def metadata(self) -> ConversationMetadata:
+        return self._metadata
+
+    @metadata.setter
+    def metadata(self, value: Optional[Dict[str, Any]]):
+        if not isinstance(value, ConversationMetadata):
+            value = ConversationMetadata(value)
+        self._metadata = value
 
     def add_message(self, message: Message):
         """Añade un mensaje a la conversación."""
@@ -43,14 +179,11 @@ class Conversation(BaseModel):
         # if len(self.messages) > MAX_HISTORY:
         #     self.messages = self.messages[-MAX_HISTORY:]
 
-    class Config:
-        allow_mutation = True
-
 
 # Modelo para la respuesta al iniciar o cargar una conversación
 class ConversationResponse(BaseModel):
     id: str
     created_at: datetime
-    messages: List[Message]
+    messages: List[MessageResponse]
     # Quitar state: Optional[ConversationState] = None
     metadata: Optional[Dict[str, Any]] = None  # Mantener metadata
@@ -1,20 +1,66 @@
 # app/models/message.py
-from pydantic import BaseModel, Field
-from datetime import datetime
-from typing import Literal, Optional  # Asegúrate que Optional esté importado
+import sys
+import time
 import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Sequence, Tuple
 
+from pydantic import BaseModel
 
-class Message(BaseModel):
-    """Representa un único mensaje dentro de una conversación."""
+# Roles válidos de un mensaje
+ROLES = ("user", "assistant", "system")
 
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    # Quitar conversation_id de aquí si no lo usas o mantenerlo si lo necesitas
-    # conversation_id: Optional[str] = None
-    role: Literal["user", "assistant", "system"]
-    content: str
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    # Otros campos opcionales como 'metadata', 'token_count', etc. podrían ir aquí
+
+def now_ms() -> int:
+    """Instante actual en milisegundos desde epoch (UTC)."""
+    return time.time_ns() // 1_000_000
+
+
+def ms_to_datetime(ts: int) -> datetime:
+    """Milisegundos desde epoch → datetime UTC sin zona horaria (como utcnow)."""
+    return datetime.fromtimestamp(ts / 1000, tz=timezone.utc).replace(tzinfo=None)
+
+
+def datetime_to_ms(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+class Message:
+    """
+    Registro compacto de un mensaje (uso interno). Usa __slots__, el rol como
+    cadena internada, el id como entero de 128 bits y la fecha como milisegundos;
+    `id` y `created_at` se exponen como str y datetime. En la API se usa
+    MessageResponse.
+    """
+
+    __slots__ = ("_uid", "role", "content", "ts")
+
+    def __init__(
+        self,
+        role: str,
+        content: str,
+        id: Optional[str] = None,
+        created_at: Optional[datetime] = None,
+        ts: Optional[int] = None,
+    ):
+        if role not in ROLES:
+            raise ValueError(f"Rol de mensaje inválido: {role}")
+        self.role = sys.intern(role)
+        self.content = content
+        self._uid = uuid.UUID(id).int if id else uuid.uuid4().int
+        if ts is None:
+            ts = datetime_to_ms(created_at) if created_at else now_ms()
+        self.ts = ts
+
+    @property
+    def id(self) -> str:
+        return str(uuid.UUID(int=self._uid))
+
+    @property
+    def created_at(self) -> datetime:
+        return ms_to_datetime(self.ts)
 
     @classmethod
     def user(cls, content: str):
@@ -26,11 +72,59 @@ class Message(BaseModel):
         """Método de fábrica para crear un mensaje de asistente."""
         return cls(role="assistant", content=content)
 
-    class Config:
-        allow_mutation = True  # Permite modificar el objeto después de crearlo
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "role": self.role,
+            "content": self.content,
+            "ts": self.ts,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Message":
+        return cls(
+            role=data["role"], content=data["content"], id=data["id"], ts=data["ts"]
+        )
+
+    def to_row(self) -> Tuple[bytes, str, str, int]:
+        """Forma compacta para serializar: (uuid en 16 bytes, rol, texto, ts)."""
+        return (self._uid.to_bytes(16, "big"), self.role, self.content, self.ts)
+
+    @classmethod
+    def from_row(cls, row: Sequence[Any]) -> "Message":
+        uid, role, content, ts = row
+        if role not in ROLES:
+            raise ValueError(f"Rol de mensaje inválido: {role}")
+        # Sin pasar por __init__: el id ya existe y no hay que generar otro
+        message = cls.__new__(cls)
+        message._uid = int.from_bytes(uid, "big")
+        message.role = sys.intern(role)
+        message.content = content
+        message.ts = ts
+        return message
+
+    def __repr__(self) -> str:
+        return f"Message(role={self.role!r}, content={self.content[:40]!r})"
+
+
+class MessageResponse(BaseModel):
+    """Mensaje tal como se devuelve en la API."""
+
+    id: str
+    role: str
+    content: str
+    created_at: datetime
+
+    @classmethod
+    def from_message(cls, message: Message) -> "MessageResponse":
+        return cls(
+            id=message.id,
+            role=message.role,
+            content=message.content,
+            created_at=message.created_at,
+        )
 
 
-# --- AÑADIR ESTA CLASE AQUÍ ---
 class MessageCreate(BaseModel):
     """
     Modelo Pydantic para validar el cuerpo de la solicitud
@@ -39,8 +133,8 @@ class MessageCreate(BaseModel):
 
     conversation_id: str
     message: str
+    # Clave opcional del cliente: un reintento con la misma clave devuelve la
+    # respuesta ya generada en lugar de procesar el mensaje otra vez
+    idempotency_key: Optional[str] = None
     # Puedes añadir otros campos si tu frontend los envía,
     # por ejemplo: user_id, session_id, etc.
-
-
-# -----------------------------
@@ -37,19 +37,11 @@ def load_proposal_format_content():
         return "[ERROR AL CARGAR FORMATO PROPUESTA]"
 
 
-def get_llm_driven_master_prompt(metadata: dict = None):
-    """
-    Genera el prompt maestro para que el LLM maneje el flujo del cuestionario.
-    Versión mejorada con tono consultivo y formato atractivo.
-    """
-    if metadata is None:
-        metadata = {}
-
-    # Cargar contenidos
-    full_questionnaire_text = load_questionnaire_content_for_prompt()
-    proposal_format_text = load_proposal_format_content()
-
-    system_prompt_template = """
+# --- Prefijo estático ---
+# Todo lo que no cambia entre turnos va primero y es idéntico byte a byte en cada
+# llamada, para que el proveedor pueda reutilizar su caché de prefijos de prompt.
+# El estado actual (sector, última pregunta...) va en un sufijo dinámico aparte.
+STATIC_PROMPT_TEMPLATE = """
 # **YOU ARE THE HYDROUS AI WATER SOLUTION DESIGNER**
 
 You are a friendly and professional expert water solutions consultant who guides users in developing customized wastewater treatment and recycling solutions. Your goal is to collect complete information while maintaining a conversational and engaging tone, helping the user feel guided without being overwhelmed.
@@ -65,8 +57,8 @@ You will communicate primarily in English. If users request to speak in another
 1. **Personalized confirmation** of the previous answer (if applicable)  
    - Vary your confirmations: "I understand that...", "Thanks for indicating that...", "Great choice with..."
 
-2. **Educational insight** relevant to the user’s specific sector  
-   > 💧 **Relevant fact:** [Include a specific statistic related to their industry]
+2. **DO NOT write statistics or a "Relevant fact" block**  
+   - A verified fact for the user’s sector is inserted automatically before your question
 
 3. **ONLY ONE QUESTION** from the questionnaire, preceded by "**QUESTION:**" in bold  
    - For multiple-choice questions, present numbered options (1, 2, 3…)  
@@ -81,7 +73,6 @@ You will communicate primarily in English. If users request to speak in another
 * Use strategic emojis (💧 📊 💰 ♻️ 🔍 📌) for different types of information  
 * Apply varied formatting with **bold** for key concepts and *italics* for emphasis  
 * Adopt the tone of an expert consultant, not just an interviewer  
-* Include specific numerical data in your insights (percentages, ranges, efficiencies)  
 * Every 3-4 questions, provide a short summary of the information collected so far
 
 ## **QUESTIONNAIRE SEQUENCE**
@@ -93,20 +84,13 @@ You will communicate primarily in English. If users request to speak in another
 ## **ANSWER HANDLING**
 * When the user responds with a number, confirm their specific choice  
 * If the user doesn't provide specific data, suggest typical ranges for their industry  
-* Adapt your insights to the user’s location when mentioned (local regulations, etc.)
-
-## **CURRENT STATE (Reference)**
-- Selected Sector: {metadata_selected_sector}  
-- Selected Subsector: {metadata_selected_subsector}  
-- Last Question Asked: {metadata_current_question_asked_summary}  
-- User’s Last Answer: "{last_user_message_placeholder}"  
-- Is Questionnaire Complete?: {metadata_is_complete}
+* Adapt your comments to the user’s location when mentioned (local regulations, etc.)
 
 ## **REFERENCE QUESTIONNAIRE**
-{full_questionnaire_text_placeholder}
+{full_questionnaire_text}
 
 ## **PROPOSAL TEMPLATE**
-{proposal_format_text_placeholder}
+{proposal_format_text}
 
 ## **FINAL PROPOSAL GENERATION**
 * Once the questionnaire is completed, DO NOT generate the proposal directly in the chat  
@@ -115,9 +99,46 @@ You will communicate primarily in English. If users request to speak in another
 * Do not include the proposal in the chat – only indicate it has been completed  
 * This special marker is CRITICAL to trigger the automatic PDF generation
 
-**FINAL INSTRUCTION:** Analyze the user’s response, provide a relevant educational insight for their sector, and ask ONE FOLLOW-UP question from the questionnaire. If the questionnaire is complete, generate the final proposal using the specified format.
+**FINAL INSTRUCTION:** Analyze the user’s response, confirm it briefly, and ask ONE FOLLOW-UP question from the questionnaire. If the questionnaire is complete, generate the final proposal using the specified format.
+"""
+
+DYNAMIC_STATE_TEMPLATE = """## **CURRENT STATE (Reference)**
+- Selected Sector: {metadata_selected_sector}  
+- Selected Subsector: {metadata_selected_subsector}  
+- Last Question Asked: {metadata_current_question_asked_summary}  
+- User’s Last Answer: "{last_user_message_placeholder}"  
+- Is Questionnaire Complete?: {metadata_is_complete}
 """
 
+
+_static_prompt_prefix = None
+
+
+def get_static_prompt_prefix() -> str:
+    """
+    Prefijo estático del prompt maestro. Los archivos se leen una sola vez; si la
+    carga falla no se guarda el resultado para reintentar en la siguiente llamada.
+    """
+    global _static_prompt_prefix
+    if _static_prompt_prefix is None:
+        prefix = STATIC_PROMPT_TEMPLATE.format(
+            full_questionnaire_text=load_questionnaire_content_for_prompt(),
+            proposal_format_text=load_proposal_format_content(),
+        )
+        if "[ERROR" in prefix:
+            return prefix
+        _static_prompt_prefix = prefix
+    return _static_prompt_prefix
+
+
+def get_dynamic_state_suffix(metadata: dict = None, extra_context: str = "") -> str:
+    """
+    Sufijo dinámico con el estado actual de la conversación. extra_context se
+    añade al final (p.ej. el resumen de respuestas anteriores).
+    """
+    if metadata is None:
+        metadata = {}
+
     # Definir variables antes de usarlas en format
     metadata_selected_sector = metadata.get("selected_sector", "Aún no determinado")
     metadata_selected_subsector = metadata.get(
@@ -134,22 +155,30 @@ You will communicate primarily in English. If users request to speak in another
         metadata.get("last_user_message_content", "N/A") or "N/A"
     )
 
-    # Formatear el prompt final
+    suffix = DYNAMIC_STATE_TEMPLATE.format(
+        metadata_selected_sector=metadata_selected_sector,
+        metadata_selected_subsector=metadata_selected_subsector,
+        metadata_current_question_asked_summary=metadata_current_question_asked_summary,
+        metadata_is_complete=metadata_is_complete,
+        last_user_message_placeholder=last_user_message_placeholder,
+    )
+    if extra_context:
+        suffix += f"\n{extra_context}\n"
+    return suffix
+
+
+def get_llm_driven_master_prompt(metadata: dict = None):
+    """
+    Genera el prompt maestro para que el LLM maneje el flujo del cuestionario.
+    Versión mejorada con tono consultivo y formato atractivo.
+
+    Devuelve el prefijo estático seguido del estado actual. Para aprovechar la
+    caché de prompts, ai_service envía ambas partes como mensajes separados.
+    """
     try:
-        system_prompt = system_prompt_template.format(
-            metadata_selected_sector=metadata_selected_sector,
-            metadata_selected_subsector=metadata_selected_subsector,
-            metadata_current_question_asked_summary=metadata_current_question_asked_summary,
-            metadata_is_complete=metadata_is_complete,
-            full_questionnaire_text_placeholder=full_questionnaire_text,
-            proposal_format_text_placeholder=proposal_format_text,
-            last_user_message_placeholder=last_user_message_placeholder,
-        )
+        return f"{get_static_prompt_prefix()}\n{get_dynamic_state_suffix(metadata)}"
     except KeyError as e:
         logger.error(
             f"Falta una clave al formatear el prompt principal: {e}", exc_info=True
         )
-
-        system_prompt = f"# ROLE AND OBJECTIVE...\n\n# INSTRUCTION:\nContinue the conversation. Error formatting status: {e}"
-
-    return system_prompt
+        return f"# ROLE AND OBJECTIVE...\n\n# INSTRUCTION:\nContinue the conversation. Error formatting status: {e}"
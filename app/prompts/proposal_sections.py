@@ -0,0 +1,183 @@
+# app/prompts/proposal_sections.py
+"""
+Formato de la propuesta dividido en secciones.
+
+Se usa tanto para el prompt de una sola llamada como para la generación por
+secciones en paralelo. Cada sección tiene su formato y un contenido de
+emergencia que se usa si la IA falla en esa sección; el de las secciones con
+datos del cliente es neutro (NOT_AVAILABLE), nunca cifras de ejemplo que se
+confundan con las reales. Las secciones "static" no requieren llamada a la IA.
+"""
+
+from typing import Iterable
+
+PROPOSAL_HEADER = (
+    "**Hydrous Management Group -- AI-Generated Wastewater Treatment Proposal**"
+)
+
+PROPOSAL_FOOTER = "Contact: info@hydrous.com | www.hydrous.com | +52 55 1234 5678"
+
+# Contenido de emergencia de las secciones con datos del cliente
+NOT_AVAILABLE = "Información no disponible; se completará en la revisión técnica."
+
+# Para reanudar una propuesta cuyo streaming se cortó
+CONTINUATION_PROMPT = (
+    "La respuesta anterior se cortó. Continúa la propuesta exactamente a partir de "
+    "la línea siguiente, con el mismo formato, sin repetir nada de lo ya escrito."
+)
+
+PROPOSAL_SECTIONS = [
+    {
+        "id": "disclaimer",
+        "title": "**Important Disclaimer**",
+        "format": "[Breve disclaimer de 2 líneas máximo]",
+        "fallback": (
+            "Esta propuesta fue generada con IA a partir de la información proporcionada. "
+            "Las cifras son estimaciones preliminares y deben validarse con ingeniería de detalle."
+        ),
+    },
+    {
+        "id": "introduction",
+        "title": "**1. Introduction to Hydrous Management Group**",
+        "format": "[Máximo 3 párrafos cortos sobre la empresa]",
+        "fallback": (
+            "Hydrous Management Group se especializa en soluciones de tratamiento de agua "
+            "personalizadas utilizando tecnologías avanzadas y sostenibles."
+        ),
+    },
+    {
+        "id": "background",
+        "title": "**2. Project Background**",
+        "format": """| **Client Information** | **Details** |
+| ------------------ | --------------- |
+| **Client Name** | [Nombre específico] |
+| **Location** | [Ubicación] |
+| **Industry** | [Sector] |
+| **Water Source** | [Fuente] |
+| **Current Water Consumption** | [X m³/día] |
+| **Current Wastewater Generation** | [Y m³/día] |
+| **Existing Treatment System** | [Sistema o "No existing treatment"] |""",
+        "fallback": NOT_AVAILABLE,
+    },
+    {
+        "id": "objectives",
+        "title": "**3. Objective of the Project**",
+        "format": """✓ **Regulatory Compliance** -- [1 frase específica]
+✓ **Cost Optimization** -- [1 frase específica]
+✓ **Water Reuse** -- [1 frase específica]
+✓ **Sustainability** -- [1 frase específica]""",
+        "fallback": """✓ **Regulatory Compliance** -- Cumplir con la normativa de descarga aplicable.
+✓ **Cost Optimization** -- Reducir el costo de agua y de descarga.
+✓ **Water Reuse** -- Reutilizar el agua tratada en usos no potables.
+✓ **Sustainability** -- Disminuir el consumo de agua fresca.""",
+    },
+    {
+        "id": "parameters",
+        "title": "**4. Key Design Parameters**",
+        "format": """| **Parameter** | **Current Value** | **Target Value** |
+| ------------- | --------------- | ---------------- |
+| **TSS (mg/L)** | [valor] | [valor] |
+| **COD (mg/L)** | [valor] | [valor] |
+| **BOD (mg/L)** | [valor] | [valor] |
+| **pH** | [valor] | [valor] |""",
+        "fallback": NOT_AVAILABLE,
+    },
+    {
+        "id": "process",
+        "title": "**5. Recommended Treatment Process**",
+        "format": """| **Treatment Stage** | **Technology** | **Function** |
+| ------------------ | ------------- | ------------ |
+| **Primary** | [tecnología específica] | [función principal] |
+| **Secondary** | [tecnología específica] | [función principal] |
+| **Tertiary** | [tecnología específica] | [función principal] |
+| **Final** | [tecnología específica] | [función principal] |""",
+        "fallback": NOT_AVAILABLE,
+    },
+    {
+        "id": "equipment",
+        "title": "**6. Equipment Specifications**",
+        "format": """| **Equipment** | **Capacity** | **Est. Cost (USD)** |
+| ------------- | ------------ | ------------------ |
+| [Equipo 1] | [capacidad] | [costo] |
+| [Equipo 2] | [capacidad] | [costo] |
+| [Equipo 3] | [capacidad] | [costo] |
+| [Equipo 4] | [capacidad] | [costo] |""",
+        "fallback": NOT_AVAILABLE,
+    },
+    {
+        "id": "financials",
+        "title": "**7. Financial Summary**",
+        "format": """**CAPEX: $[valor total] USD**
+- Equipment: $[valor] USD
+- Installation: $[valor] USD
+- Engineering: $[valor] USD
+
+**Monthly OPEX: $[valor total] USD**
+- Chemicals: $[valor] USD
+- Energy: $[valor] USD
+- Labor: $[valor] USD
+- Maintenance: $[valor] USD""",
+        "fallback": (
+            "El CAPEX y OPEX detallados se entregarán tras la validación técnica del proyecto."
+        ),
+    },
+    {
+        "id": "roi",
+        "title": "**8. Return on Investment Analysis**",
+        "format": """- Current water cost: $[valor] USD/month
+- Projected water cost: $[valor] USD/month
+- Monthly savings: $[valor] USD
+- ROI period: [X] years""",
+        "fallback": (
+            "El análisis de retorno de inversión se calculará con los costos de agua confirmados."
+        ),
+    },
+    {
+        "id": "next_steps",
+        "title": "**9. Next Steps**",
+        "format": """1. Technical validation meeting
+2. Site assessment
+3. Detailed engineering proposal
+4. Implementation schedule""",
+        "static": True,
+    },
+]
+
+
+def build_proposal_format(
+    exclude: Iterable[str] = (), include_footer: bool = True
+) -> str:
+    """
+    Formato de la propuesta (encabezado, secciones y contacto). Las secciones cuyo
+    id está en exclude se omiten, p.ej. las que se añaden ya calculadas.
+    """
+    excluded = set(exclude)
+    blocks = [PROPOSAL_HEADER]
+    for section in PROPOSAL_SECTIONS:
+        if section["id"] not in excluded:
+            blocks.append(f"{section['title']}\n{section['format']}")
+    if include_footer:
+        blocks.append(PROPOSAL_FOOTER)
+    return "\n\n".join(blocks)
+
+
+def build_section_prompt(section: dict, conversation_text: str) -> str:
+    """Prompt para generar UNA sección de la propuesta de forma independiente."""
+    return f"""
+# ESCRIBE UNA SECCIÓN DE UNA PROPUESTA PROFESIONAL DE TRATAMIENTO DE AGUA
+
+Basándote en la conversación:
+{conversation_text}
+
+## INSTRUCCIONES CRÍTICAS:
+1. Escribe ÚNICAMENTE la sección "{section['title'].strip('*')}" - sin introducción ni otras secciones.
+2. Empieza con el título exacto: {section['title']}
+3. Sé CONCISO y DIRECTO - menos texto, más información concreta.
+4. NUNCA uses marcadores de posición como "$X,XXX" - INVENTA cifras realistas específicas.
+5. Las tablas deben ser SIMPLES, de máximo 3-4 columnas.
+
+## FORMATO EXACTO A SEGUIR:
+
+{section['title']}
+{section['format']}
+"""
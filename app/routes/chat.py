@@ -1,12 +1,14 @@
 # app/routes/chat.py
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends
+from fastapi.responses import FileResponse, ORJSONResponse
+import copy
 import logging
 import os
+from collections.abc import MutableMapping
 import uuid  # Importar uuid
 import re
 from datetime import datetime  # Importar datetime
-from typing import Any, Optional, Dict, List  # Añadir Optional y Dict
+from typing import Any, Optional, Dict, List, Tuple  # Añadir Optional y Dict
 
 # Modelos
 from app.models.conversation import ConversationResponse, Conversation
@@ -14,14 +16,26 @@ from app.models.message import Message, MessageCreate
 
 # Servicios
 from app.services.storage_service import storage_service
-from app.services.ai_service import ai_service  # IA para conversación
+from app.services.ai_service import (  # IA para conversación
+    ai_service,
+    is_llm_error_response,
+)
 from app.services.pdf_service import pdf_service  # Para generar PDF
+from app.services.proposal_jobs import proposal_jobs
 from app.services.proposal_service import (
     proposal_service,
 )  # NUEVO: Para generar texto propuesta
 from app.services.questionnaire_service import (
     questionnaire_service,
 )  # Para obtener IDs/detalles preguntas
+from app.services.answer_normalizer import answer_normalizer  # Respuestas tipadas
+from app.services.conversation_digest import conversation_digest
+from app.services.question_renderer import question_renderer  # Preguntas locales
+from app.services.speculative_prefetch import speculative_prefetch
+from app.services.conversation_locks import conversation_locks, idempotency_cache
+from app.services.admission_control import rate_limiter
+from app.utils.alerts import send_error_alert
+from app.utils.serialization import conversation_payload
 from app.config import settings
 
 router = APIRouter()
@@ -31,33 +45,15 @@ logger = logging.getLogger("hydrous")
 
 
 def _get_full_questionnaire_path(metadata: Dict[str, Any]) -> List[str]:
-    """Intenta construir la ruta completa del cuestionario."""
-    # Reutilizar lógica de construcción de ruta (simplificada de proposal_service o questionnaire_service original)
-    path = [
-        q["id"]
-        for q in questionnaire_service.structure.get("initial_questions", [])
-        if "id" in q
-    ]
-    sector = metadata.get("selected_sector")
-    subsector = metadata.get("selected_subsector")
-    if sector and subsector:
-        try:
-            sector_data = questionnaire_service.structure.get(
-                "sector_questionnaires", {}
-            ).get(sector, {})
-            subsector_questions = sector_data.get(subsector, [])
-            if not isinstance(subsector_questions, list):
-                subsector_questions = sector_data.get("Otro", [])
-            path.extend([q["id"] for q in subsector_questions if "id" in q])
-        except Exception as e:
-            logger.error(f"Error construyendo ruta en _get_full_path: {e}")
-            # Fallback a solo iniciales si falla
-            path = [
-                q["id"]
-                for q in questionnaire_service.structure.get("initial_questions", [])
-                if "id" in q
-            ]
-    return path
+    """Construye la ruta completa del cuestionario (iniciales + subsector)."""
+    try:
+        return questionnaire_service.get_questionnaire_path(
+            metadata.get("selected_sector"), metadata.get("selected_subsector")
+        )
+    except Exception as e:
+        logger.error(f"Error construyendo ruta en _get_full_path: {e}")
+        # Fallback a solo iniciales si falla
+        return questionnaire_service.get_questionnaire_path(None, None)
 
 
 def _is_last_question(
@@ -67,12 +63,13 @@ def _is_last_question(
     if not current_question_id:
         return False
 
-    # Intentar obtener/construir la ruta completa
-    path = metadata.get("questionnaire_path", [])
-    if not path:  # Si no está en metadata, intentar construirla ahora
-        path = _get_full_questionnaire_path(metadata)
-        metadata["questionnaire_path"] = path  # Guardar por si acaso
-        logger.debug(f"Ruta construida on-the-fly en _is_last_question: {path}")
+    # Sin subsector la ruta solo tiene las preguntas iniciales: aún no puede ser la última
+    if not metadata.get("selected_subsector"):
+        return False
+
+    # La ruta se reconstruye siempre: cambia al conocerse el sector/subsector
+    path = _get_full_questionnaire_path(metadata)
+    metadata["questionnaire_path"] = path  # Guardar por si acaso
 
     if not path:
         return False  # Si no se pudo construir, no podemos saber si es la última
@@ -129,13 +126,9 @@ async def start_conversation():
 
         # 2. NO llamar a IA aquí. Guardar estado vacío.
         await storage_service.save_conversation(conversation)
-        # 3. Devolver solo ID y metadata vacía
-        return ConversationResponse(
-            id=conversation.id,
-            created_at=conversation.created_at,
-            messages=[],  # Sin mensajes iniciales
-            metadata=conversation.metadata,
-        )
+        # 3. Devolver solo ID y metadata vacía (sin mensajes iniciales). Se
+        # serializa directamente con orjson, sin validar ConversationResponse
+        return ORJSONResponse(conversation_payload(conversation))
     except Exception as e:
         logger.error(f"Error crítico al iniciar conversación: {str(e)}", exc_info=True)
         raise HTTPException(
@@ -143,17 +136,43 @@ async def start_conversation():
         )
 
 
-@router.post("/message")
+@router.post("/message", dependencies=[Depends(rate_limiter)])
 async def send_message(data: MessageCreate, background_tasks: BackgroundTasks):
+    """
+    Procesa los mensajes de una misma conversación de uno en uno. Un reintento
+    con la misma idempotency_key devuelve la respuesta ya generada. Si no hay
+    lugar para llamar al LLM se responde 503 sin guardar el mensaje.
+    """
+    async with conversation_locks.lock(data.conversation_id):
+        cached = await idempotency_cache.get(data.conversation_id, data.idempotency_key)
+        if cached is not None:
+            logger.info(
+                f"Reintento con idempotency_key {data.idempotency_key}: respuesta en caché"
+            )
+            return cached
+        response, failed = await _process_message(data, background_tasks)
+        # Los errores no se guardan: un reintento debe volver a intentarlo
+        if not failed:
+            await idempotency_cache.put(
+                data.conversation_id, data.idempotency_key, response
+            )
+        return response
+
+
+async def _process_message(
+    data: MessageCreate, background_tasks: BackgroundTasks
+) -> Tuple[Dict[str, Any], bool]:
     """
     Procesa mensaje usuario. Si es el último, genera propuesta y PDF automáticamente.
     Si el usuario pide 'descargar pdf' (y ya está lista), dispara la descarga.
     Si no, obtiene siguiente pregunta de la IA.
-    Devuelve un diccionario JSON.
+    Devuelve el diccionario JSON de respuesta y si es un error (no se cachea).
     """
     conversation_id = data.conversation_id
     user_input = data.message
     assistant_response_data = None  # Para guardar la respuesta a enviar al frontend
+    failed = False  # Respuesta de error: un reintento debe volver a procesarla
+    question_id, value = None, None  # Pregunta respondida en este turno
 
     try:
         # 1. Cargar Conversación
@@ -166,15 +185,15 @@ async def send_message(data: MessageCreate, background_tasks: BackgroundTasks):
                 "message": "Error: Conversación no encontrada. Por favor, reinicia.",
                 "conversation_id": conversation_id,
                 "created_at": datetime.utcnow(),
-            }
-        if not isinstance(conversation.metadata, dict):
+            }, True
+        if not isinstance(conversation.metadata, MutableMapping):
             logger.error(f"Metadata inválida para conversación: {conversation_id}")
             return {
                 "id": "error-metadata",
                 "message": "Error interno [MD01].",
                 "conversation_id": conversation_id,
                 "created_at": datetime.utcnow(),
-            }
+            }, True
 
         # 2. Crear objeto mensaje usuario (se añade al historial más adelante si aplica)
         user_message_obj = Message.user(user_input)
@@ -214,26 +233,24 @@ async def send_message(data: MessageCreate, background_tasks: BackgroundTasks):
                 f"DBG_PDF_CHECK: Entrando en flujo normal/final para {conversation_id}."
             )
 
+            # Copia para deshacer el turno si no hay lugar para el LLM (503)
+            metadata_snapshot = copy.deepcopy(conversation.metadata)
+
             # Añadir mensaje del usuario al historial en memoria AHORA
             conversation.messages.append(user_message_obj)
 
-            # Guardar un resumen de la respuesta del usuario
+            # Guardar la respuesta del usuario (texto crudo, valor normalizado y resumen)
+            local_questions = settings.QUESTION_MODE == "local"
+            needs_llm = False
             if conversation.metadata.get("current_question_id"):
                 question_id = conversation.metadata.get("current_question_id")
-                summary = {}
-
-                # Si ya existe un resumen, usarlo
-                if conversation.metadata.get("response_summaries") is None:
-                    conversation.metadata["response_summaries"] = {}
-
-                # Guardar esta respuesta en el resumen
-                conversation.metadata["response_summaries"][question_id] = {
-                    "question": conversation.metadata.get(
-                        "current_question_asked_summary", ""
-                    ),
-                    "answer": user_input.strip(),
-                }
-
+                value = answer_normalizer.record_answer(
+                    conversation.metadata, question_id, user_input
+                )
+                conversation_digest.update(conversation.metadata, question_id, value)
+                needs_llm = question_renderer.needs_clarification(
+                    question_id, user_input, value
+                )
                 logger.info(
                     f"Guardada respuesta para {question_id}: '{user_input.strip()}'"
                 )
@@ -244,6 +261,13 @@ async def send_message(data: MessageCreate, background_tasks: BackgroundTasks):
             # Determinar si fue la última respuesta ANTES de llamar a IA
             last_question_id = conversation.metadata.get("current_question_id")
             is_final_answer = _is_last_question(last_question_id, conversation.metadata)
+            if local_questions and not needs_llm and not is_final_answer:
+                # Las preguntas condicionales pueden omitir el final de la ruta
+                is_final_answer = bool(
+                    conversation.metadata.get("selected_subsector")
+                    and question_renderer.next_question_id(conversation.metadata)
+                    is None
+                )
             logger.debug(
                 f"DBG_PDF_CHECK: last_q_id='{last_question_id}', is_final_answer={is_final_answer}"
             )
@@ -253,15 +277,11 @@ async def send_message(data: MessageCreate, background_tasks: BackgroundTasks):
                     f"Generando propuesta para {conversation_id} con enfoque radical"
                 )
 
-                # Importar el nuevo generador
-                from app.services.direct_proposal_generator import (
-                    direct_proposal_generator,
-                )
+                speculative_prefetch.cancel(conversation_id)
 
-                # Generar propuesta y PDF directamente
-                pdf_path = await direct_proposal_generator.generate_complete_proposal(
-                    conversation
-                )
+                # Generar propuesta y PDF (una sola vez aunque otro worker o una
+                # descarga la pidan a la vez)
+                pdf_path = await proposal_jobs.generate(conversation)
 
                 # Guardar en metadata
                 conversation.metadata["is_complete"] = True
@@ -288,16 +308,13 @@ async def send_message(data: MessageCreate, background_tasks: BackgroundTasks):
 
                     # Añadir mensaje al historial
                     msg_to_add = Message.assistant(assistant_response_data["message"])
-                    await storage_service.add_message_to_conversation(
-                        conversation.id, msg_to_add
-                    )
+                    conversation.add_message(msg_to_add)
                 else:
                     # Mensaje de error si falló
                     error_message = "Lo siento, hubo un problema al generar la propuesta. Por favor, inténtalo de nuevo."
                     error_msg = Message.assistant(error_message)
-                    await storage_service.add_message_to_conversation(
-                        conversation.id, error_msg
-                    )
+                    conversation.add_message(error_msg)
+                    failed = True
                     assistant_response_data = {
                         "id": error_msg.id,
                         "message": error_message,
@@ -311,35 +328,36 @@ async def send_message(data: MessageCreate, background_tasks: BackgroundTasks):
                     f"DBG_PDF_CHECK: No es la última pregunta ni petición PDF válida. Llamando a AI Service."
                 )
 
-                # Asegurarse de guardar el estado ANTES de llamar a la IA por si actualizamos sector/subsector
+                # Sector/subsector ya se actualizaron al registrar la respuesta
+                # (answer_normalizer.record_answer). Guardar antes de llamar a la IA.
                 try:
-                    last_q_summary = conversation.metadata.get(
-                        "current_question_asked_summary", ""
-                    )
-                    logger.debug(
-                        f"Actualizando sector/subsector basado en user_input='{user_input}' y last_q_summary='{last_q_summary}'"
-                    )
-                    if "sector principal opera" in last_q_summary:
-                        # ... (lógica para actualizar metadata["selected_sector"]) ...
-                        pass
-                    elif "giro específico" in last_q_summary:
-                        # ... (lógica para actualizar metadata["selected_subsector"]) ...
-                        pass
-                    # Guardar conversación con metadata actualizada ANTES de llamar a IA
                     await storage_service.save_conversation(conversation)
                 except Exception as e:
                     logger.error(
-                        f"Error actualizando metadata antes de llamar a IA: {e}",
+                        f"Error guardando metadata antes de llamar a IA: {e}",
                         exc_info=True,
                     )
                     # Continuar de todas formas? O devolver error? Optamos por continuar.
 
-                ai_response_content = await ai_service.handle_conversation(conversation)
+                ai_response_content = None
+                if local_questions and not needs_llm:
+                    # Siguiente pregunta armada localmente, sin llamada al LLM
+                    ai_response_content = question_renderer.next_message(conversation)
+                if ai_response_content is None:
+                    # Turno precalculado si la respuesta coincide con la especulada
+                    ai_response_content = await speculative_prefetch.take(
+                        conversation, question_id, value
+                    )
+                if ai_response_content is None:
+                    ai_response_content = await ai_service.handle_conversation(
+                        conversation
+                    )
+                failed = is_llm_error_response(ai_response_content)
                 assistant_message = Message.assistant(ai_response_content)
                 # Añadir respuesta de IA al historial
-                await storage_service.add_message_to_conversation(
-                    conversation.id, assistant_message
-                )
+                conversation.add_message(assistant_message)
+                # Mientras el usuario lee, precalcular el siguiente turno (opcional)
+                speculative_prefetch.schedule(conversation)
                 # Preparar respuesta normal para frontend
                 assistant_response_data = {
                     "id": assistant_message.id,
@@ -354,6 +372,7 @@ async def send_message(data: MessageCreate, background_tasks: BackgroundTasks):
             logger.error(
                 f"Fallo crítico: No se preparó assistant_response_data para {conversation_id}"
             )
+            failed = True
             assistant_response_data = {
                 "id": "error-no-resp-prep",
                 "message": "Error interno [RP01]",
@@ -361,6 +380,10 @@ async def send_message(data: MessageCreate, background_tasks: BackgroundTasks):
                 "created_at": datetime.utcnow(),
             }
 
+        # Popularidad de las opciones (prefetch especulativo): solo turnos completados
+        if question_id and not failed:
+            speculative_prefetch.record_choice(question_id, value)
+
         # Guardar estado final de la conversación (incluye mensajes añadidos y metadata)
         await storage_service.save_conversation(conversation)
         background_tasks.add_task(storage_service.cleanup_old_conversations)  # Limpieza
@@ -368,10 +391,21 @@ async def send_message(data: MessageCreate, background_tasks: BackgroundTasks):
         logger.info(
             f"Devolviendo respuesta para {conversation_id}: action={assistant_response_data.get('action', 'N/A')}, msg_len={len(assistant_response_data.get('message', '') or '')}"
         )
-        return assistant_response_data
+        return assistant_response_data, failed
 
     # --- Manejo de Excepciones ---
     except HTTPException as http_exc:
+        # Sin lugar para el LLM (503): se deshace el turno (mensaje del usuario y
+        # respuesta registrada) para que el reintento lo procese desde cero
+        if (
+            "conversation" in locals()
+            and isinstance(conversation, Conversation)
+            and conversation.messages
+            and conversation.messages[-1] is user_message_obj
+        ):
+            conversation.messages.pop()
+            conversation.metadata = metadata_snapshot
+            await storage_service.save_conversation(conversation)
         # Re-lanzar excepciones HTTP conocidas
         raise http_exc
     except Exception as e:
@@ -380,6 +414,11 @@ async def send_message(data: MessageCreate, background_tasks: BackgroundTasks):
             f"Error fatal no controlado en send_message (PDF Automático) para {conversation_id}: {str(e)}",
             exc_info=True,
         )
+        send_error_alert(
+            "Error no controlado en /chat/message",
+            type(e).__name__,
+            {"conversation_id": conversation_id, "error": str(e)},
+        )
         # Preparar una respuesta de error genérica para el frontend
         error_response = {
             "id": "error-fatal-" + str(uuid.uuid4())[:8],
@@ -395,7 +434,7 @@ async def send_message(data: MessageCreate, background_tasks: BackgroundTasks):
             if (
                 "conversation" in locals()
                 and isinstance(conversation, Conversation)
-                and isinstance(conversation.metadata, dict)
+                and isinstance(conversation.metadata, MutableMapping)
             ):
                 conversation.metadata["last_error"] = (
                     f"Fatal: {str(e)[:200]}"  # Limitar longitud
@@ -408,7 +447,7 @@ async def send_message(data: MessageCreate, background_tasks: BackgroundTasks):
             )
 
         # Devolver la respuesta de error al frontend
-        return error_response
+        return error_response, True
 
 
 # Endpoint /download-pdf (SIN CAMBIOS)
@@ -419,19 +458,10 @@ async def download_pdf(conversation_id: str):
         if not conversation:
             raise HTTPException(status_code=404, detail="Conversación no encontrada.")
 
-        pdf_path = conversation.metadata.get("pdf_path")
-
-        # Si no existe, intentar generarlo de nuevo
+        # PDF local, el guardado por otro worker o, si no existe, se genera
+        pdf_path = await proposal_jobs.pdf_path(conversation)
         if not pdf_path or not os.path.exists(pdf_path):
-            from app.services.direct_proposal_generator import direct_proposal_generator
-
-            logger.info(f"Regenerando PDF bajo demanda para {conversation_id}...")
-            pdf_path = await direct_proposal_generator.generate_complete_proposal(
-                conversation
-            )
-
-            if not pdf_path or not os.path.exists(pdf_path):
-                raise ValueError("Generación PDF falló")
+            raise ValueError("Generación PDF falló")
 
         # Preparar nombre personalizado
         client_name = conversation.metadata.get("client_name", "Cliente")
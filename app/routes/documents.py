@@ -1,65 +1,117 @@
 # app/routes/documents.py
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
 import logging
 from typing import Optional
 
+from app.config import settings
 from app.models.message import Message
-from app.services.document_service import document_service
-from app.services.storage_service import storage_service
-from app.services.ai_service import ai_service
+from app.services.document_service import DocumentTooLargeError, document_service
+from app.services.document_analysis import document_analysis_queue, document_summary
+from app.services.document_context import document_context
+from app.services.storage_service import conversation_expires_at, storage_service
+from app.services.answer_normalizer import answer_normalizer
+from app.services.conversation_digest import conversation_digest
+from app.services.question_renderer import question_renderer
+from app.services.questionnaire_service import questionnaire_service
+from app.services.conversation_locks import conversation_locks
+from app.services.admission_control import rate_limiter
 
 router = APIRouter()
 
 
-@router.post("/upload")
+def _acknowledgement(conversation, filename: str) -> str:
+    """
+    Respuesta inmediata a la subida (sin esperar el análisis ni llamar al LLM).
+    Si la pregunta actual pedía un documento, la subida la responde y se pasa a
+    la siguiente; si no, se repite la pregunta pendiente.
+    """
+    metadata = conversation.metadata
+    text = (
+        f"He recibido tu documento **{filename}**. Lo estoy analizando y tendré en "
+        "cuenta sus datos en las siguientes respuestas."
+    )
+    question_id = metadata.get("current_question_id")
+    question = questionnaire_service.all_questions_base.get(question_id) or {}
+    if question.get("type") == "document_upload":
+        value = answer_normalizer.record_answer(
+            metadata, question_id, f"Documento adjunto: {filename}"
+        )
+        conversation_digest.update(metadata, question_id, value)
+        follow_up = question_renderer.next_message(conversation)
+    else:
+        follow_up = question_id and question_renderer.render(question_id, metadata)
+    return f"{text}\n\n{follow_up}" if follow_up else text
+
+
+@router.post("/upload", dependencies=[Depends(rate_limiter)])
 async def upload_document(
     file: UploadFile = File(...),
     conversation_id: str = Form(...),
     message: Optional[str] = Form(None),
 ):
-    """Sube un documento y lo procesa"""
-    try:
-        # Verificar que la conversación existe
-        conversation = await storage_service.get_conversation(conversation_id)
-        if not conversation:
-            raise HTTPException(status_code=404, detail="Conversación no encontrada")
-
-        # Procesar el documento
-        doc_info = await document_service.process_document(file, conversation_id)
+    """
+    Sube un documento y lo encola para analizarlo en segundo plano; responde sin
+    esperar el análisis. Los parámetros extraídos se guardan después en la
+    metadata de la conversación ("documents").
+    """
+    # Mismo lock que /chat/message: ambos modifican la conversación
+    async with conversation_locks.lock(conversation_id):
+        try:
+            # Verificar que la conversación existe
+            conversation = await storage_service.get_conversation(conversation_id)
+            if not conversation:
+                raise HTTPException(
+                    status_code=404, detail="Conversación no encontrada"
+                )
+            if document_analysis_queue.full():
+                raise HTTPException(
+                    status_code=503,
+                    detail="Hay muchos documentos en proceso, inténtalo en unos segundos.",
+                    headers={"Retry-After": "10"},
+                )
 
-        # Crear mensaje del usuario con referencia al documento
-        user_message_content = message or f"[He subido un documento: {file.filename}]"
-        user_message = Message.user(user_message_content)
-        await storage_service.add_message_to_conversation(conversation_id, user_message)
+            # Guardar el documento
+            doc_info = await document_service.process_document(
+                file, conversation_id, conversation_expires_at(conversation)
+            )
 
-        # Generar respuesta basada en el documento
-        doc_summary = document_service.format_document_info_for_prompt(doc_info)
-        system_message = Message.system(
-            f"El usuario ha subido un documento. Aquí está la información extraída:\n{doc_summary}\n"
-            "Por favor, reconoce el documento subido y continúa con el cuestionario."
-        )
-        await storage_service.add_message_to_conversation(
-            conversation_id, system_message
-        )
+            # Crear mensaje del usuario con referencia al documento
+            user_message_content = (
+                message or f"[He subido un documento: {file.filename}]"
+            )
+            conversation.add_message(Message.user(user_message_content))
 
-        # Obtener respuesta del LLM
-        ai_response = await ai_service.handle_conversation(
-            conversation, f"He subido un documento: {file.filename}. {message or ''}"
-        )
+            assistant_message = Message.assistant(
+                _acknowledgement(conversation, file.filename)
+            )
+            conversation.add_message(assistant_message)
 
-        # Añadir respuesta del asistente
-        assistant_message = Message.assistant(ai_response)
-        await storage_service.add_message_to_conversation(
-            conversation_id, assistant_message
-        )
+            document_analysis_queue.submit(doc_info)
+            await document_service.save_document(doc_info)
+            conversation.metadata.setdefault("documents", {})[doc_info["id"]] = (
+                document_summary(doc_info)
+            )
+            # Con el análisis ya en caché los datos están disponibles en el acto
+            document_context.record(conversation.metadata, doc_info)
+            await storage_service.save_conversation(conversation)
 
-        return {
-            "id": assistant_message.id,
-            "conversation_id": conversation_id,
-            "message": ai_response,
-            "document_id": doc_info["id"],
-            "created_at": assistant_message.created_at,
-        }
-    except Exception as e:
-        logging.error(f"Error al subir documento: {str(e)}")
-        raise HTTPException(status_code=500, detail="Error al procesar el documento")
+            return {
+                "id": assistant_message.id,
+                "conversation_id": conversation_id,
+                "message": assistant_message.content,
+                "document_id": doc_info["id"],
+                "document_status": doc_info["extracted_info"]["status"],
+                "created_at": assistant_message.created_at,
+            }
+        except HTTPException:
+            raise
+        except DocumentTooLargeError:
+            raise HTTPException(
+                status_code=413,
+                detail=f"El documento supera el tamaño máximo de {settings.MAX_UPLOAD_SIZE // (1024 * 1024)} MB",
+            )
+        except Exception as e:
+            logging.error(f"Error al subir documento: {str(e)}")
+            raise HTTPException(
+                status_code=500, detail="Error al procesar el documento"
+            )
@@ -1,12 +1,13 @@
 # app/routes/feedback.py
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+import hmac
 import logging
-import os
-import json
-from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
 
+from app.config import settings
+from app.services.feedback_service import FeedbackQueueFull, feedback_log
+
 router = APIRouter()
 logger = logging.getLogger("hydrous")
 
@@ -16,46 +17,58 @@ class FeedbackModel(BaseModel):
 
     conversation_id: str
     message_id: Optional[str] = None
-    rating: int  # 1-5 donde 5 es excelente
+    rating: int = Field(..., ge=1, le=5)  # 1-5 donde 5 es excelente
     comment: Optional[str] = None
 
 
-# Directorio para almacenar retroalimentación
-FEEDBACK_DIR = os.path.join("uploads", "feedback")
-os.makedirs(FEEDBACK_DIR, exist_ok=True)
-
-
 @router.post("/submit")
 async def submit_feedback(feedback: FeedbackModel):
-    """Envía retroalimentación sobre una respuesta"""
+    """
+    Envía retroalimentación sobre una respuesta. Se encola y se guarda por
+    lotes en segundo plano; la respuesta no espera a la escritura.
+    """
     try:
-        # Crear un ID único para la retroalimentación
-        feedback_id = (
-            f"{feedback.conversation_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        feedback_id = feedback_log.submit(
+            feedback.conversation_id,
+            feedback.rating,
+            message_id=feedback.message_id,
+            comment=feedback.comment,
+        )
+    except FeedbackQueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="No se pudo registrar la retroalimentación, inténtalo más tarde.",
+            headers={"Retry-After": "5"},
         )
 
-        # Preparar datos para guardar
-        feedback_data = {
-            "id": feedback_id,
-            "conversation_id": feedback.conversation_id,
-            "message_id": feedback.message_id,
-            "rating": feedback.rating,
-            "comment": feedback.comment,
-            "timestamp": datetime.now().isoformat(),
-        }
-
-        # Guardar en archivo JSON
-        feedback_file = os.path.join(FEEDBACK_DIR, f"{feedback_id}.json")
-        with open(feedback_file, "w", encoding="utf-8") as f:
-            json.dump(feedback_data, f, ensure_ascii=False, indent=2)
-
-        return {
-            "status": "success",
-            "message": "Retroalimentación recibida correctamente",
-        }
+    return {
+        "status": "success",
+        "message": "Retroalimentación recibida correctamente",
+        "id": feedback_id,
+    }
 
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Solo con el ADMIN_TOKEN configurado (sin él, el endpoint no está disponible)."""
+    if not settings.ADMIN_TOKEN or not hmac.compare_digest(
+        (x_admin_token or "").encode(), settings.ADMIN_TOKEN.encode()
+    ):
+        raise HTTPException(status_code=403, detail="No autorizado")
+
+
+@router.get("/stats", dependencies=[Depends(require_admin)])
+async def feedback_stats(
+    conversation_id: Optional[str] = None,
+    days: int = Query(30, ge=1, le=365),
+):
+    """
+    Histograma de valoraciones de los últimos `days` días, total y por día; con
+    conversation_id, solo los de esa conversación.
+    """
+    try:
+        return await feedback_log.query(conversation_id=conversation_id, days=days)
     except Exception as e:
-        logger.error(f"Error al procesar retroalimentación: {str(e)}")
+        logger.error(f"Error al consultar retroalimentación: {str(e)}")
         raise HTTPException(
-            status_code=500, detail="Error al procesar la retroalimentación"
+            status_code=500, detail="Error al consultar la retroalimentación"
         )
@@ -0,0 +1,58 @@
+# app/routes/questionnaire.py
+import hashlib
+import logging
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, Request, Response
+
+from app.config import settings
+from app.services.questionnaire_service import questionnaire_service
+from app.utils.serialization import dumps_json
+
+router = APIRouter()
+logger = logging.getLogger("hydrous")
+
+# (JSON, ETag) de la estructura; no cambia mientras el proceso está vivo. El
+# ETag es débil: el middleware de compresión envía el mismo cuerpo en gzip, br
+# o sin comprimir, representaciones equivalentes pero no idénticas byte a byte
+_compiled: Optional[Tuple[bytes, str]] = None
+
+
+def compiled_structure() -> Tuple[bytes, str]:
+    global _compiled
+    if _compiled is None:
+        body = dumps_json(questionnaire_service.get_public_structure())
+        _compiled = (body, f'W/"{hashlib.sha256(body).hexdigest()[:32]}"')
+        logger.info(f"Estructura del cuestionario compilada ({len(body)} bytes)")
+    return _compiled
+
+
+def _opaque_tag(etag: str) -> str:
+    """ETag sin el prefijo W/ (comparación débil, RFC 9110 §8.8.3.2)."""
+    etag = etag.strip()
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {_opaque_tag(tag) for tag in if_none_match.split(",")}
+    return "*" in candidates or _opaque_tag(etag) in candidates
+
+
+@router.get("/structure")
+async def get_questionnaire_structure(request: Request):
+    """
+    Estructura completa del cuestionario (preguntas y opciones) para que el
+    frontend muestre las opciones sin pedirlas al chat. Cacheable: ETag débil
+    (igual para cualquier codificación) y 304 si el cliente ya tiene la versión
+    actual.
+    """
+    body, etag = compiled_structure()
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.QUESTIONNAIRE_CACHE_MAX_AGE}",
+    }
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,221 @@
+# app/services/admission_control.py
+"""
+Control de admisión para los endpoints que llaman al LLM.
+
+- AdmissionController: como máximo LLM_MAX_IN_FLIGHT llamadas al LLM en curso
+  (el lugar se toma en cada llamada, en ai_service); las demás esperan en una cola de LLM_MAX_QUEUE lugares durante LLM_QUEUE_TIMEOUT
+  segundos como máximo. Si la cola está llena o vence el plazo se responde de
+  inmediato 503 con Retry-After, en lugar de acumular peticiones que terminan
+  todas en timeout. Para trabajo prescindible (prefetch especulativo),
+  try_slot() toma un lugar solo si hay uno libre, sin cola ni 503.
+- RateLimiter: token bucket por IP del cliente (429 con Retry-After). Con
+  STORAGE_BACKEND="redis" el contador se comparte entre workers.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request
+
+from app.config import settings
+from app.services.redis_backend import get_redis, redis_enabled
+from app.services.redis_backend import key as redis_key
+
+logger = logging.getLogger("hydrous")
+
+# IPs cuyo bucket se conserva como máximo (las menos recientes se descartan)
+MAX_TRACKED_CLIENTS = 10000
+
+# Tarea que tomó un lugar con try_slot(): sus llamadas al LLM ya tienen lugar
+# (las tareas que cree heredan el contexto, pero no el lugar)
+_slot_owner: ContextVar[Optional[asyncio.Task]] = ContextVar(
+    "admission_slot_owner", default=None
+)
+
+
+def _holding_slot() -> bool:
+    return _slot_owner.get() is asyncio.current_task()
+
+
+class AdmissionController:
+    """Limita las peticiones en curso con una cola acotada y con plazo."""
+
+    def __init__(self, max_in_flight: int, max_queue: int, queue_timeout: float):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        # Duración media de una petición admitida (media móvil exponencial)
+        self._avg_seconds = 5.0
+
+    def _retry_after(self) -> int:
+        """Segundos estimados hasta que se libere un lugar."""
+        rounds = (self.waiting + 1) / max(self.max_in_flight, 1)
+        return max(1, math.ceil(self._avg_seconds * rounds))
+
+    def _reject(self, reason: str):
+        self.rejected += 1
+        retry_after = self._retry_after()
+        logger.warning(f"Petición rechazada por sobrecarga ({reason})")
+        raise HTTPException(
+            status_code=503,
+            detail="El servicio está ocupado, inténtalo de nuevo en unos segundos.",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    @asynccontextmanager
+    async def slot(self):
+        """Uso: async with admission_controller.slot(): ... (503 si no hay lugar)"""
+        if _holding_slot():
+            # Dentro de try_slot(): se usa el lugar ya tomado
+            yield
+            return
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                self._reject("cola llena")
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._reject("plazo de espera vencido")
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        async with self._admitted():
+            yield
+
+    @asynccontextmanager
+    async def try_slot(self):
+        """
+        Lugar sin esperar: async with admission_controller.try_slot() as admitted.
+        admitted es False si no hay un lugar libre ahora (no se encola ni se
+        rechaza); las llamadas al LLM dentro del bloque usan este lugar.
+        """
+        if _holding_slot():
+            yield True
+            return
+        if self._semaphore.locked():
+            yield False
+            return
+        await self._semaphore.acquire()
+        token = _slot_owner.set(asyncio.current_task())
+        try:
+            async with self._admitted():
+                yield True
+        finally:
+            _slot_owner.reset(token)
+
+    @asynccontextmanager
+    async def _admitted(self):
+        """Cuenta un lugar ya adquirido y lo libera al terminar."""
+        self.in_flight += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+            self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * (
+                time.monotonic() - started
+            )
+
+    def snapshot(self) -> Dict[str, int]:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+        }
+
+
+class RateLimiter:
+    """Token bucket por IP: `rate_per_minute` peticiones sostenidas y ráfagas de `burst`."""
+
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        # ip -> (tokens, último instante)
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    @staticmethod
+    def client_ip(request: Request) -> str:
+        """
+        IP del cliente. X-Forwarded-For solo se tiene en cuenta si la conexión
+        viene de un proxy de confianza (TRUSTED_PROXIES); entonces se toma la
+        última IP de la cadena que no sea de un proxy de confianza (las
+        anteriores las puede inventar el cliente).
+        """
+        peer = request.client.host if request.client else "desconocido"
+        trusted = settings.TRUSTED_PROXIES
+        forwarded = request.headers.get("x-forwarded-for")
+        if not forwarded or peer not in trusted:
+            return peer
+        for ip in reversed([ip.strip() for ip in forwarded.split(",")]):
+            if ip and ip not in trusted:
+                return ip
+        return peer
+
+    def allow(self, client: str) -> Tuple[bool, int]:
+        """(permitido, segundos hasta el siguiente token)."""
+        now = time.monotonic()
+        tokens, last = self._buckets.pop(client, (float(self.burst), now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[client] = (tokens, now)
+        while len(self._buckets) > MAX_TRACKED_CLIENTS:
+            self._buckets.popitem(last=False)
+        return allowed, max(1, math.ceil((1 - tokens) / self.rate))
+
+    async def check(self, client: str) -> Tuple[bool, int]:
+        return self.allow(client)
+
+    async def __call__(self, request: Request):
+        """Dependencia de FastAPI: 429 si la IP agotó su cuota."""
+        client = self.client_ip(request)
+        allowed, retry_after = await self.check(client)
+        if not allowed:
+            logger.warning(f"Límite de peticiones excedido para {client}")
+            raise HTTPException(
+                status_code=429,
+                detail="Demasiadas solicitudes. Espera un momento.",
+                headers={"Retry-After": str(retry_after)},
+            )
+
+
+class RedisRateLimiter(RateLimiter):
+    """
+    Contador compartido entre workers: ventana fija de un minuto por IP con
+    RATE_LIMIT_PER_MINUTE + RATE_LIMIT_BURST peticiones (INCR + EXPIRE).
+    """
+
+    async def check(self, client: str) -> Tuple[bool, int]:
+        now = time.time()
+        window = int(now // 60)
+        counter = redis_key("rate", client, str(window))
+        async with get_redis().pipeline(transaction=True) as pipe:
+            pipe.incr(counter)
+            pipe.expire(counter, 60)
+            count, _ = await pipe.execute()
+        limit = self.rate * 60 + self.burst
+        return count <= limit, max(1, math.ceil(60 - now % 60))
+
+
+# Instancias globales
+# El control de admisión es por proceso: limita las llamadas al LLM de cada worker
+admission_controller = AdmissionController(
+    settings.LLM_MAX_IN_FLIGHT, settings.LLM_MAX_QUEUE, settings.LLM_QUEUE_TIMEOUT
+)
+rate_limiter = (RedisRateLimiter if redis_enabled() else RateLimiter)(
+    settings.RATE_LIMIT_PER_MINUTE, settings.RATE_LIMIT_BURST
+)
@@ -1,21 +1,79 @@
 # app/services/ai_service.py
 import logging
 import httpx
+from fastapi import HTTPException
 import os
 import json  # Importar json
-from typing import List, Dict, Any, Optional  # Asegurarse que Optional esté importado
+from collections.abc import MutableMapping
+from typing import (  # Asegurarse que Optional esté importado
+    AsyncIterator,
+    List,
+    Dict,
+    Any,
+    Optional,
+)
 
 from app.config import settings
 from app.models.conversation import Conversation
 
 # Importar el prompt LLM-Driven (ajusta el nombre si usaste V4)
-from app.prompts.main_prompt_llm_driven import get_llm_driven_master_prompt
+from app.prompts.main_prompt_llm_driven import (
+    get_dynamic_state_suffix,
+    get_static_prompt_prefix,
+)
 
 # Importar QuestionnaireService SOLO para IDs iniciales/texto de preguntas en metadata
 from app.services.questionnaire_service import questionnaire_service
+from app.services.admission_control import admission_controller
+from app.services.conversation_digest import conversation_digest
+from app.services.document_context import document_context
+from app.services.insight_service import insight_service
+from app.utils.alerts import send_error_alert
+from app.utils.prompt_cache import prompt_cache_stats
 
 logger = logging.getLogger("hydrous")
 
+# Prefijos de los mensajes de error que devuelve _call_llm_api en lugar de lanzar
+LLM_ERROR_PREFIXES = (
+    "Error",
+    "Lo siento",
+    "(Respuesta inválida",
+    "(El asistente no",
+)
+
+
+# Historial: a partir de DIGEST_HISTORY_THRESHOLD mensajes se envía el resumen de
+# la conversación más los últimos RECENT_HISTORY_MSGS mensajes
+DIGEST_HISTORY_THRESHOLD = 12
+RECENT_HISTORY_MSGS = 6
+
+# Marcadores con que la IA antecede la pregunta formulada (el prompt pide "QUESTION")
+QUESTION_MARKERS = ("**PREGUNTA:**", "**QUESTION:**")
+
+
+def is_llm_error_response(text: str) -> bool:
+    """Indica si una respuesta de _call_llm_api es en realidad un mensaje de error."""
+    return text.startswith(LLM_ERROR_PREFIXES)
+
+
+def extract_asked_question(text: str) -> Optional[str]:
+    """Texto de la pregunta marcada con **PREGUNTA:**/**QUESTION:** en una respuesta."""
+    for line in (text or "").split("\n"):
+        line = line.strip()
+        for marker in QUESTION_MARKERS:
+            if line.startswith(marker):
+                return line.replace(marker, "").strip()
+    return None
+
+
+def insert_before_question(text: str, block: str) -> str:
+    """Inserta un bloque justo antes de la línea de la pregunta (o al final)."""
+    lines = (text or "").split("\n")
+    for position, line in enumerate(lines):
+        if line.strip().startswith(QUESTION_MARKERS):
+            return "\n".join(lines[:position] + [block, ""] + lines[position:])
+    return f"{text}\n\n{block}"
+
 
 class AIServiceLLMDriven:
 
@@ -35,6 +93,19 @@ class AIServiceLLMDriven:
         messages: List[Dict[str, str]],
         max_tokens: int = 1500,
         temperature: float = 0.6,
+    ) -> str:
+        """
+        Llama a la API del LLM. Cada llamada ocupa un lugar del control de
+        admisión mientras dura (HTTPException 503 si el servicio está saturado).
+        """
+        async with admission_controller.slot():
+            return await self._post_llm_api(messages, max_tokens, temperature)
+
+    async def _post_llm_api(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
     ) -> str:
         """Llama a la API del LLM con logging y manejo de errores detallado."""
         if not self.api_key or not self.api_url:
@@ -82,6 +153,8 @@ class AIServiceLLMDriven:
                     f"DBG_AI_CALL: JSON recibido OK (primeros 500 chars): {str(data)[:500]}"
                 )
 
+                prompt_cache_stats.record(data.get("usage"))
+
                 choices = data.get("choices")
                 if not choices:
                     logger.warning(
@@ -112,6 +185,11 @@ class AIServiceLLMDriven:
                 f"DBG_AI_CALL: Error HTTP {e.response.status_code} en API LLM: {error_body}",
                 exc_info=True,
             )
+            send_error_alert(
+                "API LLM",
+                f"Error HTTP {e.response.status_code}",
+                {"model": self.model, "respuesta": error_body[:500]},
+            )
             # Devolver mensaje de error claro al usuario
             user_error_msg = (
                 f"Error de comunicación con la IA ({e.response.status_code})."
@@ -126,6 +204,9 @@ class AIServiceLLMDriven:
             logger.error(
                 f"DBG_AI_CALL: Error de red llamando a API LLM: {e}", exc_info=True
             )
+            send_error_alert(
+                "API LLM", f"Error de red: {type(e).__name__}", {"error": str(e)}
+            )
             return f"Error de red al contactar la IA. Verifica tu conexión."
         except json.JSONDecodeError as e:
             logger.error(
@@ -144,14 +225,74 @@ class AIServiceLLMDriven:
                 "Lo siento, ocurrió un error inesperado en el servicio de IA [AIC04]."
             )
 
+    async def _stream_llm_api(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 1500,
+        temperature: float = 0.6,
+    ) -> AsyncIterator[str]:
+        """
+        Llama a la API del LLM en modo streaming y produce los fragmentos de texto
+        a medida que llegan. A diferencia de _call_llm_api, los errores se propagan
+        para que el llamador decida el fallback (también el 503 del control de
+        admisión).
+        """
+        if not self.api_key or not self.api_url:
+            raise RuntimeError("Clave API o URL no proporcionada [AIC01].")
+
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}",
+        }
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True,
+            # El último fragmento trae el uso de tokens (incluidos los cacheados)
+            "stream_options": {"include_usage": True},
+        }
+        logger.info(
+            f"DBG_AI_STREAM: Iniciando llamada streaming. Model: {self.model}, #Msgs: {len(messages)}"
+        )
+        received_chars = 0
+        # Un lugar del control de admisión durante todo el streaming
+        async with admission_controller.slot():
+            async with httpx.AsyncClient() as client:
+                async with client.stream(
+                    "POST", self.api_url, json=payload, headers=headers, timeout=90.0
+                ) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        # Formato SSE: "data: {...}" y "data: [DONE]" al final
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            break
+                        chunk = json.loads(data)
+                        if chunk.get("usage"):
+                            prompt_cache_stats.record(chunk["usage"])
+                        choices = chunk.get("choices") or []
+                        if not choices:
+                            continue
+                        content = (choices[0].get("delta") or {}).get("content")
+                        if content:
+                            received_chars += len(content)
+                            yield content
+        logger.info(
+            f"DBG_AI_STREAM: Streaming completado (longitud: {received_chars})."
+        )
+
     def _prepare_messages(self, conversation: Conversation) -> List[Dict[str, str]]:
         """Prepara los mensajes para la API, incluyendo el prompt dinámico."""
         logger.debug("DBG_AI_PREP: Iniciando preparación de mensajes...")
         try:
-            # Generar el prompt maestro con el estado actual y el cuestionario
-            # Usar metadata directamente, asegurarse que no sea None
+            # Prefijo estático (idéntico en todos los turnos, cacheable por el
+            # proveedor) + historial + estado dinámico al final
             current_metadata = conversation.metadata if conversation.metadata else {}
-            system_prompt = get_llm_driven_master_prompt(current_metadata)
+            system_prompt = get_static_prompt_prefix()
 
             if "[ERROR" in system_prompt:
                 logger.error(
@@ -163,11 +304,19 @@ class AIServiceLLMDriven:
                 )
 
             messages = [{"role": "system", "content": system_prompt}]
+            extra_context = ""
 
             # Añadir historial de conversación (si existe)
             if conversation.messages:
                 MAX_HISTORY_MSGS = 15  # Ajustar según necesidad y límites de tokens
                 start_index = max(0, len(conversation.messages) - MAX_HISTORY_MSGS)
+                # Con historial largo, lo anterior va resumido y solo se envían los
+                # últimos mensajes completos: el prompt queda acotado.
+                if len(conversation.messages) > DIGEST_HISTORY_THRESHOLD:
+                    digest = conversation_digest.render(current_metadata)
+                    if digest:
+                        extra_context = f"RESUMEN DE RESPUESTAS ANTERIORES:\n{digest}"
+                        start_index = len(conversation.messages) - RECENT_HISTORY_MSGS
                 for msg in conversation.messages[start_index:]:
                     # Asegurarse que msg es un objeto con atributos role y content
                     # (Si viene de BD, podría ser un dict)
@@ -180,20 +329,44 @@ class AIServiceLLMDriven:
                             f"Mensaje inválido o de sistema en historial omitido: {msg}"
                         )
 
-                logger.debug(
-                    f"DBG_AI_PREP: Mensajes preparados (Total: {len(messages)}). Historial añadido."
-                )
-            else:
-                logger.debug(
-                    "DBG_AI_PREP: Mensajes preparados (Total: 1). Sin historial previo."
+            # Datos de documentos subidos que el usuario no ha respondido aún
+            documents_context = document_context.render(current_metadata)
+            if documents_context:
+                extra_context = "\n\n".join(
+                    part for part in (extra_context, documents_context) if part
                 )
 
+            messages.append(
+                {
+                    "role": "system",
+                    "content": get_dynamic_state_suffix(
+                        current_metadata, extra_context=extra_context
+                    ),
+                }
+            )
+            logger.debug(f"DBG_AI_PREP: Mensajes preparados (Total: {len(messages)}).")
+
             return messages
         except Exception as e:
             logger.error(f"Error fatal en _prepare_messages: {e}", exc_info=True)
             # Lanzar excepción para que handle_conversation la capture
             raise ValueError(f"Fallo al preparar mensajes: {e}")
 
+    def _match_asked_question(
+        self, conversation: Conversation, asked_text: str
+    ) -> Optional[str]:
+        """ID de la pregunta del cuestionario que corresponde al texto formulado."""
+        metadata = conversation.metadata
+        path = questionnaire_service.get_questionnaire_path(
+            metadata.get("selected_sector"), metadata.get("selected_subsector")
+        )
+        return questionnaire_service.match_question(
+            asked_text,
+            path,
+            previous_id=metadata.get("current_question_id"),
+            answered_ids=(metadata.get("collected_data") or {}).keys(),
+        )
+
     async def handle_conversation(self, conversation: Conversation) -> str:
         """
         Prepara los mensajes y obtiene la respuesta del LLM.
@@ -205,7 +378,7 @@ class AIServiceLLMDriven:
         if not conversation:
             logger.error("DBG_AI_HANDLE: Objeto conversation es None.")
             return "Error interno: Conversación inválida [AIH01]."
-        if not isinstance(conversation.metadata, dict):
+        if not isinstance(conversation.metadata, MutableMapping):
             logger.error(f"DBG_AI_HANDLE: Metadata inválida para {conversation.id}")
             # Resetear metadata si está mal? O devolver error? Devolver error es más seguro.
             return "Error interno: Metadata de conversación corrupta [AIH02]."
@@ -230,18 +403,11 @@ class AIServiceLLMDriven:
             # 3. Actualizar estado MÍNIMO en metadata
             #    (Solo si la respuesta NO fue un mensaje de error generado por _call_llm_api)
             #    Es importante chequear contra los posibles mensajes de error que devuelve _call_llm_api
-            possible_error_prefixes = (
-                "Error",
-                "Lo siento",
-                "(Respuesta inválida",
-                "(El asistente no",
-            )
-            if not llm_response.startswith(possible_error_prefixes):
+            if not is_llm_error_response(llm_response):
                 logger.debug(
                     f"DBG_AI_HANDLE: Actualizando metadata para {conversation.id}..."
                 )
                 try:  # Envolver actualización de metadata en try/except
-                    lines = llm_response.split("\n")
                     last_q_summary = conversation.metadata.get(
                         "current_question_asked_summary", "Desconocida"
                     )  # Mantener anterior si no hay nueva
@@ -250,27 +416,34 @@ class AIServiceLLMDriven:
 
                     # Buscar la pregunta formulada en la respuesta
                     question_found_in_response = False
-                    for line in lines:
-                        if line.strip().startswith("**PREGUNTA:**"):
-                            last_q_summary = (
-                                line.strip().replace("**PREGUNTA:**", "").strip()[:100]
-                            )
-                            question_found_in_response = True
-                            # Determinar ID de la primera pregunta si es el inicio
-                            if conversation.metadata.get("current_question_id") is None:
-                                initial_q_ids = [
-                                    q["id"]
-                                    for q in questionnaire_service.structure.get(
-                                        "initial_questions", []
-                                    )
-                                    if "id" in q
-                                ]
-                                if initial_q_ids:
-                                    first_question_id = initial_q_ids[0]
-                            break  # Solo la primera pregunta en la respuesta
+                    asked_question_id = None
+                    # Solo la primera pregunta en la respuesta
+                    asked_text = extract_asked_question(llm_response)
+                    if asked_text is not None:
+                        last_q_summary = asked_text[:100]
+                        question_found_in_response = True
+                        asked_question_id = self._match_asked_question(
+                            conversation, asked_text
+                        )
+                        # Determinar ID de la primera pregunta si es el inicio
+                        if conversation.metadata.get("current_question_id") is None:
+                            initial_q_ids = [
+                                q["id"]
+                                for q in questionnaire_service.structure.get(
+                                    "initial_questions", []
+                                )
+                                if "id" in q
+                            ]
+                            if initial_q_ids:
+                                first_question_id = initial_q_ids[0]
 
                     # Actualizar metadata
-                    if (
+                    if asked_question_id:
+                        conversation.metadata["current_question_id"] = asked_question_id
+                        logger.info(
+                            f"Metadata[current_question_id] actualizada a: '{asked_question_id}'"
+                        )
+                    elif (
                         first_question_id
                         and conversation.metadata.get("current_question_id") is None
                     ):
@@ -290,6 +463,15 @@ class AIServiceLLMDriven:
                         conversation.metadata["is_complete"] = False
                         conversation.metadata["has_proposal"] = False
 
+                        # El dato relevante del sector se añade aquí, no lo redacta el LLM
+                        insight = insight_service.get_insight(
+                            conversation.metadata, asked_question_id
+                        )
+                        if insight:
+                            llm_response = insert_before_question(
+                                llm_response, insight_service.format_insight(insight)
+                            )
+
                     if is_proposal:
                         proposal_clean_text = llm_response.split("[PROPOSAL_COMPLETE:")[
                             0
@@ -319,6 +501,9 @@ class AIServiceLLMDriven:
                     f"DBG_AI_HANDLE: Respuesta de LLM fue un mensaje de error, no se actualiza metadata: '{llm_response}'"
                 )
 
+        except HTTPException:
+            # Servicio saturado (control de admisión): la ruta responde 503
+            raise
         except ValueError as e:  # Capturar error de _prepare_messages
             logger.error(
                 f"DBG_AI_HANDLE: Error preparando mensajes: {e}", exc_info=True
@@ -0,0 +1,195 @@
+# app/services/answer_normalizer.py
+"""
+Normalización de respuestas del cuestionario.
+
+Cada respuesta del usuario se asocia a su pregunta y se interpreta localmente
+(opción elegida por número o texto, sí/no, caudales, costos y parámetros de
+calidad) para guardar valores tipados en metadata["collected_data"]. Con esos
+datos se arma el resumen compacto de la conversación (conversation_digest).
+
+Unidades canónicas: caudales en m³/día, costo del agua en USD/m³ y parámetros
+de calidad en mg/L (pH sin unidad).
+"""
+
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+from app.services.questionnaire_service import normalize_text, questionnaire_service
+from app.utils.units import (
+    format_quantity,
+    parse_flow_m3_per_day,
+    parse_periods_per_day,
+    parse_quality_parameters,
+    parse_unit_cost_usd_per_m3,
+    upper_value,
+)
+
+logger = logging.getLogger("hydrous")
+
+# Respuestas con solo números de opción: "2", "1, 3", "2 y 4"
+_OPTION_NUMBERS_RE = re.compile(
+    r"^\s*\d{1,2}(?:\s*(?:,|y|/|\s)\s*\d{1,2})*\s*[.)]?\s*$"
+)
+_YES = frozenset({"si", "s", "yes", "y", "claro", "correcto", "afirmativo"})
+_NO = frozenset({"no", "n", "negativo", "ninguno", "ninguna"})
+
+FLOW_ROLES = ("water_consumption", "wastewater_generation")
+PARAMETER_UNITS = {"PH": ""}  # El resto en mg/L
+
+
+class AnswerNormalizer:
+    """Interpreta respuestas libres y las guarda como datos tipados."""
+
+    # --- Interpretación ---
+
+    def normalize(
+        self, question_id: str, answer: str, metadata: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        """
+        Devuelve el valor tipado de una respuesta, o el texto original si no se
+        puede interpretar.
+        """
+        text = (answer or "").strip()
+        question = questionnaire_service.get_question_details(question_id)
+        if not text or not question:
+            return text
+
+        role = questionnaire_service.get_question_role(question_id)
+        value: Any = None
+        if role in FLOW_ROLES:
+            # Periodo implícito en la pregunta, p.ej. "Consumo agua (m³/mes)"
+            period = parse_periods_per_day(question.get("text", "")) or 1.0
+            value = parse_flow_m3_per_day(text, default_period_per_day=period)
+        elif role == "water_cost":
+            value = parse_unit_cost_usd_per_m3(text)
+        elif role == "water_quality":
+            value = parse_quality_parameters(text) or None
+        elif role and role.startswith("param_"):
+            value = upper_value(text)
+        elif question.get("type") in ("multiple_choice", "conditional_multiple_choice"):
+            value = self._match_options(
+                text, self._question_options(question, metadata)
+            )
+        elif question.get("type") == "yes_no":
+            value = self._parse_yes_no(text)
+
+        if isinstance(value, float):
+            value = round(value, 4)
+        return text if value is None else value
+
+    @staticmethod
+    def _question_options(
+        question: Dict[str, Any], metadata: Optional[Dict[str, Any]]
+    ) -> List[Any]:
+        if question.get("type") == "conditional_multiple_choice":
+            key = question.get("depends_on_key", "selected_sector")
+            selected = (metadata or {}).get(key)
+            return question.get("conditions", {}).get(selected, [])
+        return question.get("options") or []
+
+    @staticmethod
+    def _match_options(text: str, options: List[Any]) -> Any:
+        """
+        Convierte "2" o "1, 3" en el texto de las opciones y reconoce opciones
+        escritas. Las opciones abreviadas (...) del cuestionario no se pueden
+        resolver y en ese caso se conserva el texto.
+        """
+        if _OPTION_NUMBERS_RE.match(text):
+            indexes = [int(n) - 1 for n in re.findall(r"\d+", text)]
+            chosen = [
+                options[i]
+                for i in indexes
+                if 0 <= i < len(options) and isinstance(options[i], str)
+            ]
+            if len(chosen) == len(indexes):
+                return chosen[0] if len(chosen) == 1 else chosen
+            return None
+
+        normalized = normalize_text(text).strip(" .")
+        named = [o for o in options if isinstance(o, str)]
+        for option in named:
+            if normalize_text(option) == normalized:
+                return option
+        for option in named:
+            option_text = normalize_text(option)
+            if len(normalized) >= 3 and (
+                option_text in normalized or normalized in option_text
+            ):
+                return option
+        return None
+
+    @staticmethod
+    def _parse_yes_no(text: str) -> Optional[bool]:
+        first_word = normalize_text(text).strip(" .!¡").split(" ", 1)[0].strip(",.")
+        if first_word in _YES or first_word == "1":
+            return True
+        if first_word in _NO or first_word == "2":
+            return False
+        return None
+
+    # --- Registro en metadata ---
+
+    def record_answer(
+        self, metadata: Dict[str, Any], question_id: str, answer: str
+    ) -> Any:
+        """
+        Guarda la respuesta cruda (response_summaries) y su valor tipado
+        (collected_data). Las preguntas iniciales actualizan además el nombre del
+        cliente, el sector y el subsector.
+        """
+        value = self.normalize(question_id, answer, metadata)
+        if metadata.get("response_summaries") is None:
+            metadata["response_summaries"] = {}
+        metadata["response_summaries"][question_id] = {
+            "question": metadata.get("current_question_asked_summary", ""),
+            "answer": (answer or "").strip(),
+        }
+        if metadata.get("collected_data") is None:
+            metadata["collected_data"] = {}
+        metadata["collected_data"][question_id] = value
+
+        if question_id == "INIT_0" and isinstance(value, str) and value:
+            metadata["client_name"] = value
+        elif question_id == "INIT_1" and value in questionnaire_service.structure.get(
+            "sector_questionnaires", {}
+        ):
+            if metadata.get("selected_sector") != value:
+                metadata["selected_subsector"] = None
+            metadata["selected_sector"] = value
+        elif question_id == "INIT_2" and isinstance(value, str):
+            question = questionnaire_service.get_question_details(question_id) or {}
+            if value in self._question_options(question, metadata):
+                metadata["selected_subsector"] = value
+
+        logger.info(f"Respuesta normalizada para {question_id}: {value!r}")
+        return value
+
+    # --- Presentación ---
+
+    def format_value(self, question_id: str, value: Any) -> str:
+        """Representación legible de un valor tipado."""
+        role = questionnaire_service.get_question_role(question_id)
+        if isinstance(value, bool):
+            return "Sí" if value else "No"
+        if isinstance(value, list):
+            return ", ".join(str(v) for v in value)
+        if isinstance(value, dict):
+            return ", ".join(
+                f"{k} {format_quantity(v, PARAMETER_UNITS.get(k, 'mg/L')).strip()}"
+                for k, v in value.items()
+            )
+        if isinstance(value, (int, float)):
+            if role in FLOW_ROLES:
+                return format_quantity(value, "m³/día")
+            if role == "water_cost":
+                return f"{value:,.2f} USD/m³"
+            if role and role.startswith("param_"):
+                key = role[len("param_") :]
+                return format_quantity(value, PARAMETER_UNITS.get(key, "mg/L")).strip()
+            return f"{value:g}"
+        return str(value)
+
+
+# Instancia global
+answer_normalizer = AnswerNormalizer()
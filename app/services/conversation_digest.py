@@ -0,0 +1,97 @@
+# app/services/conversation_digest.py
+"""
+Resumen compacto y acumulativo de la conversación.
+
+Por cada respuesta registrada se guarda una línea "pregunta: valor" en
+metadata["digest"] (una entrada por pregunta, en el orden en que se respondió),
+sin los textos de relleno del asistente. El resumen se usa en lugar de la
+transcripción completa para generar propuestas y en los turnos de chat con
+historial largo, de modo que el tamaño del prompt queda acotado.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from app.services.answer_normalizer import answer_normalizer
+from app.services.questionnaire_service import questionnaire_service
+
+logger = logging.getLogger("hydrous")
+
+# Límites del resumen
+DIGEST_LINE_MAX_CHARS = 200
+DIGEST_MAX_CHARS = 4000
+
+# Preguntas iniciales que se resumen en la cabecera (cliente y sector)
+_HEADER_QUESTION_IDS = ("INIT_0", "INIT_1", "INIT_2")
+
+
+class ConversationDigest:
+    """Mantiene el resumen incremental de una conversación en su metadata."""
+
+    def _line(self, question_id: str, value: Any) -> str:
+        label = questionnaire_service.get_question_label(question_id)
+        line = f"- {label}: {answer_normalizer.format_value(question_id, value)}"
+        if len(line) > DIGEST_LINE_MAX_CHARS:
+            line = line[: DIGEST_LINE_MAX_CHARS - 1] + "…"
+        return line
+
+    def update(self, metadata: Dict[str, Any], question_id: str, value: Any):
+        """Añade o reemplaza la línea de una pregunta tras registrar su respuesta."""
+        if question_id in _HEADER_QUESTION_IDS:
+            return
+        if metadata.get("digest") is None:
+            metadata["digest"] = {}
+        if value in (None, "", [], {}):
+            metadata["digest"].pop(question_id, None)
+            return
+        metadata["digest"][question_id] = self._line(question_id, value)
+
+    def _rebuild(self, metadata: Dict[str, Any]) -> Dict[str, str]:
+        """Reconstruye el resumen desde collected_data (conversaciones anteriores)."""
+        digest: Dict[str, str] = {}
+        metadata["digest"] = digest
+        for question_id, value in (metadata.get("collected_data") or {}).items():
+            self.update(metadata, question_id, value)
+        return digest
+
+    def render(
+        self, metadata: Dict[str, Any], max_chars: Optional[int] = DIGEST_MAX_CHARS
+    ) -> str:
+        """
+        Texto del resumen: cabecera con cliente y sector más una línea por
+        respuesta. Si supera max_chars se omiten las líneas más antiguas; con
+        max_chars=None (propuestas, donde el resumen es la única fuente de datos
+        del cliente) se incluyen todas. Devuelve "" si todavía no hay respuestas.
+        """
+        if not metadata.get("collected_data"):
+            return ""
+        digest = metadata.get("digest")
+        if digest is None:
+            digest = self._rebuild(metadata)
+
+        sector = metadata.get("selected_sector") or "No indicado"
+        subsector = metadata.get("selected_subsector") or "No indicado"
+        header = [
+            f"- Cliente: {metadata.get('client_name') or 'No indicado'}",
+            f"- Sector: {sector} / {subsector}",
+        ]
+        lines: List[str] = list(digest.values())
+        if max_chars is None:
+            return "\n".join(header + lines)
+
+        budget = max_chars - sum(len(line) + 1 for line in header)
+        kept: List[str] = []
+        for line in reversed(lines):
+            budget -= len(line) + 1
+            if budget < 0:
+                break
+            kept.append(line)
+        kept.reverse()
+        omitted = len(lines) - len(kept)
+        if omitted:
+            header.append(f"- ({omitted} respuestas anteriores omitidas)")
+        return "\n".join(header + kept)
+
+
+# Instancia global
+conversation_digest = ConversationDigest()
@@ -0,0 +1,192 @@
+# app/services/conversation_locks.py
+"""
+Serialización de peticiones por conversación e idempotencia de mensajes.
+
+Dos /message seguidos para la misma conversación leen y modifican el mismo
+objeto Conversation; con un asyncio.Lock por conversación se procesan de uno en
+uno. Los locks se guardan con referencias débiles: desaparecen en cuanto ninguna
+petición los usa, así la memoria no crece con el número de conversaciones.
+
+Los reintentos del cliente con la misma idempotency_key reciben la respuesta ya
+calculada (caché LRU acotada) en lugar de provocar otra llamada al LLM.
+"""
+
+import asyncio
+import logging
+import uuid
+import weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.config import settings
+from app.services.redis_backend import (
+    get_redis,
+    redis_enabled,
+    release_lease,
+    renew_lease,
+)
+from app.services.redis_backend import key as redis_key
+from app.utils.serialization import dumps_json, loads_json
+
+logger = logging.getLogger("hydrous")
+
+# Backend Redis: caducidad del lock (por si el worker que lo tiene muere; se
+# renueva mientras la petición sigue en curso), espera máxima para obtenerlo y
+# caducidad de las respuestas guardadas por idempotency_key
+REDIS_LOCK_TIMEOUT = 30
+REDIS_LOCK_RENEW_INTERVAL = REDIS_LOCK_TIMEOUT / 3
+REDIS_LOCK_WAIT = 60
+REDIS_LOCK_POLL = 0.05
+IDEMPOTENCY_TTL = 60 * 60 * 24
+
+
+class ConversationLockManager:
+    """Un asyncio.Lock por conversación, vivo solo mientras se usa."""
+
+    def __init__(self):
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = (
+            weakref.WeakValueDictionary()
+        )
+
+    def get_lock(self, conversation_id: str) -> asyncio.Lock:
+        lock = self._locks.get(conversation_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[conversation_id] = lock
+        return lock
+
+    @asynccontextmanager
+    async def lock(self, conversation_id: str):
+        """Uso: async with conversation_locks.lock(conversation_id): ..."""
+        lock = self.get_lock(conversation_id)
+        if lock.locked():
+            logger.info(f"Petición en espera: conversación {conversation_id} ocupada")
+        async with lock:
+            yield
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+class IdempotencyCache:
+    """Respuestas recientes por (conversation_id, idempotency_key), en orden LRU."""
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._responses: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+
+    async def get(
+        self, conversation_id: str, key: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        if not key:
+            return None
+        response = self._responses.get((conversation_id, key))
+        if response is not None:
+            self._responses.move_to_end((conversation_id, key))
+        return response
+
+    async def put(
+        self, conversation_id: str, key: Optional[str], response: Dict[str, Any]
+    ):
+        if not key:
+            return
+        self._responses[(conversation_id, key)] = response
+        self._responses.move_to_end((conversation_id, key))
+        while len(self._responses) > self.max_entries:
+            self._responses.popitem(last=False)
+
+
+class RedisConversationLockManager(ConversationLockManager):
+    """
+    Lock compartido entre workers: SET NX con caducidad y un token propio. Una
+    tarea renueva la caducidad mientras la petición sigue en curso, y al
+    terminar se borra con un script Lua solo si el token sigue siendo el
+    nuestro. El asyncio.Lock local evita que las peticiones del mismo proceso
+    compitan sondeando Redis. Si no se obtiene en REDIS_LOCK_WAIT segundos se
+    responde 409 con Retry-After.
+    """
+
+    @staticmethod
+    def _busy(conversation_id: str):
+        logger.warning(f"Conversación {conversation_id} ocupada: se agota la espera")
+        raise HTTPException(
+            status_code=409,
+            detail="La conversación está procesando otro mensaje, inténtalo de nuevo.",
+            headers={"Retry-After": "5"},
+        )
+
+    @asynccontextmanager
+    async def lock(self, conversation_id: str):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + REDIS_LOCK_WAIT
+        local_lock = self.get_lock(conversation_id)
+        if local_lock.locked():
+            logger.info(f"Petición en espera: conversación {conversation_id} ocupada")
+        try:
+            await asyncio.wait_for(local_lock.acquire(), REDIS_LOCK_WAIT)
+        except asyncio.TimeoutError:
+            self._busy(conversation_id)
+        try:
+            redis = get_redis()
+            lock_key = redis_key("lock", conversation_id)
+            token = uuid.uuid4().hex
+            while not await redis.set(
+                lock_key, token, nx=True, px=int(REDIS_LOCK_TIMEOUT * 1000)
+            ):
+                if loop.time() >= deadline:
+                    self._busy(conversation_id)
+                await asyncio.sleep(REDIS_LOCK_POLL)
+
+            stop_renewal = asyncio.Event()
+            renewal = asyncio.create_task(
+                renew_lease(
+                    lock_key,
+                    token,
+                    REDIS_LOCK_TIMEOUT,
+                    REDIS_LOCK_RENEW_INTERVAL,
+                    stop_renewal,
+                )
+            )
+            try:
+                yield
+            finally:
+                stop_renewal.set()
+                await renewal
+                await release_lease(lock_key, token)
+        finally:
+            local_lock.release()
+
+
+class RedisIdempotencyCache(IdempotencyCache):
+    """Respuestas guardadas en Redis durante IDEMPOTENCY_TTL segundos."""
+
+    async def get(
+        self, conversation_id: str, key: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        if not key:
+            return None
+        raw = await get_redis().get(redis_key("idem", conversation_id, key))
+        return loads_json(raw) if raw else None
+
+    async def put(
+        self, conversation_id: str, key: Optional[str], response: Dict[str, Any]
+    ):
+        if not key:
+            return
+        await get_redis().set(
+            redis_key("idem", conversation_id, key),
+            dumps_json(response),
+            ex=IDEMPOTENCY_TTL,
+        )
+
+
+# Instancias globales
+if redis_enabled():
+    conversation_locks = RedisConversationLockManager()
+    idempotency_cache = RedisIdempotencyCache(settings.IDEMPOTENCY_CACHE_SIZE)
+else:
+    conversation_locks = ConversationLockManager()
+    idempotency_cache = IdempotencyCache(settings.IDEMPOTENCY_CACHE_SIZE)
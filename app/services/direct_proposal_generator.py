@@ -1,16 +1,27 @@
 import os
+import asyncio
 import logging
 import json
-import re
 from datetime import datetime
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
+from typing import Any, Dict, List, Optional, Tuple
+from reportlab.platypus import SimpleDocTemplate
 
 from app.config import settings
 from app.models.conversation import Conversation
+from app.prompts.proposal_sections import (
+    CONTINUATION_PROMPT,
+    PROPOSAL_FOOTER,
+    PROPOSAL_HEADER,
+    PROPOSAL_SECTIONS,
+    build_proposal_format,
+    build_section_prompt,
+)
+from app.services.conversation_digest import conversation_digest
+from app.services.proposal_calculator import proposal_calculator
+from app.utils import pdf_theme
+from app.utils.alerts import send_error_alert
+from app.utils.incremental_pdf import IncrementalDocTemplate
+from app.utils.markdown_flowables import MarkdownFlowableParser, markdown_to_flowables
 
 logger = logging.getLogger("hydrous")
 
@@ -24,13 +35,34 @@ class DirectProposalGenerator:
     async def generate_complete_proposal(self, conversation: Conversation) -> str:
         """Genera la propuesta y el PDF directamente, devuelve la ruta al PDF."""
         try:
-            # 1. Extraer información de la conversación
-            conversation_text = self._extract_conversation_text(conversation)
+            # 1. Extraer información de la conversación (ficha compacta si hay datos)
+            conversation_text = self._conversation_context(conversation)
 
-            # 2. Llamar a la API de IA con un prompt específico y directo
-            proposal_text = await self._generate_proposal_with_ai(conversation_text)
+            # 2. Calcular localmente dimensionamiento y cifras financieras
+            local_sections, calculation_summary = self._calculate_local_sections(
+                conversation
+            )
 
-            # 3. Guardar propuesta para debugging
+            # 3. Llamar a la API de IA con un prompt específico y directo.
+            #    En modo "streaming" el PDF se maqueta mientras llega el texto.
+            pdf_path = None
+            if settings.PROPOSAL_MODE == "streaming":
+                proposal_text, pdf_path = await self._generate_proposal_streaming(
+                    conversation_text,
+                    conversation.id,
+                    local_sections,
+                    calculation_summary,
+                )
+            elif settings.PROPOSAL_MODE == "sections":
+                proposal_text = await self._generate_proposal_by_sections(
+                    conversation_text, local_sections
+                )
+            else:
+                proposal_text = await self._generate_proposal_with_ai(
+                    conversation_text, local_sections, calculation_summary
+                )
+
+            # 4. Guardar propuesta para debugging
             debug_dir = os.path.join(settings.UPLOAD_DIR, "debug")
             os.makedirs(debug_dir, exist_ok=True)
             with open(
@@ -40,10 +72,11 @@ class DirectProposalGenerator:
             ) as f:
                 f.write(proposal_text)
 
-            # 4. Generar PDF directamente sin pasar por otros servicios
-            pdf_path = self._generate_pdf(proposal_text, conversation.id)
+            # 5. Generar PDF directamente sin pasar por otros servicios
+            if not pdf_path:
+                pdf_path = self._generate_pdf(proposal_text, conversation.id)
 
-            # 5. Actualizar metadata
+            # 6. Actualizar metadata
             if pdf_path:
                 conversation.metadata["proposal_text"] = proposal_text
                 conversation.metadata["pdf_path"] = pdf_path
@@ -54,24 +87,85 @@ class DirectProposalGenerator:
             logger.error(
                 f"Error en generación directa de propuesta: {e}", exc_info=True
             )
+            send_error_alert(
+                "Generación de propuesta",
+                type(e).__name__,
+                {"conversation_id": conversation.id, "error": str(e)},
+            )
             return None
 
     def _extract_conversation_text(self, conversation: Conversation) -> str:
-        """Extrae el texto de la conversación."""
+        """
+        Extrae el texto de la conversación. De los mensajes del asistente solo se
+        conserva la pregunta formulada, sin los bloques de datos y explicaciones.
+        """
+        from app.services.ai_service import extract_asked_question
+
         conversation_text = ""
         if conversation.messages:
             for msg in conversation.messages:
                 role = getattr(msg, "role", "unknown")
                 content = getattr(msg, "content", "")
+                if content and role == "assistant":
+                    content = extract_asked_question(content) or content[:300]
                 if content and role in ["user", "assistant"]:
                     conversation_text += f"{role.upper()}: {content}\n\n"
         return conversation_text
 
-    async def _generate_proposal_with_ai(self, conversation_text: str) -> str:
-        """Genera propuesta con la IA usando un prompt muy específico."""
-        from app.services.ai_service import ai_service
-
-        prompt = f"""
+    def _conversation_context(self, conversation: Conversation) -> str:
+        """
+        Contexto del cliente para los prompts: el resumen acumulado de respuestas si
+        existe (completo: la propuesta no debe perder respuestas antiguas); si no,
+        la transcripción.
+        """
+        digest = conversation_digest.render(conversation.metadata or {}, max_chars=None)
+        if digest:
+            return f"DATOS DEL CLIENTE (respuestas al cuestionario):\n{digest}"
+        return self._extract_conversation_text(conversation)
+
+    def _calculate_local_sections(
+        self, conversation: Conversation
+    ) -> Tuple[Dict[str, str], str]:
+        """
+        Calcula con ProposalCalculator las secciones con cifras (parámetros, proceso,
+        equipos, finanzas y ROI). Devuelve (secciones por id, resumen para la IA); si
+        el cálculo falla devuelve ({}, "") y la IA genera la propuesta completa.
+        """
+        try:
+            result = proposal_calculator.calculate(conversation)
+            return (
+                proposal_calculator.render_sections(result),
+                proposal_calculator.summarize(result),
+            )
+        except Exception as e:
+            logger.error(
+                f"Error en el cálculo local de la propuesta: {e}", exc_info=True
+            )
+            return {}, ""
+
+    def _local_sections_text(self, local_sections: Dict[str, str]) -> str:
+        """Secciones calculadas localmente y estáticas, en orden, más el pie de contacto."""
+        blocks = []
+        for section in PROPOSAL_SECTIONS:
+            if section["id"] in local_sections:
+                blocks.append(f"{section['title']}\n{local_sections[section['id']]}")
+            elif section.get("static"):
+                blocks.append(f"{section['title']}\n{section['format']}")
+        blocks.append(PROPOSAL_FOOTER)
+        return "\n\n".join(blocks)
+
+    def _build_proposal_prompt(
+        self,
+        conversation_text: str,
+        local_sections: Optional[Dict[str, str]] = None,
+        calculation_summary: str = "",
+    ) -> str:
+        """
+        Construye el prompt de la propuesta. Si hay secciones calculadas localmente,
+        la IA solo redacta las secciones narrativas y recibe las cifras como contexto.
+        """
+        if not local_sections:
+            return f"""
 # GENERA UNA PROPUESTA PROFESIONAL DE TRATAMIENTO DE AGUA SIGUIENDO EXACTAMENTE ESTE FORMATO
 
 Basándote en la conversación:
@@ -85,94 +179,237 @@ Basándote en la conversación:
 
 ## FORMATO EXACTO A SEGUIR:
 
-**Hydrous Management Group -- AI-Generated Wastewater Treatment Proposal**
-
-**Important Disclaimer**
-[Breve disclaimer de 2 líneas máximo]
-
-**1. Introduction to Hydrous Management Group**
-[Máximo 3 párrafos cortos sobre la empresa]
-
-**2. Project Background**
-| **Client Information** | **Details** |
-| ------------------ | --------------- |
-| **Client Name** | [Nombre específico] |
-| **Location** | [Ubicación] |
-| **Industry** | [Sector] |
-| **Water Source** | [Fuente] |
-| **Current Water Consumption** | [X m³/día] |
-| **Current Wastewater Generation** | [Y m³/día] |
-| **Existing Treatment System** | [Sistema o "No existing treatment"] |
-
-**3. Objective of the Project**
-✓ **Regulatory Compliance** -- [1 frase específica]
-✓ **Cost Optimization** -- [1 frase específica]
-✓ **Water Reuse** -- [1 frase específica]
-✓ **Sustainability** -- [1 frase específica]
-
-**4. Key Design Parameters**
-| **Parameter** | **Current Value** | **Target Value** |
-| ------------- | --------------- | ---------------- |
-| **TSS (mg/L)** | [valor] | [valor] |
-| **COD (mg/L)** | [valor] | [valor] |
-| **BOD (mg/L)** | [valor] | [valor] |
-| **pH** | [valor] | [valor] |
-
-**5. Recommended Treatment Process**
-| **Treatment Stage** | **Technology** | **Function** |
-| ------------------ | ------------- | ------------ |
-| **Primary** | [tecnología específica] | [función principal] |
-| **Secondary** | [tecnología específica] | [función principal] |
-| **Tertiary** | [tecnología específica] | [función principal] |
-| **Final** | [tecnología específica] | [función principal] |
-
-**6. Equipment Specifications**
-| **Equipment** | **Capacity** | **Est. Cost (USD)** |
-| ------------- | ------------ | ------------------ |
-| [Equipo 1] | [capacidad] | [costo] |
-| [Equipo 2] | [capacidad] | [costo] |
-| [Equipo 3] | [capacidad] | [costo] |
-| [Equipo 4] | [capacidad] | [costo] |
-
-**7. Financial Summary**
-
-**CAPEX: $[valor total] USD**
-- Equipment: $[valor] USD
-- Installation: $[valor] USD
-- Engineering: $[valor] USD
-
-**Monthly OPEX: $[valor total] USD**
-- Chemicals: $[valor] USD
-- Energy: $[valor] USD
-- Labor: $[valor] USD
-- Maintenance: $[valor] USD
-
-**8. Return on Investment Analysis**
-- Current water cost: $[valor] USD/month
-- Projected water cost: $[valor] USD/month
-- Monthly savings: $[valor] USD
-- ROI period: [X] years
-
-**9. Next Steps**
-1. Technical validation meeting
-2. Site assessment
-3. Detailed engineering proposal
-4. Implementation schedule
-
-Contact: info@hydrous.com | www.hydrous.com | +52 55 1234 5678
+{build_proposal_format()}
 """
+
+        excluded = [
+            section["id"]
+            for section in PROPOSAL_SECTIONS
+            if section["id"] in local_sections or section.get("static")
+        ]
+        return f"""
+# GENERA LA PARTE NARRATIVA DE UNA PROPUESTA PROFESIONAL DE TRATAMIENTO DE AGUA
+
+Basándote en la conversación:
+{conversation_text}
+
+## CIFRAS YA CALCULADAS (se añaden después como tablas, NO las repitas ni las cambies):
+{calculation_summary}
+
+## INSTRUCCIONES CRÍTICAS:
+1. Escribe ÚNICAMENTE las secciones del formato - termina después de la última.
+2. Sé CONCISO y DIRECTO - menos texto, más información concreta.
+3. Si mencionas cifras, usa solo las calculadas arriba o las dadas por el cliente.
+
+## FORMATO EXACTO A SEGUIR:
+
+{build_proposal_format(exclude=excluded, include_footer=False)}
+"""
+
+    @staticmethod
+    def _max_tokens(local_sections: Dict[str, str]) -> int:
+        """Sin secciones de cifras la IA solo redacta la narrativa: basta un límite menor."""
+        return 3000 if local_sections else 7000
+
+    async def _generate_proposal_with_ai(
+        self,
+        conversation_text: str,
+        local_sections: Optional[Dict[str, str]] = None,
+        calculation_summary: str = "",
+    ) -> str:
+        """Genera propuesta con la IA usando un prompt muy específico."""
+        from app.services.ai_service import ai_service
+
+        local_sections = local_sections or {}
+        prompt = self._build_proposal_prompt(
+            conversation_text, local_sections, calculation_summary
+        )
         try:
             messages = [{"role": "user", "content": prompt}]
             # Usar parámetros más agresivos para forzar creatividad y especificidad
             proposal_text = await ai_service._call_llm_api(
-                messages, max_tokens=7000, temperature=0.7
+                messages, max_tokens=self._max_tokens(local_sections), temperature=0.7
             )
+            if local_sections:
+                proposal_text = f"{proposal_text.strip()}\n\n{self._local_sections_text(local_sections)}"
             return proposal_text
         except Exception as e:
             logger.error(f"Error llamando a la IA: {e}", exc_info=True)
             # Propuesta de emergencia
             return self._generate_emergency_proposal()
 
+    async def _generate_proposal_by_sections(
+        self,
+        conversation_text: str,
+        local_sections: Optional[Dict[str, str]] = None,
+    ) -> str:
+        """
+        Genera cada sección de la propuesta con una llamada independiente, en paralelo
+        y con un límite de concurrencia, y las ensambla en orden. Si una sección falla
+        se usa su contenido de emergencia. Las secciones calculadas localmente no
+        pasan por la IA.
+        """
+        local_sections = local_sections or {}
+        semaphore = asyncio.Semaphore(max(1, settings.PROPOSAL_SECTION_CONCURRENCY))
+        section_texts = await asyncio.gather(
+            *(
+                self._generate_section(
+                    section, conversation_text, semaphore, local_sections
+                )
+                for section in PROPOSAL_SECTIONS
+            )
+        )
+        return "\n\n".join([PROPOSAL_HEADER, *section_texts, PROPOSAL_FOOTER])
+
+    async def _generate_section(
+        self,
+        section: Dict[str, Any],
+        conversation_text: str,
+        semaphore: asyncio.Semaphore,
+        local_sections: Optional[Dict[str, str]] = None,
+    ) -> str:
+        """Genera una sección; devuelve el contenido de emergencia si la IA falla."""
+        from app.services.ai_service import ai_service, is_llm_error_response
+
+        title = section["title"]
+        if local_sections and section["id"] in local_sections:
+            return f"{title}\n{local_sections[section['id']]}"
+        if section.get("static"):
+            return f"{title}\n{section['format']}"
+
+        fallback = f"{title}\n{section['fallback']}"
+        try:
+            async with semaphore:
+                messages = [
+                    {
+                        "role": "user",
+                        "content": build_section_prompt(section, conversation_text),
+                    }
+                ]
+                section_text = await ai_service._call_llm_api(
+                    messages, max_tokens=1200, temperature=0.7
+                )
+        except Exception as e:
+            logger.error(
+                f"Error generando sección '{section['id']}': {e}", exc_info=True
+            )
+            return fallback
+
+        if not section_text or is_llm_error_response(section_text):
+            logger.warning(
+                f"Sección '{section['id']}' sin contenido válido, usando contenido de emergencia."
+            )
+            return fallback
+
+        section_text = section_text.strip()
+        # Asegurar el título exacto aunque la IA lo omita
+        if title.strip("*") not in section_text.split("\n", 1)[0]:
+            section_text = f"{title}\n{section_text}"
+        return section_text
+
+    async def _generate_proposal_streaming(
+        self,
+        conversation_text: str,
+        conversation_id: str,
+        local_sections: Optional[Dict[str, str]] = None,
+        calculation_summary: str = "",
+    ) -> Tuple[str, Optional[str]]:
+        """
+        Genera la propuesta en streaming y maqueta el PDF a medida que se completan
+        líneas y tablas, de modo que al terminar el LLM solo queda cerrar el documento.
+        Devuelve (texto, ruta_pdf). Si el streaming falla sin haber recibido texto,
+        cae al modo de una llamada; si ya llegó texto, se pide solo lo que faltaba.
+        En ambos casos la ruta es None para que el PDF se genere de la forma habitual.
+        """
+        from app.services.ai_service import ai_service
+
+        local_sections = local_sections or {}
+        prompt = self._build_proposal_prompt(
+            conversation_text, local_sections, calculation_summary
+        )
+        messages = [{"role": "user", "content": prompt}]
+        max_tokens = self._max_tokens(local_sections)
+        output_path = self.pdf_output_path(conversation_id)
+        doc = IncrementalDocTemplate(
+            output_path, pagesize=pdf_theme.PAGE_SIZE, **pdf_theme.PAGE_MARGINS
+        )
+        parser = MarkdownFlowableParser()
+        text_parts = []
+        stream_done = False
+        try:
+            doc.start(
+                onFirstPage=pdf_theme.draw_page_footer,
+                onLaterPages=pdf_theme.draw_page_footer,
+            )
+            async for chunk in ai_service._stream_llm_api(
+                messages, max_tokens=max_tokens, temperature=0.7
+            ):
+                text_parts.append(chunk)
+                doc.add(parser.feed(chunk))
+            stream_done = True
+            if local_sections:
+                tail = f"\n\n{self._local_sections_text(local_sections)}"
+                text_parts.append(tail)
+                doc.add(parser.feed(tail))
+            doc.add(parser.close())
+            doc.finish()
+            logger.info(
+                f"PDF maquetado en streaming ({doc.flowables_laid_out} elementos): {output_path}"
+            )
+            return "".join(text_parts), output_path
+        except Exception as e:
+            logger.error(
+                f"Error en generación de propuesta en streaming: {e}", exc_info=True
+            )
+
+        # Sin PDF incremental: se rehace el PDF con el texto completo
+        proposal_text = "".join(text_parts)
+        if not stream_done:
+            # Se descarta la última línea, que puede haber quedado cortada
+            proposal_text = proposal_text[: proposal_text.rfind("\n") + 1]
+            if not proposal_text.strip():
+                logger.info("Streaming sin texto recibido, usando modo simple")
+                proposal_text = await self._generate_proposal_with_ai(
+                    conversation_text, local_sections, calculation_summary
+                )
+                return proposal_text, None
+            continuation = await self._continue_proposal(
+                messages, proposal_text, max_tokens
+            )
+            proposal_text = f"{proposal_text}{continuation}"
+            if local_sections:
+                proposal_text = f"{proposal_text.strip()}\n\n{self._local_sections_text(local_sections)}"
+        return proposal_text, None
+
+    async def _continue_proposal(
+        self, messages: List[Dict[str, str]], partial_text: str, max_tokens: int
+    ) -> str:
+        """
+        Pide al LLM la continuación de una propuesta cortada (solo se generan las
+        líneas que faltaban). Devuelve "" si falla: queda la propuesta incompleta.
+        """
+        from app.services.ai_service import ai_service, is_llm_error_response
+
+        continuation_messages = [
+            *messages,
+            {"role": "assistant", "content": partial_text},
+            {"role": "user", "content": CONTINUATION_PROMPT},
+        ]
+        try:
+            continuation = await ai_service._call_llm_api(
+                continuation_messages, max_tokens=max_tokens, temperature=0.7
+            )
+        except Exception as e:
+            logger.error(f"Error al continuar la propuesta: {e}", exc_info=True)
+            return ""
+        if not continuation or is_llm_error_response(continuation):
+            logger.warning("La continuación de la propuesta no tiene contenido válido")
+            return ""
+        logger.info(
+            f"Propuesta reanudada tras {len(partial_text)} caracteres recibidos"
+        )
+        return continuation
+
     def _generate_emergency_proposal(self) -> str:
         """Genera una propuesta de emergencia sin IA si todo lo demás falla."""
         return """
@@ -203,213 +440,26 @@ Recomendamos un sistema integral compuesto por:
 Para más información, contacte a Hydrous Management Group.
 """
 
+    def pdf_output_path(self, conversation_id: str) -> str:
+        """Ruta del PDF de la propuesta de una conversación."""
+        return os.path.join(settings.UPLOAD_DIR, f"propuesta_{conversation_id}.pdf")
+
     def _generate_pdf(self, proposal_text: str, conversation_id: str) -> str:
         """Genera un PDF con formato a partir del texto de la propuesta."""
         try:
-            # Preparar ruta
-            pdf_filename = f"propuesta_{conversation_id}.pdf"
-            output_path = os.path.join(settings.UPLOAD_DIR, pdf_filename)
-
+            output_path = self.pdf_output_path(conversation_id)
             doc = SimpleDocTemplate(
-                output_path,
-                pagesize=A4,
-                rightMargin=1.5 * cm,
-                leftMargin=1.5 * cm,
-                topMargin=2 * cm,
-                bottomMargin=2 * cm,
+                output_path, pagesize=pdf_theme.PAGE_SIZE, **pdf_theme.PAGE_MARGINS
             )
 
-            # Definir estilos
-            styles = getSampleStyleSheet()
-
-            # Título principal
-            title_style = ParagraphStyle(
-                name="TitleStyle",
-                parent=styles["Heading1"],
-                fontSize=16,
-                textColor=colors.HexColor("#0056b3"),
-                spaceAfter=10,
-                alignment=1,
-            )
-
-            # Encabezados de sección
-            heading2_style = ParagraphStyle(
-                name="Heading2Style",
-                parent=styles["Heading2"],
-                fontSize=14,
-                textColor=colors.HexColor("#0056b3"),
-                spaceAfter=8,
-                spaceBefore=12,
-            )
-
-            # Texto normal
-            normal_style = ParagraphStyle(
-                name="NormalStyle",
-                parent=styles["Normal"],
-                fontSize=10,
-                spaceAfter=6,
-                leading=12,
-            )
-
-            # Texto en negrita (para usar dentro de párrafos)
-            bold_style = ParagraphStyle(
-                name="BoldStyle",
-                parent=normal_style,
-                fontName="Helvetica-Bold",
-            )
-
-            # Estilo para listas
-            list_style = ParagraphStyle(
-                name="ListStyle",
-                parent=styles["Normal"],
-                fontSize=10,
-                leftIndent=15,
-                spaceAfter=3,
-                bulletIndent=8,
-                leading=12,
-            )
-
-            # Elementos del PDF
-            elements = []
-
-            # Procesar líneas del texto, eliminar separadores
-            lines = proposal_text.replace("---", "").split("\n")
-            in_table = False
-            table_data = []
-
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-
-                # Detectar tablas con pipe
-                if "|" in line and line.count("|") >= 2:
-                    if not in_table:
-                        in_table = True
-                        table_data = []
-
-                    # Procesar celdas eliminando marcadores Markdown
-                    cells = [cell.strip() for cell in line.split("|")]
-                    cells = [c for c in cells if c]  # Eliminar celdas vacías
-
-                    # Limpiar marcadores Markdown en celdas
-                    processed_cells = []
-                    for cell in cells:
-                        # Eliminar guiones solitarios que son solo separadores
-                        if cell.strip() == "-":
-                            cell = " "
-                        # Eliminar marcadores de negrita pero mantener el texto
-                        if cell.startswith("**") and cell.endswith("**"):
-                            cell = cell[2:-2]
-                        processed_cells.append(cell)
-
-                    if processed_cells:
-                        table_data.append(processed_cells)
-
-                # Finalizar tabla si ya no hay pipes
-                elif in_table:
-                    in_table = False
-                    if table_data:
-                        # Crear tabla con formato mejorado
-                        num_cols = (
-                            len(table_data[0]) if table_data and table_data[0] else 0
-                        )
-                        if num_cols > 0:
-                            col_width = 16 * cm / num_cols
-                            col_widths = [col_width] * num_cols
-                            table = Table(table_data, colWidths=col_widths)
-
-                            # Estilo para la tabla
-                            table_style = TableStyle(
-                                [
-                                    (
-                                        "BACKGROUND",
-                                        (0, 0),
-                                        (-1, 0),
-                                        colors.HexColor("#f2f2f2"),
-                                    ),
-                                    (
-                                        "TEXTCOLOR",
-                                        (0, 0),
-                                        (-1, 0),
-                                        colors.HexColor("#0056b3"),
-                                    ),
-                                    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                                    ("FONTSIZE", (0, 0), (-1, 0), 10),
-                                    ("BOTTOMPADDING", (0, 0), (-1, 0), 6),
-                                    ("FONTSIZE", (0, 1), (-1, -1), 9),
-                                    (
-                                        "GRID",
-                                        (0, 0),
-                                        (-1, -1),
-                                        0.25,
-                                        colors.HexColor("#cccccc"),
-                                    ),
-                                    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-                                    ("PADDING", (0, 0), (-1, -1), 4),
-                                    ("WORDWRAP", (0, 0), (-1, -1), True),
-                                ]
-                            )
-                            table.setStyle(table_style)
-                            elements.append(table)
-                            elements.append(Spacer(1, 0.2 * cm))
-
-                    # Procesar la línea actual según formato Markdown
-                    self._process_markdown_line(
-                        line,
-                        elements,
-                        title_style,
-                        heading2_style,
-                        normal_style,
-                        list_style,
-                    )
-
-                # Procesar líneas normales con formato Markdown
-                else:
-                    self._process_markdown_line(
-                        line,
-                        elements,
-                        title_style,
-                        heading2_style,
-                        normal_style,
-                        list_style,
-                    )
-
-            # Si terminamos dentro de una tabla, procesarla
-            if in_table and table_data:
-                num_cols = len(table_data[0]) if table_data and table_data[0] else 0
-                if num_cols > 0:
-                    col_width = 16 * cm / num_cols
-                    col_widths = [col_width] * num_cols
-                    table = Table(table_data, colWidths=col_widths)
-                    table_style = TableStyle(
-                        [
-                            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#f2f2f2")),
-                            ("TEXTCOLOR", (0, 0), (-1, 0), colors.HexColor("#0056b3")),
-                            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                            ("FONTSIZE", (0, 0), (-1, 0), 10),
-                            ("BOTTOMPADDING", (0, 0), (-1, 0), 6),
-                            ("FONTSIZE", (0, 1), (-1, -1), 9),
-                            (
-                                "GRID",
-                                (0, 0),
-                                (-1, -1),
-                                0.25,
-                                colors.HexColor("#cccccc"),
-                            ),
-                            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-                            ("PADDING", (0, 0), (-1, -1), 4),
-                            ("WORDWRAP", (0, 0), (-1, -1), True),
-                        ]
-                    )
-                    table.setStyle(table_style)
-                    elements.append(table)
+            # Convertir markdown a elementos del PDF con el parser compartido
+            elements = markdown_to_flowables(proposal_text)
 
             # Construir PDF con números de página
             doc.build(
                 elements,
-                onFirstPage=self._add_page_number,
-                onLaterPages=self._add_page_number,
+                onFirstPage=pdf_theme.draw_page_footer,
+                onLaterPages=pdf_theme.draw_page_footer,
             )
 
             logger.info(f"PDF generado exitosamente en: {output_path}")
@@ -418,110 +468,6 @@ Para más información, contacte a Hydrous Management Group.
             logger.error(f"Error generando PDF: {e}", exc_info=True)
             return None
 
-    def _process_markdown_line(
-        self, line, elements, title_style, heading2_style, normal_style, list_style
-    ):
-        """Procesa una línea con formato Markdown y añade el elemento correspondiente."""
-
-        # 1. Procesar títulos/encabezados
-        if line.startswith("# "):
-            # Título principal
-            elements.append(Paragraph(line[2:], title_style))
-            return
-        elif line.startswith("## "):
-            # Subtítulo
-            elements.append(Paragraph(line[3:], heading2_style))
-            return
-
-        # 2. Procesar encabezados con formato "**Título**"
-        elif line.startswith("**") and line.endswith("**") and " " not in line[:5]:
-            # Es un encabezado en formato Markdown
-            title_text = line[2:-2]
-            elements.append(Paragraph(title_text, heading2_style))
-            return
-
-        # 3. Procesar elementos de lista con checkmarks
-        elif line.startswith("✓ "):
-            # Extraer y formatear el texto de la lista
-            list_text = line[2:]
-            # Eliminar marcadores de negrita en el texto de la lista
-            list_text = re.sub(r"\*\*(.*?)\*\*", r"\1", list_text)
-            elements.append(Paragraph(f"✓ {list_text}", list_style))
-            return
-        elif line.startswith("- ") or line.startswith("* "):
-            # Lista normal con viñetas
-            bullet_text = line[2:]
-            # Eliminar marcadores de negrita
-            bullet_text = re.sub(r"\*\*(.*?)\*\*", r"\1", bullet_text)
-            elements.append(Paragraph(f"• {bullet_text}", list_style))
-            return
-
-        # 4. Procesar texto normal con posible formato interno
-        # Reemplazar marcadores de negrita con etiquetas <b> para ReportLab
-        text = line
-        # Buscar patrones **texto** y reemplazarlos con <b>texto</b>
-        text = re.sub(r"\*\*(.*?)\*\*", r"<b>\1</b>", text)
-        elements.append(Paragraph(text, normal_style))
-
-    def _create_table(self, data):
-        """Versión simplificada y robusta para crear tablas."""
-        if not data or len(data) == 0:
-            return Spacer(1, 0.2 * cm)
-
-        # Ancho disponible fijo para tablas
-        available_width = 16 * cm
-
-        # Calcular número de columnas y distribuir el ancho
-        num_cols = len(data[0]) if data and len(data) > 0 else 0
-        if num_cols == 0:
-            return Spacer(1, 0.2 * cm)
-
-        # Limitar a máximo 4 columnas para legibilidad
-        if num_cols > 4:
-            logger.warning(
-                f"Tabla con {num_cols} columnas detectada - limitando a 4 columnas"
-            )
-            for i in range(len(data)):
-                if len(data[i]) > 4:
-                    data[i] = data[i][:4]
-            num_cols = 4
-
-        # Distribuir ancho equitativamente
-        col_widths = [available_width / num_cols] * num_cols
-
-        # Crear tabla con anchos fijos
-        table = Table(data, repeatRows=1, colWidths=col_widths)
-
-        # Estilo mejorado
-        table_style = TableStyle(
-            [
-                # Encabezado
-                ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#f2f2f2")),
-                ("TEXTCOLOR", (0, 0), (-1, 0), colors.HexColor("#0056b3")),
-                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                ("FONTSIZE", (0, 0), (-1, 0), 10),
-                ("BOTTOMPADDING", (0, 0), (-1, 0), 6),
-                # Cuerpo
-                ("FONTSIZE", (0, 1), (-1, -1), 9),
-                ("GRID", (0, 0), (-1, -1), 0.25, colors.HexColor("#cccccc")),
-                ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-                ("PADDING", (0, 0), (-1, -1), 4),
-                # Crucial para evitar truncamiento
-                ("WORDWRAP", (0, 0), (-1, -1), True),
-            ]
-        )
-        table.setStyle(table_style)
-        return table
-
-    def _add_page_number(self, canvas, doc):
-        """Añade número de página al pie de página."""
-        canvas.saveState()
-        canvas.setFont("Helvetica", 9)
-        canvas.setFillColor(colors.HexColor("#555555"))
-        footer_text = f"Página {canvas.getPageNumber()} | Hydrous Management Group"
-        canvas.drawCentredString(doc.width / 2 + doc.leftMargin, 1 * cm, footer_text)
-        canvas.restoreState()
-
 
 # Instancia global
 direct_proposal_generator = DirectProposalGenerator()
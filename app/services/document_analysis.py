@@ -0,0 +1,502 @@
+# app/services/document_analysis.py
+"""
+Análisis de documentos en segundo plano.
+
+La subida solo guarda el archivo y encola el documento; un grupo acotado de
+workers (DOCUMENT_WORKERS, cola de DOCUMENT_QUEUE_SIZE) extrae el texto con el
+extractor que corresponda (PDF, DOCX, CSV/XLSX o texto plano), busca los
+parámetros de calidad con el léxico precompilado y guarda el resultado en la
+metadata de la conversación ("documents").
+
+Los extractores entregan el texto por partes (páginas, párrafos, filas o
+bloques), así un informe grande nunca está completo en memoria. Para admitir
+otro formato basta con registrar un TextExtractor en document_analyzer.
+"""
+
+import abc
+import asyncio
+import codecs
+import copy
+import csv
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from app.config import settings
+from app.services.conversation_locks import conversation_locks
+from app.services.document_context import document_context
+from app.services.document_service import document_service
+from app.services.storage_service import storage_service
+from app.utils.alerts import send_error_alert
+from app.utils.units import parse_number
+
+logger = logging.getLogger("hydrous")
+
+
+# --- Léxico de parámetros ---
+
+
+class LexiconEntry(NamedTuple):
+    name: str
+    pattern: "re.Pattern"
+    # match -> valor (None si el texto no es un valor válido)
+    parse: Callable[["re.Match"], Any]
+
+
+# Unidades reconocidas → (unidad normalizada, factor)
+_UNITS = {
+    "mg/l": ("mg/L", 1.0),
+    "ppm": ("mg/L", 1.0),
+    "g/l": ("mg/L", 1000.0),
+    "µs/cm": ("µS/cm", 1.0),
+    "μs/cm": ("µS/cm", 1.0),
+    "us/cm": ("µS/cm", 1.0),
+    "ms/cm": ("µS/cm", 1000.0),
+}
+_UNIT_RE = r"mg\s*/\s*l|ppm|g\s*/\s*l|[µμu]s\s*/\s*cm|ms\s*/\s*cm"
+# Miles con coma ("1,250.5"), miles con punto ("1.250" o "1.250,5") o un número
+# con decimales opcionales; parse_number interpreta cada forma
+_VALUE_RE = (
+    r"(\d{1,3}(?:,\d{3})+(?:\.\d+)?"
+    r"|[1-9]\d{0,2}(?:\.\d{3})+(?![\d.])(?:,\d+)?"
+    r"|\d+(?:[.,]\d+)?)"
+)
+
+
+def _quantity(name: str, aliases: str, default_unit: str) -> LexiconEntry:
+    pattern = re.compile(
+        rf"(?<!\w)(?:{aliases})(?!\w)[^\d\n]{{0,30}}?{_VALUE_RE}\s*({_UNIT_RE})?",
+        re.IGNORECASE,
+    )
+
+    def parse(match: "re.Match") -> Optional[Dict[str, Any]]:
+        value = parse_number(match.group(1))
+        if value is None:
+            return None
+        unit, factor = default_unit, 1.0
+        if match.group(2):
+            unit, factor = _UNITS[re.sub(r"\s", "", match.group(2).lower())]
+        return {"value": value * factor, "unit": unit}
+
+    return LexiconEntry(name, pattern, parse)
+
+
+def _ph_entry() -> LexiconEntry:
+    pattern = re.compile(rf"(?<!\w)pH(?!\w)[^\d\n]{{0,30}}?{_VALUE_RE}")
+
+    def parse(match: "re.Match") -> Optional[Dict[str, Any]]:
+        # El pH no tiene miles: "7.125" son decimales
+        try:
+            value = float(match.group(1).replace(",", "."))
+        except ValueError:
+            return None
+        if not 0 <= value <= 14:
+            return None
+        return {"value": value, "unit": ""}
+
+    return LexiconEntry("pH", pattern, parse)
+
+
+def _text_entry(name: str, pattern: str) -> LexiconEntry:
+    return LexiconEntry(
+        name, re.compile(pattern, re.IGNORECASE), lambda match: match.group(1)
+    )
+
+
+# Parámetros de calidad en informes de laboratorio (nombres en español e inglés)
+LAB_LEXICON: List[LexiconEntry] = [
+    _ph_entry(),
+    _quantity(
+        "DBO",
+        r"DBO\s*5?|DBO₅|BOD\s*5?|demanda\s+bioqu[ií]mica\s+de\s+ox[ií]geno",
+        "mg/L",
+    ),
+    _quantity("DQO", r"DQO|COD|demanda\s+qu[ií]mica\s+de\s+ox[ií]geno", "mg/L"),
+    _quantity("SST", r"SST|TSS|s[óo]lidos\s+suspendidos(?:\s+totales)?", "mg/L"),
+    _quantity("conductividad", r"conductividad(?:\s+el[ée]ctrica)?|CE", "µS/cm"),
+]
+
+# Datos de facturas y recibos de agua
+INVOICE_LEXICON: List[LexiconEntry] = [
+    _text_entry("fecha", r"(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})"),
+    _text_entry("consumo", r"consumo:?\s*(\d+)"),
+    _text_entry("importe", r"total:?\s*\$?\s*(\d+(?:\.\d+)?)"),
+]
+
+
+class ParameterScanner:
+    """
+    Busca la primera coincidencia de cada entrada del léxico en un texto que
+    llega por partes. Entre partes se conservan los últimos OVERLAP caracteres;
+    una coincidencia que termina a menos de MARGIN caracteres del final se
+    confirma con la parte siguiente (el número o la unidad podrían continuar en
+    ella). OVERLAP cubre MARGIN más la coincidencia más larga del léxico.
+    """
+
+    OVERLAP = 256
+    MARGIN = 64
+
+    def __init__(self, lexicon: List[LexiconEntry]):
+        self._pending = list(lexicon)
+        self.found: Dict[str, Any] = {}
+        self._tail = ""
+
+    def feed(self, text: str, final: bool = False):
+        if not self._pending:
+            return
+        window = self._tail + text
+        limit = len(window) if final else len(window) - self.MARGIN
+        for entry in list(self._pending):
+            for match in entry.pattern.finditer(window):
+                if not final and match.end() >= limit:
+                    break
+                value = entry.parse(match)
+                if value is not None:
+                    self.found[entry.name] = value
+                    self._pending.remove(entry)
+                    break
+        self._tail = window[-self.OVERLAP :]
+
+    def finish(self) -> Dict[str, Any]:
+        self.feed("", final=True)
+        return self.found
+
+
+# --- Extractores de texto ---
+
+
+class TextExtractor(abc.ABC):
+    """Extrae el texto de un tipo de archivo, por partes."""
+
+    extensions: Tuple[str, ...] = ()
+    content_types: Tuple[str, ...] = ()
+
+    def accepts(self, filename: str, content_type: Optional[str]) -> bool:
+        ext = os.path.splitext(filename or "")[1].lower()
+        return ext in self.extensions or (content_type or "") in self.content_types
+
+    @abc.abstractmethod
+    def iter_text(self, path: str) -> Iterator[str]:
+        """Produce el texto del archivo en fragmentos consecutivos."""
+
+
+class PlainTextExtractor(TextExtractor):
+    extensions = (".txt", ".md", ".log")
+    content_types = ("text/plain", "text/markdown")
+
+    def iter_text(self, path: str) -> Iterator[str]:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        with open(path, "rb") as f:
+            while chunk := f.read(settings.UPLOAD_CHUNK_SIZE):
+                yield decoder.decode(chunk)
+        yield decoder.decode(b"", final=True)
+
+
+class PdfExtractor(TextExtractor):
+    extensions = (".pdf",)
+    content_types = ("application/pdf",)
+
+    def iter_text(self, path: str) -> Iterator[str]:
+        from pypdf import PdfReader
+
+        for page in PdfReader(path).pages:
+            yield (page.extract_text() or "") + "\n"
+
+
+class DocxExtractor(TextExtractor):
+    """Párrafos y tablas de un DOCX (python-docx, como en convert_docx_to_txt)."""
+
+    extensions = (".docx",)
+    content_types = (
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    )
+
+    def iter_text(self, path: str) -> Iterator[str]:
+        import docx
+
+        doc = docx.Document(path)
+        for para in doc.paragraphs:
+            text = para.text.strip()
+            if text:
+                yield text + "\n"
+        for table in doc.tables:
+            yield from _table_lines(
+                [cell.text for cell in row.cells] for row in table.rows
+            )
+
+
+_NUMERIC_CELL_RE = re.compile(r"[<>]?\s*[\d.,]+(?:\s*\S+)?")
+
+
+def _table_lines(rows) -> Iterator[str]:
+    """
+    Filas de una tabla como líneas de texto. Si la primera fila es un encabezado
+    (ninguna celda es un valor numérico), cada valor se escribe junto a su columna ("DQO (mg/L) 1250"),
+    así también se leen las tablas con un parámetro por columna.
+    """
+    header: Optional[List[str]] = None
+    for index, row in enumerate(rows):
+        cells = ["" if cell is None else str(cell).strip() for cell in row]
+        if index == 0 and not any(_NUMERIC_CELL_RE.fullmatch(cell) for cell in cells):
+            header = cells
+            continue
+        if header:
+            yield "; ".join(f"{h} {c}".strip() for h, c in zip(header, cells)) + "\n"
+        else:
+            yield " ".join(cells) + "\n"
+
+
+class CsvExtractor(TextExtractor):
+    extensions = (".csv",)
+    content_types = ("text/csv",)
+
+    def iter_text(self, path: str) -> Iterator[str]:
+        with open(path, newline="", encoding="utf-8", errors="ignore") as f:
+            sample = f.read(4096)
+            f.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+            except csv.Error:
+                dialect = csv.excel
+            yield from _table_lines(csv.reader(f, dialect))
+
+
+class XlsxExtractor(TextExtractor):
+    extensions = (".xlsx",)
+    content_types = (
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
+
+    def iter_text(self, path: str) -> Iterator[str]:
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            for sheet in workbook.worksheets:
+                yield from _table_lines(sheet.iter_rows(values_only=True))
+        finally:
+            workbook.close()
+
+
+class DocumentAnalyzer:
+    """
+    Elige el extractor de cada documento y busca sus parámetros. Los resultados
+    se guardan por sha256 (LRU de EXTRACTION_CACHE_SIZE): un documento ya
+    analizado no se vuelve a leer.
+    """
+
+    def __init__(self, cache_size: int = 256):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # analyze() se ejecuta en varios hilos a la vez
+        self._cache_lock = threading.Lock()
+        self.extractors: List[TextExtractor] = [
+            PdfExtractor(),
+            DocxExtractor(),
+            CsvExtractor(),
+            XlsxExtractor(),
+            PlainTextExtractor(),
+        ]
+
+    def register(self, extractor: TextExtractor):
+        """Añade un extractor; tiene prioridad sobre los ya registrados."""
+        self.extractors.insert(0, extractor)
+
+    def extractor_for(
+        self, filename: str, content_type: Optional[str]
+    ) -> Optional[TextExtractor]:
+        for extractor in self.extractors:
+            if extractor.accepts(filename, content_type):
+                return extractor
+        return None
+
+    @staticmethod
+    def _cache_key(doc_info: Dict[str, Any]) -> Optional[str]:
+        # Las facturas se analizan además con su propio léxico
+        if not doc_info.get("sha256"):
+            return None
+        invoice = doc_info["extracted_info"]["type"] == "invoice"
+        return f"{doc_info['sha256']}:{'invoice' if invoice else 'lab'}"
+
+    def from_cache(self, doc_info: Dict[str, Any]) -> bool:
+        """Completa extracted_info con un análisis previo del mismo contenido."""
+        key = self._cache_key(doc_info)
+        with self._cache_lock:
+            cached = self._cache.get(key) if key else None
+            if cached is None:
+                return False
+            self._cache.move_to_end(key)
+        doc_info["extracted_info"] = copy.deepcopy(cached)
+        return True
+
+    def _store(self, key: Optional[str], info: Dict[str, Any]):
+        if not key:
+            return
+        with self._cache_lock:
+            self._cache[key] = copy.deepcopy(info)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def analyze(self, doc_info: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Extrae los parámetros del documento y actualiza su extracted_info
+        (bloqueante: se ejecuta en un hilo).
+        """
+        if self.from_cache(doc_info):
+            return doc_info["extracted_info"]
+        key = self._cache_key(doc_info)
+        info = doc_info["extracted_info"]
+        extractor = self.extractor_for(doc_info["filename"], doc_info["content_type"])
+        if extractor is None:
+            info["status"] = "done"
+            self._store(key, info)
+            return info
+
+        lexicon = LAB_LEXICON + (INVOICE_LEXICON if info["type"] == "invoice" else [])
+        scanner = ParameterScanner(lexicon)
+        try:
+            for text in extractor.iter_text(doc_info["path"]):
+                scanner.feed(text)
+        except ImportError as e:
+            logger.warning(f"Extractor no disponible para {doc_info['filename']}: {e}")
+        except Exception as e:
+            logger.warning(f"Error al extraer texto de {doc_info['filename']}: {e}")
+            info["status"] = "error"
+            return info
+
+        info["parameters"] = scanner.finish()
+        if info["type"] == "unknown" and any(
+            e.name in info["parameters"] for e in LAB_LEXICON
+        ):
+            info["type"] = "lab_analysis"
+            info["summary"] = "Análisis de laboratorio de agua"
+        info["status"] = "done"
+        self._store(key, info)
+        return info
+
+
+def document_summary(doc_info: Dict[str, Any]) -> Dict[str, Any]:
+    """Resumen de un documento tal como se guarda en la metadata de la conversación."""
+    info = doc_info["extracted_info"]
+    return {
+        "filename": doc_info["filename"],
+        "type": info["type"],
+        "summary": info["summary"],
+        "parameters": info["parameters"],
+        "status": info.get("status", "pending"),
+    }
+
+
+class DocumentAnalysisQueue:
+    """Cola acotada de documentos por analizar y sus workers."""
+
+    def __init__(self, analyzer: DocumentAnalyzer, workers: int, max_queue: int):
+        self.analyzer = analyzer
+        self.workers = workers
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.stats = {"processed": 0, "failed": 0, "cached": 0}
+
+    def _ensure_started(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(self.max_queue)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def start(self):
+        self._ensure_started()
+        logger.info(f"Análisis de documentos: {self.workers} workers iniciados")
+
+    async def stop(self, timeout: float = 5.0):
+        """Espera (como máximo `timeout` s) los documentos encolados y detiene los workers."""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Análisis de documentos detenido con documentos pendientes")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def full(self) -> bool:
+        return self._queue is not None and self._queue.full()
+
+    def submit(self, doc_info: Dict[str, Any]) -> bool:
+        """
+        Encola un documento; False si la cola está llena. Un documento ya
+        encolado o analizado no se vuelve a encolar, y si su contenido ya se
+        analizó el resultado se aplica en el acto.
+        """
+        if doc_info["extracted_info"].get("status") in ("pending", "done"):
+            return True
+        if self.analyzer.from_cache(doc_info):
+            self.stats["cached"] += 1
+            return True
+        self._ensure_started()
+        doc_info["extracted_info"]["status"] = "pending"
+        try:
+            self._queue.put_nowait(doc_info)
+        except asyncio.QueueFull:
+            doc_info["extracted_info"]["status"] = "error"
+            logger.warning(
+                f"Cola de análisis llena; documento {doc_info['id']} sin analizar"
+            )
+            return False
+        return True
+
+    async def _worker(self):
+        while True:
+            doc_info = await self._queue.get()
+            try:
+                await asyncio.to_thread(self.analyzer.analyze, doc_info)
+                await self._attach(doc_info)
+                self.stats["processed"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.error(
+                    f"Error al analizar documento {doc_info.get('id')}: {e}",
+                    exc_info=True,
+                )
+                send_error_alert(
+                    "Análisis de documentos",
+                    type(e).__name__,
+                    {"doc_id": doc_info.get("id"), "error": str(e)},
+                )
+            finally:
+                self._queue.task_done()
+
+    async def _attach(self, doc_info: Dict[str, Any]):
+        """Guarda el resultado en el registro y en la metadata de la conversación."""
+        conversation_id = doc_info["conversation_id"]
+        await document_service.save_document(doc_info)
+        async with conversation_locks.lock(conversation_id):
+            conversation = await storage_service.get_conversation(conversation_id)
+            if not conversation:
+                return
+            documents = conversation.metadata.setdefault("documents", {})
+            documents[doc_info["id"]] = document_summary(doc_info)
+            document_context.record(conversation.metadata, doc_info)
+            await storage_service.save_conversation(conversation)
+        logger.info(
+            f"Documento {doc_info['id']} analizado: {list(doc_info['extracted_info']['parameters'])}"
+        )
+
+    def snapshot(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            **self.stats,
+        }
+
+
+# Instancias globales
+document_analyzer = DocumentAnalyzer(settings.EXTRACTION_CACHE_SIZE)
+document_analysis_queue = DocumentAnalysisQueue(
+    document_analyzer, settings.DOCUMENT_WORKERS, settings.DOCUMENT_QUEUE_SIZE
+)
@@ -0,0 +1,171 @@
+# app/services/document_context.py
+"""
+Datos extraídos de los documentos subidos, como contexto del prompt.
+
+Al terminar el análisis de un documento, sus parámetros se guardan como datos
+estructurados en metadata["document_facts"] (uno por parámetro; el documento
+más reciente prevalece). En cada turno se añaden al sufijo dinámico del prompt
+los que el usuario no haya respondido ya en el cuestionario, dentro de un
+presupuesto de caracteres, para que el asistente no vuelva a preguntarlos.
+
+Los valores de laboratorio fiables (numéricos y en la unidad en que se
+pregunta) cuentan además como respuesta: la ruta local de preguntas no pide lo
+que ya cubren y la calculadora de la propuesta los usa si el usuario no los dio.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.document_service import format_parameter
+from app.services.questionnaire_service import questionnaire_service
+
+logger = logging.getLogger("hydrous")
+
+# Límites del bloque en el prompt (~4 caracteres por token)
+DOCUMENT_CONTEXT_MAX_CHARS = 1200
+DOCUMENT_FACT_MAX_CHARS = 160
+
+# Parámetro extraído -> (rol de pregunta que responde, clave dentro de la respuesta)
+FACT_ROLES: Dict[str, Tuple[str, Optional[str]]] = {
+    "pH": ("water_quality", "PH"),
+    "DBO": ("water_quality", "BOD"),
+    "DQO": ("water_quality", "COD"),
+    "SST": ("water_quality", "TSS"),
+    # La conductividad no tiene pregunta propia: la cubren los sólidos disueltos
+    "conductividad": ("water_quality", "TDS"),
+    "consumo": ("water_consumption", None),
+}
+
+# Parámetros que cuentan como respuesta, con la unidad en que se preguntan. La
+# conductividad (µS/cm) no equivale a los sólidos disueltos y el consumo de un
+# recibo no indica el periodo facturado: ambos quedan solo como contexto.
+CONFIDENT_UNITS = {"pH": "", "DBO": "mg/L", "DQO": "mg/L", "SST": "mg/L"}
+
+_HEADER = (
+    "DATOS DE DOCUMENTOS SUBIDOS POR EL USUARIO (ya aportados: no los vuelvas a "
+    "preguntar; úsalos como respuesta y, si acaso, pide confirmación):"
+)
+
+
+class DocumentContext:
+    """Guarda los datos de los documentos y los formatea para el prompt."""
+
+    def record(self, metadata: Dict[str, Any], doc_info: Dict[str, Any]) -> int:
+        """Guarda los parámetros de un documento analizado; devuelve cuántos."""
+        parameters = doc_info["extracted_info"].get("parameters") or {}
+        if not parameters:
+            return 0
+        if metadata.get("document_facts") is None:
+            metadata["document_facts"] = {}
+        facts = metadata["document_facts"]
+        for name, value in parameters.items():
+            # Reinsertar para que el orden refleje el documento más reciente
+            facts.pop(name, None)
+            facts[name] = {
+                "value": value,
+                "source": doc_info["filename"],
+                "doc_id": doc_info["id"],
+            }
+        return len(parameters)
+
+    @staticmethod
+    def _answered(metadata: Dict[str, Any], name: str) -> bool:
+        """True si el usuario ya respondió la pregunta que cubre este dato."""
+        role, key = FACT_ROLES.get(name, (None, None))
+        if role is None:
+            return False
+        for question_id, value in (metadata.get("collected_data") or {}).items():
+            if value in (None, "", [], {}):
+                continue
+            answered_role = questionnaire_service.get_question_role(question_id)
+            if answered_role == f"param_{key}":
+                return True
+            if answered_role == role:
+                # Calidad del agua: solo cuenta si la respuesta (ya normalizada a
+                # un dict) incluye ese parámetro; un texto libre no lo cubre
+                if key is None or (isinstance(value, dict) and key in value):
+                    return True
+        return False
+
+    def pending_facts(self, metadata: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Datos de documentos que no duplican respuestas ya dadas."""
+        return {
+            name: fact
+            for name, fact in (metadata.get("document_facts") or {}).items()
+            if not self._answered(metadata, name)
+        }
+
+    @staticmethod
+    def document_answers(metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Valores fiables de los documentos con la forma de las respuestas,
+        indexados por rol (p.ej. {"water_quality": {"PH": 7.2, "COD": 900.0}}).
+        """
+        quality: Dict[str, float] = {}
+        for name, fact in (metadata.get("document_facts") or {}).items():
+            unit = CONFIDENT_UNITS.get(name)
+            value = fact.get("value")
+            if unit is None or not isinstance(value, dict):
+                continue
+            number = value.get("value")
+            if value.get("unit", "") != unit or not isinstance(number, (int, float)):
+                continue
+            quality[FACT_ROLES[name][1]] = float(number)
+        return {"water_quality": quality} if quality else {}
+
+    def answers_question(self, metadata: Dict[str, Any], question_id: str) -> bool:
+        """
+        True si los documentos ya responden la pregunta: la de si hay análisis,
+        un parámetro concreto, o la estimación de calidad cuando cubren todos los
+        parámetros que pide y que un documento puede aportar.
+        """
+        quality = self.document_answers(metadata).get("water_quality")
+        if not quality:
+            return False
+        role = questionnaire_service.get_question_role(question_id)
+        if role == "lab_analysis":
+            return True
+        if role and role.startswith("param_"):
+            return role[len("param_") :] in quality
+        if role == "water_quality":
+            question = questionnaire_service.all_questions_base.get(question_id) or {}
+            extractable = {FACT_ROLES[name][1] for name in CONFIDENT_UNITS}
+            asked = {
+                sub["id"].split("_")[-1] for sub in question.get("sub_questions") or []
+            } & extractable
+            return bool(asked) and asked <= set(quality)
+        return False
+
+    @staticmethod
+    def _line(name: str, fact: Dict[str, Any]) -> str:
+        line = f"- {name}: {format_parameter(fact['value'])} ({fact['source']})"
+        if len(line) > DOCUMENT_FACT_MAX_CHARS:
+            line = line[: DOCUMENT_FACT_MAX_CHARS - 1] + "…"
+        return line
+
+    def render(self, metadata: Dict[str, Any]) -> str:
+        """
+        Bloque para el sufijo del prompt, o "" si no hay datos pendientes. Si
+        supera DOCUMENT_CONTEXT_MAX_CHARS se omiten los datos más antiguos.
+        """
+        facts = self.pending_facts(metadata)
+        if not facts:
+            return ""
+        lines: List[str] = [self._line(name, fact) for name, fact in facts.items()]
+
+        budget = DOCUMENT_CONTEXT_MAX_CHARS - len(_HEADER) - 1
+        kept: List[str] = []
+        for line in reversed(lines):
+            budget -= len(line) + 1
+            if budget < 0:
+                break
+            kept.append(line)
+        kept.reverse()
+        omitted = len(lines) - len(kept)
+        if omitted:
+            kept.append(f"- ({omitted} datos más antiguos omitidos)")
+        return "\n".join([_HEADER] + kept)
+
+
+# Instancia global
+document_context = DocumentContext()
@@ -0,0 +1,205 @@
+# app/services/document_registry.py
+"""
+Registro de documentos subidos, indexado por conversación.
+
+Guarda los documentos (doc_info) de cada conversación y cuántas veces usa cada
+conversación cada archivo (sha256). Las consultas de una conversación recorren
+solo sus documentos, y los registros caducan con la conversación: sweep()
+elimina los de conversaciones vencidas y devuelve los archivos que ya nadie usa
+para borrarlos del disco.
+
+Con STORAGE_BACKEND="redis" el registro se guarda en Redis junto a las
+conversaciones (y caduca con ellas), así todos los workers lo comparten.
+"""
+
+import logging
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from app.services.redis_backend import get_raw_redis, key, redis_enabled
+from app.utils import serialization
+
+logger = logging.getLogger("hydrous")
+
+
+class DocumentRegistry:
+    """Registro en memoria (un solo worker)."""
+
+    def __init__(self):
+        self._documents: Dict[str, Dict[str, Any]] = {}
+        # conversation_id -> {sha256: doc_id}
+        self._by_conversation: Dict[str, Dict[str, str]] = {}
+        # conversation_id -> instante (epoch, s) en que caduca
+        self._expires: Dict[str, float] = {}
+        # sha256 -> {conversation_id: subidas}
+        self._blob_refs: Dict[str, Counter] = {}
+
+    async def add(self, doc_info: Dict[str, Any], expires_at: float):
+        conversation_id = doc_info["conversation_id"]
+        self._documents[doc_info["id"]] = doc_info
+        self._by_conversation.setdefault(conversation_id, {})[doc_info["sha256"]] = (
+            doc_info["id"]
+        )
+        self._expires[conversation_id] = max(
+            expires_at, self._expires.get(conversation_id, 0)
+        )
+
+    async def save(self, doc_info: Dict[str, Any]):
+        """Actualiza un documento ya registrado (p.ej. tras analizarlo)."""
+        if doc_info["id"] in self._documents:
+            self._documents[doc_info["id"]] = doc_info
+
+    async def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        return self._documents.get(doc_id)
+
+    async def find(self, conversation_id: str, sha256: str) -> Optional[Dict[str, Any]]:
+        doc_id = self._by_conversation.get(conversation_id, {}).get(sha256)
+        return self._documents.get(doc_id) if doc_id else None
+
+    async def for_conversation(self, conversation_id: str) -> List[Dict[str, Any]]:
+        return [
+            self._documents[doc_id]
+            for doc_id in self._by_conversation.get(conversation_id, {}).values()
+        ]
+
+    # --- Referencias a archivos ---
+
+    async def has_blob(self, sha256: str) -> bool:
+        return sha256 in self._blob_refs
+
+    async def add_ref(self, sha256: str, conversation_id: str):
+        self._blob_refs.setdefault(sha256, Counter())[conversation_id] += 1
+
+    async def refs(self, sha256: str) -> Dict[str, int]:
+        return dict(self._blob_refs.get(sha256, {}))
+
+    # --- Eliminación ---
+
+    async def remove_conversation(self, conversation_id: str) -> List[str]:
+        """
+        Quita los documentos y referencias de una conversación. Devuelve los
+        sha256 que ya no usa ninguna conversación.
+        """
+        for doc_id in self._by_conversation.pop(conversation_id, {}).values():
+            self._documents.pop(doc_id, None)
+        self._expires.pop(conversation_id, None)
+
+        unreferenced = []
+        for sha256 in [
+            s for s, refs in self._blob_refs.items() if conversation_id in refs
+        ]:
+            refs = self._blob_refs[sha256]
+            del refs[conversation_id]
+            if not refs:
+                del self._blob_refs[sha256]
+                unreferenced.append(sha256)
+        return unreferenced
+
+    async def sweep(self) -> List[str]:
+        """Elimina las conversaciones vencidas; devuelve los sha256 sin uso."""
+        now = time.time()
+        unreferenced = []
+        for conversation_id in [c for c, t in self._expires.items() if t <= now]:
+            unreferenced.extend(await self.remove_conversation(conversation_id))
+        return unreferenced
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+
+class RedisDocumentRegistry(DocumentRegistry):
+    """
+    Registro compartido en Redis (msgpack):
+    - hydrous:docs:<conversation_id>  hash doc_id -> doc_info, caduca con la conversación
+    - hydrous:doc:<doc_id>            conversation_id del documento (misma caducidad)
+    - hydrous:blob:<sha256>           hash conversation_id -> subidas
+    """
+
+    async def add(self, doc_info: Dict[str, Any], expires_at: float):
+        conversation_id = doc_info["conversation_id"]
+        docs_key = key("docs", conversation_id)
+        doc_key = key("doc", doc_info["id"])
+        async with get_raw_redis().pipeline(transaction=True) as pipe:
+            pipe.hset(docs_key, doc_info["id"], serialization.pack(doc_info))
+            pipe.set(doc_key, conversation_id)
+            pipe.expireat(docs_key, int(expires_at))
+            pipe.expireat(doc_key, int(expires_at))
+            await pipe.execute()
+
+    async def save(self, doc_info: Dict[str, Any]):
+        docs_key = key("docs", doc_info["conversation_id"])
+        redis = get_raw_redis()
+        # Solo si sigue registrado (la conversación pudo caducar mientras tanto)
+        if await redis.hexists(docs_key, doc_info["id"]):
+            await redis.hset(docs_key, doc_info["id"], serialization.pack(doc_info))
+
+    async def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        redis = get_raw_redis()
+        conversation_id = await redis.get(key("doc", doc_id))
+        if conversation_id is None:
+            return None
+        raw = await redis.hget(key("docs", conversation_id.decode()), doc_id)
+        return serialization.unpack(raw) if raw else None
+
+    async def for_conversation(self, conversation_id: str) -> List[Dict[str, Any]]:
+        raw_docs = await get_raw_redis().hvals(key("docs", conversation_id))
+        return [serialization.unpack(raw) for raw in raw_docs]
+
+    async def find(self, conversation_id: str, sha256: str) -> Optional[Dict[str, Any]]:
+        for doc in await self.for_conversation(conversation_id):
+            if doc["sha256"] == sha256:
+                return doc
+        return None
+
+    async def has_blob(self, sha256: str) -> bool:
+        return bool(await get_raw_redis().exists(key("blob", sha256)))
+
+    async def add_ref(self, sha256: str, conversation_id: str):
+        await get_raw_redis().hincrby(key("blob", sha256), conversation_id, 1)
+
+    async def refs(self, sha256: str) -> Dict[str, int]:
+        raw = await get_raw_redis().hgetall(key("blob", sha256))
+        return {cid.decode(): int(count) for cid, count in raw.items()}
+
+    async def _drop_ref(self, sha256: str, conversation_id: str) -> bool:
+        """Quita la referencia; True si el archivo quedó sin uso."""
+        blob_key = key("blob", sha256)
+        async with get_raw_redis().pipeline(transaction=True) as pipe:
+            pipe.hdel(blob_key, conversation_id)
+            pipe.hlen(blob_key)
+            _, remaining = await pipe.execute()
+        return remaining == 0
+
+    async def remove_conversation(self, conversation_id: str) -> List[str]:
+        redis = get_raw_redis()
+        docs = await self.for_conversation(conversation_id)
+        await redis.delete(
+            key("docs", conversation_id), *(key("doc", doc["id"]) for doc in docs)
+        )
+        return [
+            doc["sha256"]
+            for doc in docs
+            if await self._drop_ref(doc["sha256"], conversation_id)
+        ]
+
+    async def sweep(self) -> List[str]:
+        """
+        Los registros de documentos caducan solos; aquí se quitan las
+        referencias de las conversaciones que ya no existen.
+        """
+        redis = get_raw_redis()
+        unreferenced = []
+        async for blob_key in redis.scan_iter(match=key("blob", "*")):
+            sha256 = blob_key.decode().rsplit(":", 1)[-1]
+            for conversation_id in await redis.hkeys(blob_key):
+                conversation_id = conversation_id.decode()
+                if await redis.exists(key("conv", conversation_id)):
+                    continue
+                if await self._drop_ref(sha256, conversation_id):
+                    unreferenced.append(sha256)
+        return unreferenced
+
+
+# Instancia global
+document_registry = RedisDocumentRegistry() if redis_enabled() else DocumentRegistry()
@@ -1,70 +1,188 @@
 # app/services/document_service.py
+import asyncio
+import hashlib
 import os
 import logging
+import time
 import uuid
-import re
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from fastapi import UploadFile
-import shutil
 
 from app.config import settings
+from app.services.document_registry import DocumentRegistry, document_registry
 
 logger = logging.getLogger("hydrous")
 
 
+class DocumentTooLargeError(ValueError):
+    """El documento supera MAX_UPLOAD_SIZE."""
+
+
+def format_parameter(value: Any) -> str:
+    """Valor extraído de un documento: {"value", "unit"} o texto tal cual."""
+    if isinstance(value, dict):
+        return f"{value['value']:g} {value.get('unit', '')}".strip()
+    return str(value)
+
+
 class DocumentService:
     """Servicio para procesar documentos subidos por usuarios"""
 
-    def __init__(self):
+    def __init__(self, registry: Optional[DocumentRegistry] = None):
         """Inicialización del servicio"""
         # Crear directorio de uploads si no existe
         os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
 
-        # Registro de documentos
-        self.documents = {}
+        # Registro de documentos (indexado por conversación) y de los archivos
+        # guardados por contenido
+        self.registry = document_registry if registry is None else registry
+        self._last_sweep = 0.0
+
+    @staticmethod
+    def blob_path(sha256: str) -> str:
+        """Ruta del archivo con ese contenido (un solo archivo por sha256)."""
+        return os.path.join(settings.UPLOAD_DIR, "blobs", sha256[:2], sha256)
+
+    async def _hash_upload(self, file: UploadFile) -> Tuple[str, int]:
+        """sha256 y tamaño del archivo subido, leído por bloques."""
+        sha256 = hashlib.sha256()
+        size = 0
+        while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > settings.MAX_UPLOAD_SIZE:
+                raise DocumentTooLargeError(size)
+            sha256.update(chunk)
+        return sha256.hexdigest(), size
+
+    async def _write_blob(self, file: UploadFile, path: str):
+        """
+        Copia el archivo por bloques (escritura en un hilo, sin bloquear el
+        event loop) a un temporal que se renombra al terminar, así nunca queda
+        un archivo a medias con el nombre definitivo.
+        """
+        await asyncio.to_thread(os.makedirs, os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+        await file.seek(0)
+        dest_file = await asyncio.to_thread(open, tmp_path, "wb")
+        try:
+            while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+                await asyncio.to_thread(dest_file.write, chunk)
+        except BaseException:
+            await asyncio.to_thread(dest_file.close)
+            await asyncio.to_thread(os.remove, tmp_path)
+            raise
+        await asyncio.to_thread(dest_file.close)
+        await asyncio.to_thread(os.replace, tmp_path, path)
 
     async def process_document(
-        self, file: UploadFile, conversation_id: str
+        self,
+        file: UploadFile,
+        conversation_id: str,
+        expires_at: Optional[float] = None,
     ) -> Dict[str, Any]:
-        """Procesa un documento subido por un usuario"""
+        """
+        Guarda un documento subido por un usuario. El almacenamiento es por
+        contenido: primero se calcula el sha256 por bloques y solo si ese
+        contenido no está guardado se escribe el archivo; una resubida cuesta el
+        hash y nada de disco. Si la misma conversación ya tiene el documento se
+        devuelve el registro existente. Lanza DocumentTooLargeError si supera
+        MAX_UPLOAD_SIZE. La extracción de parámetros se hace después, en
+        document_analysis (con caché por sha256).
+
+        expires_at (epoch, s) es cuándo caduca la conversación; el registro del
+        documento se elimina entonces con ella.
+        """
         try:
-            # Generar ID único para el documento
-            doc_id = str(uuid.uuid4())
-
-            # Guardar el archivo físicamente
-            file_ext = os.path.splitext(file.filename)[1]
-            save_path = os.path.join(settings.UPLOAD_DIR, f"{doc_id}{file_ext}")
-
-            with open(save_path, "wb") as dest_file:
-                shutil.copyfileobj(file.file, dest_file)
-
-            # Intentar extraer información relevante según el tipo de archivo
-            extracted_info = await self._extract_document_info(
-                save_path, file.filename, file.content_type
-            )
-
-            # Registrar documento
+            if file.size is not None and file.size > settings.MAX_UPLOAD_SIZE:
+                raise DocumentTooLargeError(file.size)
+
+            sha256, size = await self._hash_upload(file)
+            save_path = self.blob_path(sha256)
+            # La referencia se registra antes de mirar el disco: la limpieza no
+            # borra un archivo con referencias, así que si existe ya no desaparece
+            await self.registry.add_ref(sha256, conversation_id)
+            if os.path.exists(save_path):
+                logger.info(f"Documento {file.filename} ya guardado ({sha256[:12]})")
+            else:
+                await self._write_blob(file, save_path)
+
+            existing = await self.registry.find(conversation_id, sha256)
+            if existing:
+                return existing
+
+            # Registrar documento; el tipo según su nombre (el análisis puede precisarlo)
             doc_info = {
-                "id": doc_id,
+                "id": str(uuid.uuid4()),
                 "filename": file.filename,
                 "content_type": file.content_type,
                 "path": save_path,
+                "size": size,
+                "sha256": sha256,
                 "conversation_id": conversation_id,
-                "extracted_info": extracted_info,
+                "extracted_info": self._classify_document(
+                    file.filename, file.content_type
+                ),
             }
 
-            self.documents[doc_id] = doc_info
+            if expires_at is None:
+                expires_at = time.time() + settings.CONVERSATION_TIMEOUT
+            await self.registry.add(doc_info, expires_at)
 
             return doc_info
 
+        except DocumentTooLargeError as e:
+            logger.warning(f"Documento rechazado por tamaño: {file.filename} ({e})")
+            raise
         except Exception as e:
             logger.error(f"Error al procesar documento: {str(e)}")
             raise
 
-    async def _extract_document_info(
-        self, file_path: str, filename: str, content_type: str
+    async def save_document(self, doc_info: Dict[str, Any]):
+        """Guarda los cambios de un documento ya registrado (p.ej. su análisis)."""
+        await self.registry.save(doc_info)
+
+    async def _delete_blobs(self, sha256s: List[str]) -> int:
+        removed = 0
+        for sha256 in sha256s:
+            # Una subida pudo volver a referenciarlo desde que quedó sin uso
+            if await self.registry.has_blob(sha256):
+                continue
+            try:
+                await asyncio.to_thread(os.remove, self.blob_path(sha256))
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    async def release_conversation(self, conversation_id: str) -> int:
+        """
+        Quita los documentos de una conversación y borra los archivos que ya no
+        usa ninguna otra. Devuelve cuántos archivos se borraron.
+        """
+        return await self._delete_blobs(
+            await self.registry.remove_conversation(conversation_id)
+        )
+
+    async def cleanup_expired(self, force: bool = False) -> int:
+        """
+        Elimina los documentos de conversaciones caducadas y sus archivos sin
+        uso. Se llama junto a la limpieza de conversaciones, como mucho una vez
+        cada DOCUMENT_SWEEP_INTERVAL segundos.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_sweep < settings.DOCUMENT_SWEEP_INTERVAL:
+            return 0
+        self._last_sweep = now
+        removed = await self._delete_blobs(await self.registry.sweep())
+        if removed:
+            logger.info(f"Limpieza de documentos: {removed} archivos eliminados")
+        return removed
+
+    @staticmethod
+    def _classify_document(
+        filename: str, content_type: Optional[str]
     ) -> Dict[str, Any]:
-        """Extrae información básica de un documento"""
+        """Tipo y resumen básico de un documento según su nombre y tipo MIME"""
         info = {
             "summary": f"Documento: {filename}",
             "type": "unknown",
@@ -75,57 +193,10 @@ class DocumentService:
         if "factura" in filename.lower() or "recibo" in filename.lower():
             info["type"] = "invoice"
             info["summary"] = "Factura o recibo de agua"
-
-            # Extraer información básica si es un texto
-            try:
-                with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                    text = f.read()
-
-                # Buscar patrones comunes en facturas
-                date_match = re.search(r"(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})", text)
-                if date_match:
-                    info["parameters"]["fecha"] = date_match.group(1)
-
-                consumption_match = re.search(r"consumo:?\s*(\d+)", text, re.IGNORECASE)
-                if consumption_match:
-                    info["parameters"]["consumo"] = consumption_match.group(1)
-
-                amount_match = re.search(
-                    r"total:?\s*\$?\s*(\d+(?:\.\d+)?)", text, re.IGNORECASE
-                )
-                if amount_match:
-                    info["parameters"]["importe"] = amount_match.group(1)
-
-            except Exception as e:
-                logger.warning(f"Error al procesar texto de factura: {str(e)}")
-
         elif "analisis" in filename.lower() or "laboratorio" in filename.lower():
             info["type"] = "lab_analysis"
             info["summary"] = "Análisis de laboratorio de agua"
-
-            # Extraer información básica si es un texto
-            try:
-                with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                    text = f.read()
-
-                # Buscar parámetros comunes en análisis de agua
-                params = [
-                    ("pH", r"pH[:\s]+(\d+(?:\.\d+)?)"),
-                    ("DBO", r"DBO[:\s]+(\d+(?:\.\d+)?)"),
-                    ("DQO", r"DQO[:\s]+(\d+(?:\.\d+)?)"),
-                    ("SST", r"SST[:\s]+(\d+(?:\.\d+)?)"),
-                    ("conductividad", r"conductividad[:\s]+(\d+(?:\.\d+)?)"),
-                ]
-
-                for param, pattern in params:
-                    match = re.search(pattern, text, re.IGNORECASE)
-                    if match:
-                        info["parameters"][param] = match.group(1)
-
-            except Exception as e:
-                logger.warning(f"Error al procesar texto de análisis: {str(e)}")
-
-        elif content_type.startswith("image/"):
+        elif (content_type or "").startswith("image/"):
             info["type"] = "image"
             info["summary"] = (
                 "Imagen que podría mostrar instalaciones o equipos de tratamiento de agua"
@@ -133,38 +204,15 @@ class DocumentService:
 
         return info
 
-    def format_document_info_for_prompt(self, doc_info: Dict[str, Any]) -> str:
-        """Formatea información del documento para incluir en el prompt"""
-        doc_type = doc_info.get("type", "unknown")
-        summary = doc_info.get("extracted_info", {}).get(
-            "summary", f"Documento: {doc_info['filename']}"
-        )
-        parameters = doc_info.get("extracted_info", {}).get("parameters", {})
-
-        formatted_text = f"[DOCUMENTO ADJUNTO: {doc_info['filename']}]\n"
-        formatted_text += f"Tipo: {doc_type}\n"
-        formatted_text += f"Resumen: {summary}\n"
-
-        if parameters:
-            formatted_text += "Información extraída:\n"
-            for key, value in parameters.items():
-                formatted_text += f"- {key}: {value}\n"
-
-        return formatted_text
-
     async def get_document(self, doc_id: str) -> Optional[Dict[str, Any]]:
         """Obtiene información de un documento por su ID"""
-        return self.documents.get(doc_id)
+        return await self.registry.get(doc_id)
 
     async def get_documents_for_conversation(
         self, conversation_id: str
     ) -> List[Dict[str, Any]]:
         """Obtiene todos los documentos asociados a una conversación"""
-        return [
-            doc
-            for doc in self.documents.values()
-            if doc["conversation_id"] == conversation_id
-        ]
+        return await self.registry.for_conversation(conversation_id)
 
 
 # Instancia global
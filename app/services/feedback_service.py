@@ -0,0 +1,228 @@
+# app/services/feedback_service.py
+"""
+Registro de la retroalimentación de los usuarios.
+
+Las valoraciones se encolan en memoria (la petición no espera al disco) y una
+tarea en segundo plano las añade por lotes a un único archivo JSONL: una línea
+por valoración, un write por lote. query() devuelve el histograma de
+valoraciones por día, total o de una conversación; los agregados se actualizan
+leyendo solo lo añadido al registro desde la consulta anterior.
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.utils.serialization import dumps_json, loads_json
+
+logger = logging.getLogger("hydrous")
+
+RATINGS = range(1, 6)
+
+
+class FeedbackQueueFull(Exception):
+    """No caben más valoraciones pendientes de escribir."""
+
+
+def _histogram(counts: Counter) -> Dict[str, Any]:
+    total = sum(counts.values())
+    return {
+        "count": total,
+        "average": (
+            round(sum(r * n for r, n in counts.items()) / total, 2) if total else None
+        ),
+        "ratings": {str(r): counts.get(r, 0) for r in RATINGS},
+    }
+
+
+class FeedbackLog:
+    """Cola en memoria de valoraciones y su escritura por lotes en JSONL."""
+
+    def __init__(
+        self, path: str, batch_size: int, flush_interval: float, max_queue: int
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        # Lote en curso; sobrevive a la cancelación de la tarea y se escribe en stop()
+        self._batch: List[Dict[str, Any]] = []
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"written": 0, "batches": 0, "dropped": 0}
+        # Agregados del registro leído hasta _offset: día -> valoraciones y
+        # conversación -> día -> valoraciones
+        self._offset = 0
+        self._by_day: Dict[str, Counter] = {}
+        self._by_conversation: Dict[str, Dict[str, Counter]] = {}
+        self._refresh_lock = asyncio.Lock()
+
+    def _ensure_started(self):
+        if self._task:
+            return
+        self._queue = asyncio.Queue(self.max_queue)
+        self._write_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    async def start(self):
+        self._ensure_started()
+        logger.info(f"Registro de retroalimentación en {self.path}")
+
+    async def stop(self):
+        """Detiene la tarea y escribe lo pendiente."""
+        if not self._task:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        await self.flush()
+        self._task = None
+
+    def submit(
+        self,
+        conversation_id: str,
+        rating: int,
+        message_id: Optional[str] = None,
+        comment: Optional[str] = None,
+    ) -> str:
+        """Encola una valoración y devuelve su ID. FeedbackQueueFull si no cabe."""
+        self._ensure_started()
+        entry = {
+            "id": uuid.uuid4().hex,
+            "conversation_id": conversation_id,
+            "message_id": message_id,
+            "rating": rating,
+            "comment": comment,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }
+        try:
+            self._queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            raise FeedbackQueueFull() from None
+        return entry["id"]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._batch.append(await self._queue.get())
+            # Se espera como mucho flush_interval a completar el lote
+            deadline = loop.time() + self.flush_interval
+            while len(self._batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    self._batch.append(
+                        await asyncio.wait_for(self._queue.get(), timeout)
+                    )
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._write_batch()
+            except Exception as e:
+                # El lote se conserva y se reintenta con el siguiente
+                logger.error(f"Error al escribir retroalimentación: {e}")
+
+    async def _write_batch(self):
+        async with self._write_lock:
+            batch, self._batch = self._batch, []
+            if not batch:
+                return
+            data = b"".join(dumps_json(entry) + b"\n" for entry in batch)
+            try:
+                await asyncio.to_thread(self._append, data)
+            except BaseException:
+                self._batch = batch + self._batch
+                raise
+            self.stats["written"] += len(batch)
+            self.stats["batches"] += 1
+
+    def _append(self, data: bytes):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Un solo write en modo append: los lotes no se mezclan entre workers
+        with open(self.path, "ab") as f:
+            f.write(data)
+
+    async def flush(self):
+        """Escribe ya todo lo encolado."""
+        if not self._task:
+            return
+        while not self._queue.empty():
+            self._batch.append(self._queue.get_nowait())
+        await self._write_batch()
+
+    def _refresh(self):
+        """
+        Añade a los agregados las líneas escritas desde la última lectura (por
+        este u otros workers): cada byte del registro se lee una sola vez.
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < self._offset:
+                # El registro se rotó o truncó: se recalcula desde el principio
+                self._offset = 0
+                self._by_day.clear()
+                self._by_conversation.clear()
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1  # solo líneas completas
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            entry = loads_json(line)
+            day, rating = entry["timestamp"][:10], entry["rating"]
+            self._by_day.setdefault(day, Counter())[rating] += 1
+            self._by_conversation.setdefault(entry["conversation_id"], {}).setdefault(
+                day, Counter()
+            )[rating] += 1
+        self._offset += end
+
+    async def query(
+        self, conversation_id: Optional[str] = None, days: int = 30
+    ) -> Dict[str, Any]:
+        """
+        Agregados de las valoraciones de los últimos `days` días (incluidas las
+        aún encoladas): histograma total y por día (UTC); con conversation_id,
+        solo los de esa conversación.
+        """
+        await self.flush()
+        async with self._refresh_lock:
+            await asyncio.to_thread(self._refresh)
+        since = (datetime.now(timezone.utc) - timedelta(days=days)).date().isoformat()
+
+        if conversation_id:
+            source = self._by_conversation.get(conversation_id, {})
+        else:
+            source = self._by_day
+        by_day = {day: c for day, c in sorted(source.items()) if day >= since}
+        total: Counter = sum(by_day.values(), Counter())
+
+        result = {
+            **_histogram(total),
+            "by_day": {day: _histogram(c) for day, c in by_day.items()},
+        }
+        if conversation_id:
+            result["conversation_id"] = conversation_id
+        return result
+
+    def snapshot(self) -> Dict[str, int]:
+        return {
+            "queued": (self._queue.qsize() if self._queue else 0) + len(self._batch),
+            **self.stats,
+        }
+
+
+# Instancia global
+feedback_log = FeedbackLog(
+    settings.FEEDBACK_LOG,
+    settings.FEEDBACK_BATCH_SIZE,
+    settings.FEEDBACK_FLUSH_INTERVAL,
+    settings.FEEDBACK_QUEUE_SIZE,
+)
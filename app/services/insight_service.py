@@ -0,0 +1,122 @@
+# app/services/insight_service.py
+"""
+Biblioteca de datos relevantes ("💧 Dato relevante") por sector y subsector.
+
+Los datos vienen de la sección "facts" de app/data/questionnaire_complete.json
+(claves "<Sector>_<Subsector>", generada por app/data/script.py). Se cargan una
+sola vez y cada dato se etiqueta con los temas de las preguntas a las que mejor
+acompaña (costo, consumo, agua residual, calidad). Por conversación se rota
+entre los datos para no repetirlos, así el LLM no tiene que redactarlos.
+"""
+
+import json
+import logging
+import os
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from app.services.questionnaire_service import normalize_text, questionnaire_service
+
+logger = logging.getLogger("hydrous")
+
+FACTS_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "data", "questionnaire_complete.json"
+)
+
+# Palabras (sin acentos) que asocian un dato al rol de la pregunta
+TOPIC_KEYWORDS = {
+    "water_cost": ("costo", "ahorr", "inversion", "retorno", "usd", "dolar"),
+    "water_consumption": ("consumo", "litros", "metros cubicos", "demanda"),
+    "wastewater_generation": ("residual", "reutiliz", "reciclaje", "descarga"),
+    "water_quality": ("dqo", "dbo", "color", "solidos", "calidad", "remocion"),
+}
+
+
+class InsightService:
+    """Índice de datos por sector/subsector con rotación por conversación."""
+
+    def __init__(self, path: str = FACTS_PATH):
+        self.path = path
+        self._index: Optional[Dict[Tuple[str, str], List[Dict[str, Any]]]] = None
+
+    def _load(self) -> Dict[Tuple[str, str], List[Dict[str, Any]]]:
+        """Lee y etiqueta los datos la primera vez que se necesitan."""
+        if self._index is not None:
+            return self._index
+        index: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                facts = json.load(f).get("facts", {})
+        except Exception as e:
+            logger.error(f"Error cargando datos relevantes: {e}", exc_info=True)
+            facts = {}
+        for key, texts in facts.items():
+            sector, _, subsector = key.partition("_")
+            index[(sector, subsector)] = [
+                {
+                    "id": f"{key}:{position}",
+                    "text": text,
+                    "topics": self._topics(text),
+                }
+                for position, text in enumerate(texts)
+            ]
+        self._index = index
+        logger.info(f"Datos relevantes cargados para {len(index)} subsectores")
+        return index
+
+    @staticmethod
+    def _topics(text: str) -> FrozenSet[str]:
+        normalized = normalize_text(text)
+        return frozenset(
+            topic
+            for topic, words in TOPIC_KEYWORDS.items()
+            if any(word in normalized for word in words)
+        )
+
+    def _pools(self, sector: Optional[str], subsector: Optional[str]):
+        """Datos del subsector y, después, los del resto del sector."""
+        index = self._load()
+        own = index.get((sector, subsector), [])
+        rest = [
+            fact
+            for (s, sub), items in index.items()
+            if s == sector and sub != subsector
+            for fact in items
+        ]
+        return [pool for pool in (own, rest) if pool]
+
+    def get_insight(
+        self, metadata: Dict[str, Any], question_id: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Devuelve un dato no usado aún en la conversación (del subsector antes que
+        del resto del sector y, dentro de cada grupo, del tema de la pregunta) y lo
+        marca como usado en metadata["used_insights"]. None si el sector no se
+        conoce o no tiene datos.
+        """
+        pools = self._pools(
+            metadata.get("selected_sector"), metadata.get("selected_subsector")
+        )
+        if not pools:
+            return None
+
+        used = metadata.get("used_insights") or []
+        unused = [f for f in pools[0] if f["id"] not in used]
+        if not unused and len(pools) > 1:
+            unused = [f for f in pools[1] if f["id"] not in used]
+        if not unused:
+            # Todos mostrados: empezar una nueva ronda
+            used, unused = [], pools[0]
+
+        role = questionnaire_service.get_question_role(question_id)
+        if role and role.startswith("param_"):
+            role = "water_quality"
+        fact = next((f for f in unused if role in f["topics"]), unused[0])
+        metadata["used_insights"] = used + [fact["id"]]
+        return fact["text"]
+
+    def format_insight(self, text: str) -> str:
+        return f"> 💧 **Dato relevante:** {text}"
+
+
+# Instancia global
+insight_service = InsightService()
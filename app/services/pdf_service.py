@@ -11,6 +11,8 @@ from typing import Optional
 # -------------------------------
 
 from app.config import settings
+from app.utils import pdf_theme
+from app.utils.markdown_flowables import markdown_to_flowables
 
 logger = logging.getLogger("hydrous")
 
@@ -230,10 +232,7 @@ class PDFService:
     ) -> Optional[str]:
         """Genera un PDF a partir del texto de la propuesta ya generado."""
         try:
-            from reportlab.lib.pagesizes import A4
-            from reportlab.lib import colors
-            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+            from reportlab.platypus import SimpleDocTemplate
 
             # Eliminar marcador y texto previo a la propuesta
             proposal_text = proposal_text.replace(
@@ -262,37 +261,11 @@ class PDFService:
 
             # Configuración básica
             doc = SimpleDocTemplate(
-                output_path,
-                pagesize=A4,
-                rightMargin=72,
-                leftMargin=72,
-                topMargin=72,
-                bottomMargin=72,
+                output_path, pagesize=pdf_theme.PAGE_SIZE, **pdf_theme.PAGE_MARGINS
             )
 
-            # Estilos
-            styles = getSampleStyleSheet()
-
-            # CORREGIDO: Modificar estilos existentes en lugar de añadirlos
-            title_style = styles["Heading1"]
-            title_style.fontSize = 16
-            title_style.textColor = colors.blue
-
-            # Procesar el texto línea por línea
-            elements = []
-            for line in proposal_text.split("\n"):
-                if not line.strip():
-                    elements.append(Spacer(1, 12))
-                    continue
-
-                if line.startswith("# "):
-                    elements.append(Paragraph(line[2:], title_style))
-                elif line.startswith("## "):
-                    elements.append(Paragraph(line[3:], styles["Heading2"]))
-                elif line.startswith("- "):
-                    elements.append(Paragraph("• " + line[2:], styles["BodyText"]))
-                else:
-                    elements.append(Paragraph(line, styles["BodyText"]))
+            # Procesar el texto con el parser compartido
+            elements = markdown_to_flowables(proposal_text)
 
             # Construir PDF
             doc.build(elements)
@@ -310,18 +283,7 @@ class PDFService:
         Esta es una alternativa directa cuando el proceso normal falla.
         """
         try:
-            from reportlab.lib.pagesizes import A4
-            from reportlab.lib import colors
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-            from reportlab.platypus import (
-                SimpleDocTemplate,
-                Paragraph,
-                Spacer,
-                Table,
-                TableStyle,
-            )
-            from reportlab.lib.units import cm
-            import re
+            from reportlab.platypus import SimpleDocTemplate
 
             # Eliminar marcador y cualquier texto previo a la propuesta
             proposal_text = proposal_text.replace(
@@ -348,122 +310,11 @@ class PDFService:
 
             # Configurar documento
             doc = SimpleDocTemplate(
-                output_path,
-                pagesize=A4,
-                rightMargin=2 * cm,
-                leftMargin=2 * cm,
-                topMargin=2 * cm,
-                bottomMargin=2 * cm,
-            )
-
-            # Estilos
-            styles = getSampleStyleSheet()
-            styles.add(
-                ParagraphStyle(
-                    name="Title",
-                    parent=styles["Heading1"],
-                    fontSize=18,
-                    spaceAfter=12,
-                    textColor=colors.HexColor("#0056b3"),
-                )
-            )
-            styles.add(
-                ParagraphStyle(
-                    name="Heading2",
-                    parent=styles["Heading2"],
-                    fontSize=14,
-                    spaceAfter=8,
-                    textColor=colors.HexColor("#0056b3"),
-                )
-            )
-            styles.add(
-                ParagraphStyle(
-                    name="Normal", parent=styles["Normal"], fontSize=10, spaceAfter=6
-                )
+                output_path, pagesize=pdf_theme.PAGE_SIZE, **pdf_theme.PAGE_MARGINS
             )
 
-            # Procesar texto en elementos para PDF
-            elements = []
-
-            # Separar por líneas y procesar
-            lines = proposal_text.split("\n")
-            in_table = False
-            table_data = []
-
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-
-                # Verificar si es un encabezado
-                if line.startswith("# "):
-                    elements.append(Paragraph(line[2:], styles["Title"]))
-                elif line.startswith("## "):
-                    elements.append(Paragraph(line[3:], styles["Heading2"]))
-                elif line.startswith("### "):
-                    elements.append(Paragraph(line[4:], styles["Heading2"]))
-                # Verificar si es una línea de tabla
-                elif line.startswith("|") and line.endswith("|"):
-                    if not in_table:
-                        in_table = True
-                        table_data = []
-                    cells = [cell.strip() for cell in line.split("|")[1:-1]]
-                    table_data.append(cells)
-                # Si termina la tabla
-                elif in_table and not line.startswith("|"):
-                    if table_data:
-                        # Crear tabla
-                        table = Table(table_data)
-                        table.setStyle(
-                            TableStyle(
-                                [
-                                    (
-                                        "BACKGROUND",
-                                        (0, 0),
-                                        (-1, 0),
-                                        colors.HexColor("#f2f2f2"),
-                                    ),
-                                    ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
-                                    ("ALIGN", (0, 0), (-1, -1), "LEFT"),
-                                    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                                    ("FONTSIZE", (0, 0), (-1, 0), 10),
-                                    ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
-                                    ("BACKGROUND", (0, 1), (-1, -1), colors.white),
-                                    ("GRID", (0, 0), (-1, -1), 1, colors.black),
-                                    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-                                    ("PADDING", (0, 0), (-1, -1), 6),
-                                ]
-                            )
-                        )
-                        elements.append(table)
-                        elements.append(Spacer(1, 0.5 * cm))
-                    in_table = False
-                    # Procesar esta línea normalmente
-                    elements.append(Paragraph(line, styles["Normal"]))
-                # Si es texto normal y no estamos en una tabla
-                elif not in_table:
-                    elements.append(Paragraph(line, styles["Normal"]))
-
-            # Si terminamos en una tabla
-            if in_table and table_data:
-                table = Table(table_data)
-                table.setStyle(
-                    TableStyle(
-                        [
-                            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#f2f2f2")),
-                            ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
-                            ("ALIGN", (0, 0), (-1, -1), "LEFT"),
-                            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                            ("FONTSIZE", (0, 0), (-1, 0), 10),
-                            ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
-                            ("BACKGROUND", (0, 1), (-1, -1), colors.white),
-                            ("GRID", (0, 0), (-1, -1), 1, colors.black),
-                            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-                            ("PADDING", (0, 0), (-1, -1), 6),
-                        ]
-                    )
-                )
-                elements.append(table)
+            # Procesar texto en elementos para PDF (tablas incluidas)
+            elements = markdown_to_flowables(proposal_text)
 
             # Construir PDF
             doc.build(elements)
@@ -0,0 +1,426 @@
+# app/services/proposal_calculator.py
+"""
+Motor local de cálculo de la propuesta.
+
+Dimensiona el tren de tratamiento a partir del caudal y la calidad del agua
+(respuestas del usuario o valores típicos del sector) y calcula rangos de CAPEX,
+OPEX y retorno de inversión. Los catálogos de equipos se evalúan de forma
+vectorizada con NumPy, de modo que las cifras son reproducibles y la IA solo
+tiene que redactar la narrativa alrededor de las tablas ya calculadas.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.models.conversation import Conversation
+from app.services.answer_normalizer import answer_normalizer
+from app.services.document_context import document_context
+from app.services.proposal_service import proposal_service
+from app.services.questionnaire_service import questionnaire_service
+from app.utils.units import format_quantity, upper_value
+
+logger = logging.getLogger("hydrous")
+
+# --- Supuestos de diseño ---
+SAFETY_FACTOR = 1.2  # Sobredimensionamiento sobre el caudal medio
+SCALING_EXPONENT = 0.6  # Regla de los seis décimos para el costo por capacidad
+INSTALLATION_FACTOR = 0.35  # Instalación como fracción del costo de equipos
+ENGINEERING_FACTOR = 0.15  # Ingeniería como fracción del costo de equipos
+CAPEX_RANGE = (0.8, 1.25)  # Incertidumbre de una estimación preliminar
+MAINTENANCE_FACTOR = 0.025  # Mantenimiento anual como fracción del CAPEX
+ENERGY_PRICE_USD_KWH = 0.12
+REUSE_FRACTION = 0.6  # Fracción del agua residual tratada que se reúsa
+DAYS_PER_MONTH = 30
+DEFAULT_WATER_COST_USD_M3 = 1.5
+
+# Caudal de diseño por defecto (m³/día) cuando el usuario no lo indica
+DEFAULT_FLOWS = {
+    "Industrial": 300.0,
+    "Comercial": 80.0,
+    "Municipal": 1500.0,
+    "Residencial": 15.0,
+    "_default": 200.0,
+}
+
+# Costo mensual de operación (personal) por tamaño de planta: (caudal máx m³/día, USD/mes)
+LABOR_TIERS = ((50, 600.0), (500, 1800.0), (2000, 3600.0), (float("inf"), 6000.0))
+
+# Catálogo de tecnologías. Cada modelo es (capacidad m³/día, costo USD) y el costo se
+# escala con la regla de los seis décimos hacia la capacidad realmente necesaria.
+EQUIPMENT_CATALOG = {
+    "screening": {
+        "label": "Pretreatment",
+        "name": "Cribado y tanque de homogeneización",
+        "function": "Retención de sólidos gruesos y regulación de caudal",
+        "kwh_per_m3": 0.05,
+        "chemicals_usd_per_m3": 0.0,
+        "models": [(50, 12000), (200, 28000), (1000, 65000), (5000, 180000)],
+    },
+    "daf": {
+        "label": "Primary",
+        "name": "Flotación por aire disuelto (DAF)",
+        "function": "Remoción de grasas, aceites y sólidos suspendidos",
+        "kwh_per_m3": 0.15,
+        "chemicals_usd_per_m3": 0.08,
+        "models": [(100, 45000), (400, 90000), (1200, 160000), (3000, 290000)],
+    },
+    "primary_clarifier": {
+        "label": "Primary",
+        "name": "Clarificador primario con coagulación-floculación",
+        "function": "Sedimentación de sólidos suspendidos",
+        "kwh_per_m3": 0.04,
+        "chemicals_usd_per_m3": 0.05,
+        "models": [(100, 30000), (500, 70000), (2000, 150000), (8000, 380000)],
+    },
+    "uasb": {
+        "label": "Secondary",
+        "name": "Reactor anaerobio UASB",
+        "function": "Remoción de carga orgánica alta con producción de biogás",
+        "kwh_per_m3": 0.10,
+        "chemicals_usd_per_m3": 0.02,
+        "models": [(200, 140000), (800, 320000), (2500, 700000)],
+    },
+    "mbbr": {
+        "label": "Secondary",
+        "name": "Reactor biológico MBBR",
+        "function": "Remoción de materia orgánica (DBO/DQO)",
+        "kwh_per_m3": 0.45,
+        "chemicals_usd_per_m3": 0.02,
+        "models": [(50, 35000), (250, 95000), (1000, 240000), (4000, 620000)],
+    },
+    "filtration": {
+        "label": "Tertiary",
+        "name": "Filtración multimedia",
+        "function": "Pulido de sólidos suspendidos",
+        "kwh_per_m3": 0.05,
+        "chemicals_usd_per_m3": 0.01,
+        "models": [(50, 9000), (300, 26000), (1200, 70000), (5000, 190000)],
+    },
+    "uv": {
+        "label": "Final",
+        "name": "Desinfección UV",
+        "function": "Desinfección para reúso seguro",
+        "kwh_per_m3": 0.03,
+        "chemicals_usd_per_m3": 0.0,
+        "models": [(50, 7000), (300, 18000), (1500, 48000), (6000, 130000)],
+    },
+}
+# Catálogos como arreglos NumPy, construidos una sola vez
+_CATALOG_ARRAYS = {
+    key: np.array(spec["models"], dtype=float)
+    for key, spec in EQUIPMENT_CATALOG.items()
+}
+
+# Parámetros de calidad: clave de plantilla → etiqueta para la propuesta
+PARAMETER_LABELS = {
+    "TSS": "TSS (mg/L)",
+    "COD": "COD (mg/L)",
+    "BOD": "BOD (mg/L)",
+    "FOG": "FOG (mg/L)",
+    "TDS": "TDS (mg/L)",
+    "PH": "pH",
+}
+
+
+def _usd(value: float) -> str:
+    sign = "-" if value < 0 else ""
+    return f"{sign}${abs(value):,.0f} USD"
+
+
+def size_stage(stage_key: str, design_flow: float) -> Dict[str, Any]:
+    """
+    Selecciona el modelo más económico de una etapa para el caudal de diseño.
+
+    Para todos los modelos a la vez se calcula el número de unidades en paralelo,
+    la capacidad de cada unidad y su costo escalado; se elige el de menor costo.
+    """
+    spec = EQUIPMENT_CATALOG[stage_key]
+    catalog = _CATALOG_ARRAYS[stage_key]
+    capacities, base_costs = catalog[:, 0], catalog[:, 1]
+
+    units = np.ceil(design_flow / capacities)
+    unit_flow = design_flow / units
+    # Un modelo no se escala por debajo del 30% de su capacidad nominal
+    scale = np.maximum(unit_flow / capacities, 0.3) ** SCALING_EXPONENT
+    total_costs = units * base_costs * scale
+
+    best = int(np.argmin(total_costs))
+    return {
+        "stage": stage_key,
+        "label": spec["label"],
+        "name": spec["name"],
+        "function": spec["function"],
+        "units": int(units[best]),
+        "unit_capacity_m3_day": float(unit_flow[best]),
+        "cost_usd": float(total_costs[best]),
+        "kwh_per_m3": spec["kwh_per_m3"],
+        "chemicals_usd_per_m3": spec["chemicals_usd_per_m3"],
+    }
+
+
+class ProposalCalculator:
+    """Calcula dimensionamiento, CAPEX/OPEX y ROI de forma determinista."""
+
+    # --- Entradas ---
+
+    def _answers_by_role(self, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Valores tipados indexados por rol de pregunta (ubicación, consumo...). Se usan
+        los datos de collected_data y, si faltan, se normalizan las respuestas crudas.
+        Los valores de documentos completan lo que el usuario no respondió.
+        """
+        answers: Dict[str, Any] = {}
+        summaries = metadata.get("response_summaries") or {}
+        for question_id, summary in summaries.items():
+            role = questionnaire_service.get_question_role(question_id)
+            answer = summary.get("answer") if isinstance(summary, dict) else summary
+            if role and answer:
+                answers[role] = answer_normalizer.normalize(question_id, str(answer))
+        for question_id, value in (metadata.get("collected_data") or {}).items():
+            role = questionnaire_service.get_question_role(question_id)
+            if role and value not in (None, ""):
+                answers[role] = value
+        documents = document_context.document_answers(metadata).get("water_quality")
+        if documents:
+            answered = answers.get("water_quality")
+            answers["water_quality"] = (
+                {**documents, **answered} if isinstance(answered, dict) else documents
+            )
+        return answers
+
+    @staticmethod
+    def _number(answers: Dict[str, Any], role: str) -> Optional[float]:
+        """Valor numérico ya normalizado de un rol (None si la respuesta no se interpretó)."""
+        value = answers.get(role)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+        return float(value)
+
+    def _parameter_values(self, answers: Dict[str, Any]) -> Dict[str, float]:
+        """Valores de calidad del agua indicados por el usuario."""
+        quality = answers.get("water_quality")
+        values = dict(quality) if isinstance(quality, dict) else {}
+        for key in PARAMETER_LABELS:
+            direct = self._number(answers, f"param_{key}")
+            if direct is not None:
+                values[key] = direct
+        return values
+
+    def _design_flow(
+        self, answers: Dict[str, Any], sector: Optional[str]
+    ) -> Tuple[float, str]:
+        """Caudal de diseño (m³/día) y su origen."""
+        generation = self._number(answers, "wastewater_generation")
+        if generation:
+            return generation, "wastewater_generation"
+        consumption = self._number(answers, "water_consumption")
+        if consumption:
+            # Típicamente ~80% del agua consumida se descarga como agua residual
+            return consumption * 0.8, "water_consumption"
+        return DEFAULT_FLOWS.get(sector, DEFAULT_FLOWS["_default"]), "default"
+
+    # --- Cálculo ---
+
+    def _select_stages(self, quality: Dict[str, float]) -> List[str]:
+        """Selecciona las etapas del tren de tratamiento según la calidad de entrada."""
+        stages = ["screening"]
+        if quality.get("FOG", 0) > 100 or quality.get("TSS", 0) > 400:
+            stages.append("daf")
+        else:
+            stages.append("primary_clarifier")
+        if quality.get("COD", 0) > 1500:
+            stages.append("uasb")
+        stages.extend(["mbbr", "filtration", "uv"])
+        return stages
+
+    def calculate(self, conversation: Conversation) -> Dict[str, Any]:
+        """Calcula la propuesta técnica y económica de una conversación."""
+        metadata = conversation.metadata or {}
+        sector = metadata.get("selected_sector")
+        subsector = metadata.get("selected_subsector")
+        answers = self._answers_by_role(metadata)
+
+        # Calidad del agua: valor del usuario o, si falta, el típico del sector
+        user_values = self._parameter_values(answers)
+        parameters = []
+        quality: Dict[str, float] = {}
+        for key, label in PARAMETER_LABELS.items():
+            typical = proposal_service._get_typical_value(
+                sector, subsector, f"{key}_STANDARD"
+            )
+            goal = proposal_service._get_typical_value(sector, subsector, f"{key}_GOAL")
+            if key in user_values:
+                current = f"{user_values[key]:g}"
+                quality[key] = user_values[key]
+            else:
+                current = f"{typical} (típico)"
+                typical_value = upper_value(typical)
+                if typical_value is not None:
+                    quality[key] = typical_value
+            parameters.append({"label": label, "current": current, "target": goal})
+
+        design_flow, flow_source = self._design_flow(answers, sector)
+        sizing_flow = design_flow * SAFETY_FACTOR
+        equipment = [
+            size_stage(stage, sizing_flow) for stage in self._select_stages(quality)
+        ]
+
+        # CAPEX
+        equipment_cost = float(np.sum([item["cost_usd"] for item in equipment]))
+        installation = equipment_cost * INSTALLATION_FACTOR
+        engineering = equipment_cost * ENGINEERING_FACTOR
+        capex = equipment_cost + installation + engineering
+
+        # OPEX mensual
+        monthly_volume = design_flow * DAYS_PER_MONTH
+        kwh_per_m3 = np.array([item["kwh_per_m3"] for item in equipment])
+        chemicals_per_m3 = np.array(
+            [item["chemicals_usd_per_m3"] for item in equipment]
+        )
+        energy = float(kwh_per_m3.sum()) * monthly_volume * ENERGY_PRICE_USD_KWH
+        chemicals = float(chemicals_per_m3.sum()) * monthly_volume
+        labor = next(cost for max_flow, cost in LABOR_TIERS if design_flow <= max_flow)
+        maintenance = capex * MAINTENANCE_FACTOR / 12
+        opex = energy + chemicals + labor + maintenance
+
+        # ROI: ahorro por reúso del agua tratada frente al costo actual del agua
+        water_cost = self._number(answers, "water_cost")
+        water_cost_source = "user" if water_cost else "default"
+        water_cost = water_cost or DEFAULT_WATER_COST_USD_M3
+        consumption = self._number(answers, "water_consumption") or design_flow / 0.8
+        reused_volume = min(design_flow * REUSE_FRACTION, consumption) * DAYS_PER_MONTH
+        current_water_cost = consumption * DAYS_PER_MONTH * water_cost
+        projected_water_cost = current_water_cost - reused_volume * water_cost
+        monthly_savings = current_water_cost - projected_water_cost - opex
+        payback_years = capex / (monthly_savings * 12) if monthly_savings > 0 else None
+
+        return {
+            "sector": sector,
+            "subsector": subsector,
+            "design_flow_m3_day": design_flow,
+            "flow_source": flow_source,
+            "parameters": parameters,
+            "equipment": equipment,
+            "capex": {
+                "equipment": equipment_cost,
+                "installation": installation,
+                "engineering": engineering,
+                "total": capex,
+                "range": (capex * CAPEX_RANGE[0], capex * CAPEX_RANGE[1]),
+            },
+            "opex": {
+                "energy": energy,
+                "chemicals": chemicals,
+                "labor": labor,
+                "maintenance": maintenance,
+                "total": opex,
+            },
+            "roi": {
+                "water_cost_usd_m3": water_cost,
+                "water_cost_source": water_cost_source,
+                "current_water_cost": current_water_cost,
+                "projected_water_cost": projected_water_cost,
+                "monthly_savings": monthly_savings,
+                "payback_years": payback_years,
+            },
+        }
+
+    # --- Presentación ---
+
+    def render_sections(self, result: Dict[str, Any]) -> Dict[str, str]:
+        """Contenido markdown (sin título) de las secciones calculadas localmente."""
+        parameters = [
+            "| **Parameter** | **Current Value** | **Target Value** |",
+            "| ------------- | --------------- | ---------------- |",
+        ]
+        parameters += [
+            f"| **{p['label']}** | {p['current']} | {p['target']} |"
+            for p in result["parameters"]
+        ]
+        flow_text = format_quantity(result["design_flow_m3_day"], "m³/día")
+        if result["flow_source"] == "default":
+            flow_text += " (estimado típico del sector)"
+        parameters.append(f"\nCaudal de diseño: {flow_text}")
+
+        process = [
+            "| **Treatment Stage** | **Technology** | **Function** |",
+            "| ------------------ | ------------- | ------------ |",
+        ]
+        process += [
+            f"| **{item['label']}** | {item['name']} | {item['function']} |"
+            for item in result["equipment"]
+        ]
+
+        equipment = [
+            "| **Equipment** | **Capacity** | **Est. Cost (USD)** |",
+            "| ------------- | ------------ | ------------------ |",
+        ]
+        for item in result["equipment"]:
+            capacity = format_quantity(item["unit_capacity_m3_day"], "m³/día")
+            if item["units"] > 1:
+                capacity = f"{item['units']} x {capacity}"
+            equipment.append(
+                f"| {item['name']} | {capacity} | {_usd(item['cost_usd'])} |"
+            )
+
+        capex, opex, roi = result["capex"], result["opex"], result["roi"]
+        low, high = capex["range"]
+        financials = "\n".join(
+            [
+                f"**CAPEX: {_usd(capex['total'])}** (rango {_usd(low)} - {_usd(high)})",
+                f"- Equipment: {_usd(capex['equipment'])}",
+                f"- Installation: {_usd(capex['installation'])}",
+                f"- Engineering: {_usd(capex['engineering'])}",
+                "",
+                f"**Monthly OPEX: {_usd(opex['total'])}**",
+                f"- Chemicals: {_usd(opex['chemicals'])}",
+                f"- Energy: {_usd(opex['energy'])}",
+                f"- Labor: {_usd(opex['labor'])}",
+                f"- Maintenance: {_usd(opex['maintenance'])}",
+            ]
+        )
+
+        water_cost = f"${roi['water_cost_usd_m3']:,.2f} USD/m³"
+        if roi["water_cost_source"] == "default":
+            water_cost += " (supuesto)"
+        if roi["payback_years"] is not None:
+            payback = f"{roi['payback_years']:.1f} years"
+        else:
+            payback = "No se alcanza con el ahorro de agua actual"
+        roi_lines = "\n".join(
+            [
+                f"- Water cost: {water_cost}",
+                f"- Current water cost: {_usd(roi['current_water_cost'])}/month",
+                f"- Projected water cost: {_usd(roi['projected_water_cost'])}/month",
+                f"- Monthly savings (net of OPEX): {_usd(roi['monthly_savings'])}",
+                f"- ROI period: {payback}",
+            ]
+        )
+
+        return {
+            "parameters": "\n".join(parameters),
+            "process": "\n".join(process),
+            "equipment": "\n".join(equipment),
+            "financials": financials,
+            "roi": roi_lines,
+        }
+
+    def summarize(self, result: Dict[str, Any]) -> str:
+        """Resumen breve de las cifras calculadas para dar contexto a la IA."""
+        low, high = result["capex"]["range"]
+        payback = result["roi"]["payback_years"]
+        lines = [
+            f"- Caudal de diseño: {format_quantity(result['design_flow_m3_day'], 'm³/día')}",
+            "- Tren de tratamiento: "
+            + ", ".join(item["name"] for item in result["equipment"]),
+            f"- CAPEX: ${low:,.0f} - ${high:,.0f} USD",
+            f"- OPEX mensual: ${result['opex']['total']:,.0f} USD",
+            f"- Retorno de inversión: {f'{payback:.1f} años' if payback else 'no calculable'}",
+        ]
+        return "\n".join(lines)
+
+
+# Instancia global
+proposal_calculator = ProposalCalculator()
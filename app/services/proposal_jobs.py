@@ -0,0 +1,170 @@
+# app/services/proposal_jobs.py
+"""
+Generación de la propuesta de cada conversación como un trabajo, y almacén de
+sus PDFs.
+
+Generar la propuesta es lo más caro de una conversación (varias llamadas al LLM
+y el PDF): si la última respuesta y una descarga la piden a la vez se genera
+una sola vez. Con el backend en memoria basta una tarea por conversación y el
+PDF queda en el disco del proceso.
+
+Con Redis (varios workers/instancias) el trabajo se reclama en
+hydrous:proposal:<id>:job (SET NX con un token; la caducidad se renueva
+mientras se genera) y el PDF terminado se guarda en hydrous:proposal:<id>:pdf
+hasta que caduca la conversación. Así cualquier worker sirve la descarga
+aunque el PDF se generara en otra instancia, y el que llega mientras otro
+genera espera ese resultado en lugar de repetir la generación.
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from typing import Dict, Optional
+
+from app.models.conversation import Conversation
+from app.services.redis_backend import (
+    get_raw_redis,
+    get_redis,
+    redis_enabled,
+    release_lease,
+    renew_lease,
+)
+from app.services.redis_backend import key as redis_key
+from app.services.storage_service import conversation_expires_at
+
+logger = logging.getLogger("hydrous")
+
+# Backend Redis: caducidad del trabajo (se renueva mientras se genera), espera
+# máxima por el trabajo de otro worker y cada cuánto se consulta
+PROPOSAL_JOB_TIMEOUT = 60
+PROPOSAL_JOB_RENEW_INTERVAL = PROPOSAL_JOB_TIMEOUT / 3
+PROPOSAL_JOB_WAIT = 600
+PROPOSAL_JOB_POLL = 0.5
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _write_file(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+class ProposalJobs:
+    """Una generación en curso por conversación, dentro del proceso."""
+
+    def __init__(self):
+        self._running: Dict[str, asyncio.Task] = {}
+
+    async def generate(self, conversation: Conversation) -> Optional[str]:
+        """
+        Genera la propuesta (o espera la que ya está en curso para la misma
+        conversación) y devuelve la ruta local del PDF; None si falló.
+        """
+        task = self._running.get(conversation.id)
+        if task is None:
+            task = asyncio.create_task(self._generate(conversation))
+            self._running[conversation.id] = task
+            task.add_done_callback(lambda _: self._running.pop(conversation.id, None))
+        # Si se cancela la petición, la generación sigue para las demás
+        return await asyncio.shield(task)
+
+    async def _generate(self, conversation: Conversation) -> Optional[str]:
+        from app.services.direct_proposal_generator import direct_proposal_generator
+
+        return await direct_proposal_generator.generate_complete_proposal(conversation)
+
+    async def pdf_path(self, conversation: Conversation) -> Optional[str]:
+        """Ruta local del PDF de la propuesta; si no existe, se genera."""
+        path = conversation.metadata.get("pdf_path")
+        if path and os.path.exists(path):
+            return path
+        return await self.generate(conversation)
+
+
+class RedisProposalJobs(ProposalJobs):
+    """Trabajos y PDFs compartidos entre workers a través de Redis."""
+
+    @staticmethod
+    def _keys(conversation_id: str):
+        return (
+            redis_key("proposal", conversation_id, "job"),
+            redis_key("proposal", conversation_id, "pdf"),
+        )
+
+    async def _generate(self, conversation: Conversation) -> Optional[str]:
+        job_key, pdf_key = self._keys(conversation.id)
+        token = uuid.uuid4().hex
+        if not await get_redis().set(
+            job_key, token, nx=True, px=int(PROPOSAL_JOB_TIMEOUT * 1000)
+        ):
+            logger.info(f"Propuesta de {conversation.id} en curso en otro worker")
+            return await self._wait(conversation)
+
+        stop_renewal = asyncio.Event()
+        renewal = asyncio.create_task(
+            renew_lease(
+                job_key,
+                token,
+                PROPOSAL_JOB_TIMEOUT,
+                PROPOSAL_JOB_RENEW_INTERVAL,
+                stop_renewal,
+            )
+        )
+        try:
+            path = await super()._generate(conversation)
+            if path:
+                try:
+                    data = await asyncio.to_thread(_read_file, path)
+                    await get_raw_redis().set(
+                        pdf_key, data, exat=conversation_expires_at(conversation)
+                    )
+                except Exception as e:
+                    # La descarga sigue funcionando en este worker
+                    logger.error(
+                        f"Error al guardar en Redis el PDF de {conversation.id}: {e}"
+                    )
+            return path
+        finally:
+            stop_renewal.set()
+            await renewal
+            await release_lease(job_key, token)
+
+    async def _wait(self, conversation: Conversation) -> Optional[str]:
+        """Espera a que termine el trabajo de otro worker y trae su PDF."""
+        job_key, _ = self._keys(conversation.id)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + PROPOSAL_JOB_WAIT
+        while await get_redis().exists(job_key):
+            if loop.time() >= deadline:
+                logger.error(f"Se agota la espera de la propuesta de {conversation.id}")
+                return None
+            await asyncio.sleep(PROPOSAL_JOB_POLL)
+        return await self._fetch(conversation)
+
+    async def _fetch(self, conversation: Conversation) -> Optional[str]:
+        """Copia al disco local el PDF guardado en Redis; None si no hay."""
+        from app.services.direct_proposal_generator import direct_proposal_generator
+
+        _, pdf_key = self._keys(conversation.id)
+        data = await get_raw_redis().get(pdf_key)
+        if data is None:
+            return None
+        path = direct_proposal_generator.pdf_output_path(conversation.id)
+        await asyncio.to_thread(_write_file, path, data)
+        conversation.metadata["pdf_path"] = path
+        return path
+
+    async def pdf_path(self, conversation: Conversation) -> Optional[str]:
+        path = conversation.metadata.get("pdf_path")
+        if path and os.path.exists(path):
+            return path
+        return await self._fetch(conversation) or await self.generate(conversation)
+
+
+# Instancia global
+proposal_jobs = RedisProposalJobs() if redis_enabled() else ProposalJobs()
@@ -4,7 +4,7 @@ import markdown
 import os
 import json
 import re
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
 from app.models.conversation import Conversation
 
@@ -13,12 +13,67 @@ from app.models.conversation import Conversation
 
 logger = logging.getLogger("hydrous")
 
+# Placeholder de plantilla: [CLAVE], insensible a mayúsculas.
+# Se admiten dígitos, Ñ y & por claves como H2O_VALUE, DISEÑO_PROCESO_TEXTO o
+# RESUMEN_Q&A_TEXTO.
+_PLACEHOLDER_RE = re.compile(r"\[([A-Za-z0-9Ññ_&]{3,})\]")
+# Placeholders sin dato que se marcan como "[Dato no disponible]" al renderizar
+# (no empiezan por dígito: "[123]" es texto de la plantilla)
+_UNRESOLVED_PLACEHOLDER_RE = re.compile(r"[A-Z_][A-Z0-9_]{2,}")
+
+# Claves que produce _format_data_for_template (una prueba comprueba que coinciden)
+TEMPLATE_KEYS = frozenset(
+    {
+        "CLIENT_NAME",
+        "LOCATION",
+        "INDUSTRY_SECTOR",
+        "INDUSTRY_SUBSECTOR",
+        "WATER_SOURCE",
+        "WATER_COST",
+        "WATER_CONSUMPTION",
+        "WASTEWATER_GENERATION",
+        "EXISTING_SYSTEM_BOOL",
+        "EXISTING_SYSTEM_DESC",
+        "EXISTING_SYSTEM_STATUS",
+        "MAIN_OBJECTIVE",
+        "REUSE_OBJECTIVES",
+        "BUDGET_RANGE",
+        "TSS_VALUE",
+        "COD_VALUE",
+        "BOD_VALUE",
+        "PH_VALUE",
+        "TDS_VALUE",
+        "FOG_VALUE",
+        "TSS_STANDARD",
+        "COD_STANDARD",
+        "BOD_STANDARD",
+        "PH_STANDARD",
+        "TDS_STANDARD",
+        "FOG_STANDARD",
+        "TSS_GOAL",
+        "COD_GOAL",
+        "BOD_GOAL",
+        "PH_GOAL",
+        "TDS_GOAL",
+        "FOG_GOAL",
+        "DISEÑO_PROCESO_TEXTO",
+        "EQUIPOS_DIMENSIONES_TEXTO",
+        "OPEX_RANGE",
+        "ANALISIS_ROI_TEXTO",
+        "RESUMEN_Q&A_TEXTO",
+    }
+)
+
 
 class ProposalService:
 
     def __init__(self):
         # Cargar plantilla base de la propuesta
         self.template_string = self._load_template()
+        # Pre-tokenizar la plantilla una sola vez (literales + placeholders)
+        self.template_segments, self.template_slots = self._compile_template(
+            self.template_string
+        )
         # Cargar valores típicos (puedes expandir esto)
         self.typical_values = self._load_typical_values()
 
@@ -307,38 +362,61 @@ class ProposalService:
         logger.debug(f"Datos formateados para plantilla: {data}")
         return data
 
-    def _fill_template(self, template_data: Dict[str, Any]) -> str:
-        """Rellena la plantilla con los datos usando reemplazo simple."""
-        filled_template = self.template_string
-        for key, value in template_data.items():
-            placeholder = f"[{key}]"  # Buscar placeholder [KEY]
-            # Convertir valor a string para reemplazo, manejar listas/dicts básicos
-            if isinstance(value, list):
-                str_value = ", ".join(map(str, value)) if value else "[No especificado]"
-            elif isinstance(value, dict):
-                str_value = json.dumps(value) if value else "[No especificado]"
-            else:
-                str_value = str(value) if value is not None else "[No especificado]"
-
-            # Usar regex para reemplazar insensible a mayúsculas/minúsculas y manejar espacios
-            try:
-                # Escapar caracteres especiales en el placeholder para regex
-                escaped_placeholder = re.escape(placeholder)
-                # Reemplazo insensible a mayúsculas
-                filled_template = re.sub(
-                    escaped_placeholder, str_value, filled_template, flags=re.IGNORECASE
-                )
-            except re.error as re_err:
-                logger.error(f"Error de Regex reemplazando '{placeholder}': {re_err}")
-                # Fallback a reemplazo simple si regex falla
-                filled_template = filled_template.replace(placeholder, str_value)
-
-        # Limpiar placeholders restantes que no se encontraron
-        filled_template = re.sub(
-            r"\[[A-Z_]{3,}\]", "[Dato no disponible]", filled_template
+    def _compile_template(
+        self, template: str
+    ) -> Tuple[List[str], List[Tuple[int, str, str]]]:
+        """
+        Divide la plantilla en segmentos literales y huecos de placeholder.
+        Devuelve (segmentos, huecos) donde cada hueco es (índice, CLAVE, texto original).
+        Los placeholders desconocidos se reportan aquí, una sola vez.
+        """
+        segments: List[str] = []
+        slots: List[Tuple[int, str, str]] = []
+        position = 0
+        for match in _PLACEHOLDER_RE.finditer(template):
+            segments.append(template[position : match.start()])
+            slots.append((len(segments), match.group(1).upper(), match.group(0)))
+            segments.append(match.group(0))
+            position = match.end()
+        segments.append(template[position:])
+
+        unknown = sorted(
+            {
+                key
+                for _, key, raw in slots
+                if key not in TEMPLATE_KEYS
+                and _UNRESOLVED_PLACEHOLDER_RE.fullmatch(raw[1:-1])
+            }
         )
+        if unknown:
+            logger.warning(
+                f"Placeholders de plantilla sin dato asociado: {', '.join(unknown)}"
+            )
+        logger.debug(
+            f"Plantilla de propuesta compilada: {len(segments)} segmentos, {len(slots)} placeholders."
+        )
+        return segments, slots
 
-        return filled_template
+    @staticmethod
+    def _stringify_template_value(value: Any) -> str:
+        """Convierte un valor a texto para la plantilla, manejando listas/dicts básicos."""
+        if isinstance(value, list):
+            return ", ".join(map(str, value)) if value else "[No especificado]"
+        if isinstance(value, dict):
+            return json.dumps(value) if value else "[No especificado]"
+        return str(value) if value is not None else "[No especificado]"
+
+    def _fill_template(self, template_data: Dict[str, Any]) -> str:
+        """Rellena la plantilla pre-tokenizada en una sola pasada."""
+        values = {key.upper(): value for key, value in template_data.items()}
+        parts = list(self.template_segments)
+        for index, key, raw in self.template_slots:
+            if key in values:
+                parts[index] = self._stringify_template_value(values[key])
+            elif _UNRESOLVED_PLACEHOLDER_RE.fullmatch(raw[1:-1]):
+                # Limpiar placeholders restantes que no se encontraron
+                parts[index] = "[Dato no disponible]"
+        return "".join(parts)
 
     async def _refine_section_with_llm(self, section_name: str, prompt: str) -> str:
         """Llama al LLM para generar/refinar una sección específica (Función Auxiliar Opcional)."""
@@ -0,0 +1,182 @@
+# app/services/question_renderer.py
+"""
+Presentación local de las preguntas del cuestionario (modo QUESTION_MODE="local").
+
+El texto, las opciones y la explicación de cada pregunta ya están en
+QUESTIONNAIRE_STRUCTURE, así que la siguiente pregunta se arma aquí con el mismo
+formato que pide el prompt ("**PREGUNTA:**", opciones numeradas y explicación)
+sin llamar al LLM. El LLM solo se usa cuando la respuesta del usuario no se
+puede interpretar (aclaraciones) o el usuario hace una pregunta.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from app.services.document_context import document_context
+from app.services.insight_service import insight_service
+from app.services.questionnaire_service import normalize_text, questionnaire_service
+
+logger = logging.getLogger("hydrous")
+
+CHOICE_TYPES = ("multiple_choice", "conditional_multiple_choice", "yes_no")
+YES_NO_OPTIONS = ["Sí", "No"]
+
+
+class QuestionRenderer:
+    """Elige y formatea la siguiente pregunta a partir del estado de la conversación."""
+
+    # --- Siguiente pregunta ---
+
+    @staticmethod
+    def _answer_text(value: Any) -> str:
+        if isinstance(value, bool):
+            return "si" if value else "no"
+        if isinstance(value, list):
+            return " ".join(normalize_text(str(v)) for v in value)
+        return normalize_text(str(value))
+
+    def _dependency_met(self, question: Dict[str, Any], collected: Dict) -> bool:
+        """Evalúa depends_on ({id, value | value_contains | value_is_negative})."""
+        dependency = question.get("depends_on")
+        if not dependency:
+            return True
+        if dependency.get("id") not in collected:
+            return False
+        answer = self._answer_text(collected[dependency["id"]])
+        if "value" in dependency:
+            return answer.startswith(normalize_text(dependency["value"]))
+        if "value_contains" in dependency:
+            return normalize_text(dependency["value_contains"]) in answer
+        if dependency.get("value_is_negative"):
+            return answer.startswith("no")
+        return True
+
+    def next_question_id(self, metadata: Dict[str, Any]) -> Optional[str]:
+        """
+        Primera pregunta de la ruta sin responder (ni cubierta por los datos de
+        un documento), posterior a la actual y cuyas dependencias se cumplen.
+        None si ya no quedan preguntas.
+        """
+        path = questionnaire_service.get_questionnaire_path(
+            metadata.get("selected_sector"), metadata.get("selected_subsector")
+        )
+        collected = metadata.get("collected_data") or {}
+        current = metadata.get("current_question_id")
+        start = path.index(current) + 1 if current in path else 0
+        for question_id in path[start:]:
+            if question_id in collected or document_context.answers_question(
+                metadata, question_id
+            ):
+                continue
+            question = questionnaire_service.all_questions_base.get(question_id, {})
+            if self._dependency_met(question, collected):
+                return question_id
+        return None
+
+    # --- Formato ---
+
+    @staticmethod
+    def options(question: Dict[str, Any], metadata: Dict[str, Any]) -> List[str]:
+        """Opciones presentables (las abreviadas con ... del cuestionario se omiten)."""
+        if question.get("type") == "yes_no":
+            return list(YES_NO_OPTIONS)
+        if question.get("type") == "conditional_multiple_choice":
+            key = question.get("depends_on_key", "selected_sector")
+            options = question.get("conditions", {}).get(metadata.get(key), [])
+        else:
+            options = question.get("options") or []
+        return [option for option in options if isinstance(option, str)]
+
+    @staticmethod
+    def _is_truncated(question: Dict[str, Any]) -> bool:
+        """Lista de opciones abreviada con ... (admite respuestas libres)."""
+        return any(option is Ellipsis for option in question.get("options") or [])
+
+    @staticmethod
+    def question_text(question: Dict[str, Any], metadata: Dict[str, Any]) -> str:
+        text = question.get("text", "")
+        if "{sector}" in text:
+            text = text.replace("{sector}", metadata.get("selected_sector") or "")
+        return text
+
+    def render(self, question_id: str, metadata: Dict[str, Any]) -> Optional[str]:
+        """Texto de la pregunta en el formato del asistente."""
+        question = questionnaire_service.all_questions_base.get(question_id)
+        if not question:
+            return None
+        parts = [f"**PREGUNTA:** {self.question_text(question, metadata)}"]
+        if question.get("confirmation_text"):
+            parts.insert(0, question["confirmation_text"])
+
+        options = self.options(question, metadata)
+        if options:
+            parts.append(
+                "\n".join(f"{n}. {option}" for n, option in enumerate(options, 1))
+            )
+            hint = "*Puedes responder solo con el número de la opción"
+            if self._is_truncated(question):
+                hint += " o escribir tu respuesta si ninguna aplica"
+            parts.append(hint + ".*")
+        elif question.get("sub_questions"):
+            parts.append(
+                "\n".join(f"- {sub['label']}" for sub in question["sub_questions"])
+            )
+        if question.get("type") == "document_upload":
+            parts.append("*Puedes adjuntar el documento o describir su contenido.*")
+
+        explanation = (question.get("explanation") or "").strip()
+        if explanation and explanation != "...":
+            parts.append(f"*¿Por qué lo preguntamos?* {explanation}")
+        return "\n\n".join(parts)
+
+    # --- Flujo ---
+
+    def needs_clarification(self, question_id: str, answer: str, value: Any) -> bool:
+        """
+        True si la respuesta requiere al LLM: el usuario hizo una pregunta o no
+        eligió una opción reconocible en una pregunta de opciones.
+        """
+        if "?" in (answer or ""):
+            return True
+        question = questionnaire_service.all_questions_base.get(question_id) or {}
+        if question.get("type") not in CHOICE_TYPES:
+            return False
+        answer = (answer or "").strip()
+        # El normalizador devuelve el texto sin cambios si no lo pudo interpretar
+        # Con opciones abreviadas (...) se acepta cualquier texto libre
+        unresolved = isinstance(value, str) and value == answer
+        return unresolved and not self._is_truncated(question)
+
+    def next_message(self, conversation) -> Optional[str]:
+        """
+        Siguiente mensaje del asistente armado localmente; actualiza la pregunta
+        actual en metadata. None si no quedan preguntas.
+        """
+        metadata = conversation.metadata
+        question_id = self.next_question_id(metadata)
+        message = self.render(question_id, metadata) if question_id else None
+        if not message:
+            return None
+
+        question = questionnaire_service.all_questions_base[question_id]
+        metadata["current_question_id"] = question_id
+        metadata["current_question_asked_summary"] = self.question_text(
+            question, metadata
+        )[:100]
+        metadata["is_complete"] = False
+        metadata["has_proposal"] = False
+
+        insight = insight_service.get_insight(metadata, question_id)
+        if insight:
+            message = f"{insight_service.format_insight(insight)}\n\n{message}"
+
+        # Primer turno: saludo antes de la primera pregunta
+        if not any(m.role == "assistant" for m in conversation.messages):
+            greeting = questionnaire_service.get_initial_greeting().strip()
+            message = f"{greeting}\n\n{message}"
+        logger.info(f"Pregunta {question_id} presentada localmente")
+        return message
+
+
+# Instancia global
+question_renderer = QuestionRenderer()
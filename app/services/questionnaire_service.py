@@ -1,6 +1,8 @@
 # app/services/questionnaire_service.py
 import logging
-from typing import Optional, List, Dict, Any
+import re
+import unicodedata
+from typing import Optional, List, Dict, Any, FrozenSet
 
 # Quitar: from app.models.conversation_state import ConversationState
 from app.services.questionnaire_data import QUESTIONNAIRE_STRUCTURE
@@ -9,6 +11,64 @@ from app.services.questionnaire_data import QUESTIONNAIRE_STRUCTURE
 
 logger = logging.getLogger("hydrous")
 
+# Los IDs de los cuestionarios por subsector siguen el patrón <PREFIJO>_<n>:
+# las primeras preguntas tienen el mismo significado en todos los subsectores.
+QUESTION_ROLES = {
+    "1": "location",
+    "2": "water_cost",
+    "3": "water_consumption",
+    "4": "wastewater_generation",
+    # ¿Tienes análisis del agua residual? (subida de documento)
+    "7": "lab_analysis",
+    "8": "water_quality",
+}
+# Sub-preguntas de calidad del agua (<PREFIJO>_8_<PARAM>)
+PARAMETER_SUFFIXES = ("BOD", "COD", "TSS", "TDS", "PH", "FOG")
+
+# Similitud mínima para asociar el texto de una pregunta formulada a un ID
+QUESTION_MATCH_THRESHOLD = 0.5
+
+_WORD_RE = re.compile(r"[a-z0-9³]+")
+_PARENTHESES_RE = re.compile(r"\([^)]*\)")
+# Abreviaturas usadas en los textos cortos de las preguntas ("Generación AR...")
+_ABBREVIATIONS = {"ar": "agua residual", "ptar": "planta tratamiento agua residual"}
+_ABBREVIATIONS_RE = re.compile(r"\b(?:ar|ptar)\b")
+_STOPWORDS = frozenset(
+    "a al de del el en la las lo los o para por que se su sus tu tus un una y es "
+    "cual cuales cuanto cuanta cuantos como tiene tienes ej etc aprox aproximado "
+    "aproximada aproximadamente".split()
+)
+
+
+def normalize_text(text: str) -> str:
+    """Minúsculas y sin acentos, para comparar textos de preguntas y respuestas."""
+    text = unicodedata.normalize("NFKD", text or "").lower()
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def _keywords(text: str) -> FrozenSet[str]:
+    """Raíces (5 primeras letras) de las palabras significativas: consumo/consume → consu."""
+    text = _ABBREVIATIONS_RE.sub(
+        lambda m: _ABBREVIATIONS[m.group(0)], normalize_text(text)
+    )
+    words = _WORD_RE.findall(text)
+    return frozenset(w[:5] for w in words if w not in _STOPWORDS and len(w) > 1)
+
+
+def _clean_for_client(value: Any) -> Any:
+    if isinstance(value, dict):
+        cleaned = {
+            key: _clean_for_client(item)
+            for key, item in value.items()
+            if not (key == "explanation" and item == "...")
+        }
+        if any(option is Ellipsis for option in value.get("options") or []):
+            cleaned["open_options"] = True
+        return cleaned
+    if isinstance(value, list):
+        return [_clean_for_client(item) for item in value if item is not Ellipsis]
+    return value
+
 
 class QuestionnaireService:
     """Servicio simplificado para acceder a la estructura del cuestionario."""
@@ -16,6 +76,12 @@ class QuestionnaireService:
     def __init__(self):
         self.structure = QUESTIONNAIRE_STRUCTURE
         self.all_questions_base: Dict[str, Dict[str, Any]] = self._flatten_questions()
+        # Índice de palabras clave por pregunta para asociar textos formulados a IDs
+        self.question_keywords: Dict[str, FrozenSet[str]] = {
+            # Los ejemplos entre paréntesis no forman parte de la pregunta
+            qid: _keywords(_PARENTHESES_RE.sub(" ", q.get("text", "")))
+            for qid, q in self.all_questions_base.items()
+        }
         logger.info(
             f"Servicio de Cuestionario (Simplificado) inicializado con {len(self.all_questions_base)} preguntas base."
         )
@@ -81,6 +147,90 @@ class QuestionnaireService:
 
         return copy.deepcopy(question_base)
 
+    def get_question_role(self, question_id: str) -> Optional[str]:
+        """
+        Devuelve el rol común de una pregunta (p.ej. "water_consumption" para IAB_3
+        o CHT_3, "param_BOD" para IAB_8_BOD) o None si no tiene uno conocido.
+        """
+        if not question_id or question_id.startswith("INIT_"):
+            return None
+        parts = question_id.split("_")
+        if len(parts) == 2:
+            return QUESTION_ROLES.get(parts[1])
+        if len(parts) >= 3 and parts[-1] in PARAMETER_SUFFIXES:
+            return f"param_{parts[-1]}"
+        return None
+
+    def get_question_label(self, question_id: str, max_chars: int = 70) -> str:
+        """Texto corto de una pregunta (sin signos ni ejemplos entre paréntesis)."""
+        question = self.all_questions_base.get(question_id) or {}
+        label = question.get("text", question_id).split("(")[0].strip(" ¿?:.")
+        return label[:max_chars]
+
+    def get_questionnaire_path(
+        self, sector: Optional[str], subsector: Optional[str]
+    ) -> List[str]:
+        """IDs de las preguntas iniciales más las del subsector (si ya se conoce)."""
+        path = [
+            q["id"] for q in self.structure.get("initial_questions", []) if "id" in q
+        ]
+        if sector and subsector:
+            sector_data = self.structure.get("sector_questionnaires", {}).get(
+                sector, {}
+            )
+            subsector_questions = sector_data.get(subsector)
+            if not isinstance(subsector_questions, list):
+                subsector_questions = sector_data.get("Otro", [])
+            path.extend(q["id"] for q in subsector_questions if "id" in q)
+        return path
+
+    def get_public_structure(self) -> Dict[str, Any]:
+        """
+        Estructura completa para el frontend (solo tipos JSON): las opciones
+        abreviadas con ... se quitan y la pregunta se marca con "open_options"
+        (admite respuesta libre); las explicaciones de relleno "..." se omiten.
+        """
+        return _clean_for_client(self.structure)
+
+    def match_question(
+        self,
+        asked_text: str,
+        candidate_ids: List[str],
+        previous_id: Optional[str] = None,
+        answered_ids=(),
+    ) -> Optional[str]:
+        """
+        Asocia el texto de una pregunta formulada por la IA a su ID dentro de
+        candidate_ids (normalmente la ruta del cuestionario). Se compara por palabras
+        clave; si ninguna pregunta alcanza el umbral se asume la siguiente sin
+        responder después de previous_id, ya que la IA sigue el orden del cuestionario.
+        """
+        if not candidate_ids:
+            return None
+        asked = _keywords(asked_text)
+        start = (
+            candidate_ids.index(previous_id) + 1 if previous_id in candidate_ids else 0
+        )
+
+        best_id, best_score = None, 0.0
+        for position, qid in enumerate(candidate_ids):
+            keywords = self.question_keywords.get(qid)
+            if not keywords or not asked:
+                continue
+            score = len(asked & keywords) / len(keywords)
+            # A igualdad de puntuación, preferir la primera después de la anterior
+            if position >= start:
+                score += 0.01
+            if score > best_score:
+                best_id, best_score = qid, score
+        if best_id and best_score >= QUESTION_MATCH_THRESHOLD:
+            return best_id
+
+        for qid in candidate_ids[start:]:
+            if qid not in answered_ids:
+                return qid
+        return None
+
     # --- ELIMINAR LAS SIGUIENTES FUNCIONES ---
     # def get_question(...) # La que resolvía condicionales
     # def _determine_questionnaire_path(...)
@@ -0,0 +1,110 @@
+# app/services/redis_backend.py
+"""
+Conexión compartida a Redis para el modo con varios workers/instancias
+(STORAGE_BACKEND="redis").
+
+Con el backend en memoria cada proceso tiene sus propias conversaciones, locks,
+contadores y PDFs de propuestas; con Redis los comparten todos los workers, así
+cualquiera puede atender cualquier conversación. La librería `redis` solo se
+importa en este modo.
+"""
+
+import asyncio
+import logging
+
+from app.config import settings
+
+logger = logging.getLogger("hydrous")
+
+# Prefijo común de las claves
+KEY_PREFIX = "hydrous"
+
+# Renueva / borra una clave tomada con SET NX solo si el token sigue siendo el
+# nuestro (locks y trabajos con caducidad)
+RENEW_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("PEXPIRE", KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+_client = None
+_raw_client = None
+
+
+def redis_enabled() -> bool:
+    return settings.STORAGE_BACKEND == "redis"
+
+
+def get_redis():
+    """Cliente redis.asyncio compartido (se crea en el primer uso)."""
+    global _client
+    if _client is None:
+        import redis.asyncio as redis
+
+        _client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+        logger.info(f"Backend Redis configurado: {settings.REDIS_URL}")
+    return _client
+
+
+def get_raw_redis():
+    """Cliente sin decodificar las respuestas, para valores binarios (msgpack)."""
+    global _raw_client
+    if _raw_client is None:
+        import redis.asyncio as redis
+
+        _raw_client = redis.from_url(settings.REDIS_URL)
+    return _raw_client
+
+
+def set_redis(client, raw_client=None):
+    """Reemplaza los clientes (p.ej. por fakeredis en pruebas)."""
+    global _client, _raw_client
+    _client, _raw_client = client, raw_client
+
+
+def key(*parts: str) -> str:
+    return ":".join((KEY_PREFIX,) + parts)
+
+
+async def renew_lease(
+    name: str, token: str, timeout: float, interval: float, stop: asyncio.Event
+):
+    """
+    Extiende cada `interval` segundos la caducidad (`timeout`) de la clave
+    `name` mientras siga siendo nuestra, hasta que se activa `stop`. Se detiene
+    con el evento y no cancelando la tarea: un comando cortado a medias deja la
+    conexión inservible.
+    """
+    redis = get_redis()
+    while True:
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+            return
+        except asyncio.TimeoutError:
+            pass
+        try:
+            renewed = await redis.eval(
+                RENEW_SCRIPT, 1, name, token, int(timeout * 1000)
+            )
+        except Exception as e:
+            logger.error(f"Error al renovar {name}: {e}")
+            continue
+        if not renewed:
+            logger.error(f"{name} perdido: otro worker pudo tomarlo")
+            return
+
+
+async def release_lease(name: str, token: str):
+    """Borra la clave `name` si sigue siendo nuestra; un error solo se registra."""
+    try:
+        await get_redis().eval(RELEASE_SCRIPT, 1, name, token)
+    except Exception as e:
+        # No ocultar la excepción del trabajo; la clave caduca sola
+        logger.error(f"Error al liberar {name}: {e}")
@@ -0,0 +1,199 @@
+# app/services/speculative_prefetch.py
+"""
+Prefetch especulativo del siguiente turno (SPECULATIVE_PREFETCH=true).
+
+Después de enviar una pregunta de opción múltiple, mientras el usuario lee, se
+calcula en segundo plano la respuesta del asistente para las opciones más
+elegidas (sobre una copia de la conversación). Si la respuesta del usuario
+coincide con una de ellas se sirve el resultado precalculado; el resto del
+trabajo especulativo se cancela. La especulación solo usa lugares libres del
+control de admisión: si no hay ninguno se omite, nunca hace esperar a un
+usuario real.
+"""
+
+import asyncio
+import copy
+import logging
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.models.conversation import Conversation
+from app.models.message import Message
+from app.services.admission_control import admission_controller
+from app.services.ai_service import ai_service, is_llm_error_response
+from app.services.answer_normalizer import answer_normalizer
+from app.services.conversation_digest import conversation_digest
+from app.services.questionnaire_service import questionnaire_service
+
+logger = logging.getLogger("hydrous")
+
+# Conversaciones con trabajo especulativo pendiente que se conservan como máximo
+MAX_TRACKED_CONVERSATIONS = 200
+
+
+class SpeculativePrefetch:
+    """Tareas especulativas por conversación y estadísticas de aciertos."""
+
+    def __init__(self):
+        # conversation_id -> {"question_id": str, "tasks": {opción: Task}}
+        self._pending: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Popularidad de cada opción por pregunta, para elegir qué precalcular
+        self._choices: Dict[str, Counter] = {}
+        self.stats = {
+            "scheduled": 0,
+            "hits": 0,
+            "misses": 0,
+            "cancelled": 0,
+            "skipped": 0,
+            "failed": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return settings.SPECULATIVE_PREFETCH
+
+    def _in_flight(self) -> int:
+        return sum(
+            1
+            for entry in self._pending.values()
+            for task in entry["tasks"].values()
+            if not task.done()
+        )
+
+    def _likely_options(self, question_id: str) -> List[str]:
+        """Opciones de la pregunta ordenadas por popularidad (y por su orden)."""
+        question = questionnaire_service.all_questions_base.get(question_id) or {}
+        if question.get("type") != "multiple_choice":
+            return []
+        options = [o for o in question.get("options") or [] if isinstance(o, str)]
+        counts = self._choices.get(question_id, Counter())
+        ranked = sorted(options, key=lambda o: (-counts[o], options.index(o)))
+        return ranked[: settings.SPECULATIVE_MAX_OPTIONS]
+
+    def record_choice(self, question_id: str, value: Any):
+        if isinstance(value, str):
+            self._choices.setdefault(question_id, Counter())[value] += 1
+
+    # --- Programación ---
+
+    def schedule(self, conversation):
+        """Lanza el cálculo especulativo para la pregunta actual de la conversación."""
+        # Con QUESTION_MODE=local una opción reconocida se responde con la
+        # pregunta armada localmente: take() no llega a usarse
+        if not self.enabled or settings.QUESTION_MODE == "local":
+            return
+        metadata = conversation.metadata
+        question_id = metadata.get("current_question_id")
+        path = questionnaire_service.get_questionnaire_path(
+            metadata.get("selected_sector"), metadata.get("selected_subsector")
+        )
+        # La respuesta a la última pregunta genera la propuesta, no otro turno
+        if not question_id or (path and path[-1] == question_id):
+            return
+
+        self.cancel(conversation.id)
+        tasks = {}
+        for option in self._likely_options(question_id):
+            if self._in_flight() + len(tasks) >= settings.SPECULATIVE_MAX_IN_FLIGHT:
+                break
+            task = asyncio.create_task(
+                self._speculate(conversation, question_id, option)
+            )
+            task.add_done_callback(self._discard_failure)
+            tasks[option] = task
+        if not tasks:
+            return
+        self._pending[conversation.id] = {"question_id": question_id, "tasks": tasks}
+        self.stats["scheduled"] += len(tasks)
+        while len(self._pending) > MAX_TRACKED_CONVERSATIONS:
+            oldest_id = next(iter(self._pending))
+            self.cancel(oldest_id)
+        logger.info(
+            f"Prefetch especulativo para {question_id}: {list(tasks)} ({conversation.id})"
+        )
+
+    async def _speculate(self, conversation, question_id: str, option: str):
+        """
+        Genera el siguiente turno sobre una copia, como si se eligiera option.
+        Devuelve None si no había un lugar libre para llamar al LLM.
+        """
+        async with admission_controller.try_slot() as admitted:
+            if not admitted:
+                self.stats["skipped"] += 1
+                return None
+            # Copia en segundo plano, antes del primer await: los mensajes no se
+            # modifican (basta otra lista), la metadata sí
+            speculative = Conversation(
+                id=conversation.id,
+                ts=conversation.ts,
+                messages=[*conversation.messages, Message.user(option)],
+                metadata=copy.deepcopy(conversation.metadata),
+            )
+            value = answer_normalizer.record_answer(
+                speculative.metadata, question_id, option
+            )
+            conversation_digest.update(speculative.metadata, question_id, value)
+            before = copy.deepcopy(speculative.metadata)
+            response = await ai_service.handle_conversation(speculative)
+        # Solo se aplican después los cambios hechos al generar el turno
+        updates = {
+            key: value
+            for key, value in speculative.metadata.items()
+            if before.get(key, object()) != value
+        }
+        return response, updates
+
+    def _discard_failure(self, task: "asyncio.Task"):
+        """Registra y descarta el error de una tarea especulativa."""
+        if task.cancelled() or task.exception() is None:
+            return
+        self.stats["failed"] += 1
+        logger.warning(f"Prefetch especulativo fallido: {task.exception()}")
+
+    # --- Consumo ---
+
+    def cancel(self, conversation_id: str):
+        entry = self._pending.pop(conversation_id, None)
+        if not entry:
+            return
+        for task in entry["tasks"].values():
+            if not task.done():
+                task.cancel()
+                self.stats["cancelled"] += 1
+
+    async def take(
+        self, conversation, question_id: Optional[str], value: Any
+    ) -> Optional[str]:
+        """
+        Respuesta precalculada si la respuesta del usuario (valor normalizado)
+        coincide con una opción especulada; aplica sus cambios a metadata. El
+        resto del trabajo especulativo de la conversación se cancela.
+        """
+        entry = self._pending.get(conversation.id)
+        if not entry:
+            return None
+        task = None
+        if entry["question_id"] == question_id and isinstance(value, str):
+            task = entry["tasks"].pop(value, None)
+        self.cancel(conversation.id)
+        if task is None:
+            self.stats["misses"] += 1
+            return None
+
+        try:
+            response, updates = await task or (None, {})
+        except Exception:
+            # Ya registrado por _discard_failure
+            response, updates = None, {}
+        if not response or is_llm_error_response(response):
+            self.stats["misses"] += 1
+            return None
+        conversation.metadata.update(updates)
+        self.stats["hits"] += 1
+        logger.info(f"Prefetch especulativo servido para {question_id} ({value})")
+        return response
+
+
+# Instancia global
+speculative_prefetch = SpeculativePrefetch()
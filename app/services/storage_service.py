@@ -1,5 +1,6 @@
 # app/services/storage_service.py
 import logging
+from collections.abc import MutableMapping
 from datetime import datetime, timedelta
 
 # --- AÑADIR ESTAS IMPORTACIONES ---
@@ -11,12 +12,15 @@ from typing import (
 
 # -----------------------------------
 
-from app.models.conversation import Conversation
+from app.models.conversation import Conversation, ConversationMetadata
 from app.models.message import Message
 
 # Quitar import de ConversationState si ya no se usa
 # from app.models.conversation_state import ConversationState
 from app.config import settings
+from app.services.document_service import document_service
+from app.services.redis_backend import get_raw_redis, key, redis_enabled
+from app.utils import serialization
 
 logger = logging.getLogger("hydrous")
 
@@ -24,27 +28,24 @@ logger = logging.getLogger("hydrous")
 conversations_db: Dict[str, Conversation] = {}
 
 
+def conversation_expires_at(conversation: Conversation) -> int:
+    """Instante (epoch, s) en que caduca la conversación."""
+    return conversation.ts // 1000 + settings.CONVERSATION_TIMEOUT
+
+
+def initial_metadata() -> ConversationMetadata:
+    """Metadata de una conversación nueva."""
+    return ConversationMetadata()
+
+
 class StorageService:
 
     async def create_conversation(self) -> Conversation:
         """Crea y almacena una nueva conversación con metadata inicial."""
-        initial_metadata: Dict[str, Any] = {  # Usar Dict aquí también
-            "current_question_id": None,
-            "collected_data": {},
-            "selected_sector": None,
-            "selected_subsector": None,
-            "questionnaire_path": [],
-            "is_complete": False,
-            "has_proposal": False,
-            "proposal_text": None,
-            "pdf_path": None,
-            "client_name": "Cliente",
-            "last_error": None,
-        }
-        new_conversation = Conversation(metadata=initial_metadata)
+        new_conversation = Conversation(metadata=initial_metadata())
         conversations_db[new_conversation.id] = new_conversation
         logger.info(
-            f"DBG_SS: Conversación {new_conversation.id} CREADA. Metadata inicial: {initial_metadata}"
+            f"DBG_SS: Conversación {new_conversation.id} CREADA. Metadata inicial: {new_conversation.metadata}"
         )
         return new_conversation
 
@@ -52,24 +53,12 @@ class StorageService:
         """Obtiene una conversación por su ID (EN MEMORIA)."""
         conversation = conversations_db.get(conversation_id)
         if conversation:
-            if not isinstance(conversation.metadata, dict):
+            if not isinstance(conversation.metadata, MutableMapping):
                 logger.warning(
                     f"Metadata inválida para {conversation_id}, reiniciando a default."
                 )
                 # Recrear metadata inicial si está corrupta
-                conversation.metadata = {
-                    "current_question_id": None,
-                    "collected_data": {},
-                    "selected_sector": None,
-                    "selected_subsector": None,
-                    "questionnaire_path": [],
-                    "is_complete": False,
-                    "has_proposal": False,
-                    "proposal_text": None,
-                    "pdf_path": None,
-                    "client_name": "Cliente",
-                    "last_error": None,
-                }
+                conversation.metadata = initial_metadata()
             logger.info(
                 f"DBG_SS: Conversación {conversation_id} RECUPERADA. Metadata actual: {conversation.metadata}"
             )
@@ -109,7 +98,7 @@ class StorageService:
             )
             return False
         # Verificar metadata y messages antes de guardar
-        if not isinstance(conversation.metadata, dict):
+        if not isinstance(conversation.metadata, MutableMapping):
             logger.error(
                 f"DBG_SS: Intento de guardar metadata inválida para {conversation.id}: {type(conversation.metadata)}"
             )
@@ -150,7 +139,108 @@ class StorageService:
             logger.info(
                 f"Limpieza completada. {removed_count} conversaciones antiguas eliminadas."
             )
+        await document_service.cleanup_expired()
+
+
+class RedisStorageService:
+    """
+    Misma interfaz que StorageService, con las conversaciones en Redis para que
+    varios workers/instancias atiendan la misma conversación:
+    hash hydrous:conv:<id> (ts en milisegundos, metadata en msgpack) y lista
+    hydrous:conv:<id>:messages (un mensaje msgpack por elemento). Las claves expiran
+    CONVERSATION_TIMEOUT segundos después de crearse la conversación.
+    """
+
+    @staticmethod
+    def _keys(conversation_id: str):
+        return key("conv", conversation_id), key("conv", conversation_id, "messages")
+
+    async def create_conversation(self) -> Conversation:
+        conversation = Conversation(metadata=initial_metadata())
+        await self.save_conversation(conversation)
+        logger.info(f"DBG_SS: Conversación {conversation.id} CREADA (Redis).")
+        return conversation
+
+    async def get_conversation(self, conversation_id: str) -> Optional[Conversation]:
+        conv_key, messages_key = self._keys(conversation_id)
+        async with get_raw_redis().pipeline(transaction=False) as pipe:
+            pipe.hgetall(conv_key)
+            pipe.lrange(messages_key, 0, -1)
+            data, raw_messages = await pipe.execute()
+        if not data:
+            logger.warning(f"DBG_SS: Conversación {conversation_id} NO encontrada.")
+            return None
+        try:
+            metadata = serialization.unpack_metadata(data[b"metadata"])
+        except (KeyError, ValueError, TypeError):
+            metadata = None
+        if not isinstance(metadata, dict):
+            logger.warning(
+                f"Metadata inválida para {conversation_id}, reiniciando a default."
+            )
+            metadata = initial_metadata()
+        return Conversation(
+            id=conversation_id,
+            ts=int(data[b"ts"]),
+            metadata=metadata,
+            messages=[serialization.unpack_message(m) for m in raw_messages],
+        )
+
+    async def add_message_to_conversation(
+        self, conversation_id: str, message: Message
+    ) -> bool:
+        conv_key, messages_key = self._keys(conversation_id)
+        redis = get_raw_redis()
+        if not await redis.exists(conv_key):
+            logger.error(
+                f"DBG_SS: Error al añadir mensaje, conversación {conversation_id} no encontrada."
+            )
+            return False
+        await redis.rpush(messages_key, serialization.pack_message(message))
+        return True
+
+    async def save_conversation(self, conversation: Conversation) -> bool:
+        """
+        Guarda la metadata y añade los mensajes que aún no están en Redis. Si se
+        deshizo el último mensaje (503 sin lugar para el LLM) se recorta la lista.
+        """
+        if not isinstance(conversation, Conversation) or not isinstance(
+            conversation.metadata, MutableMapping
+        ):
+            logger.error("DBG_SS: Intento de guardar objeto inválido en Redis")
+            return False
+        conv_key, messages_key = self._keys(conversation.id)
+        redis = get_raw_redis()
+        stored = await redis.llen(messages_key)
+        expires_at = conversation_expires_at(conversation)
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hset(
+                conv_key,
+                mapping={
+                    "ts": conversation.ts,
+                    "metadata": serialization.pack_metadata(conversation.metadata),
+                },
+            )
+            new_messages = conversation.messages[stored:]
+            if stored > len(conversation.messages):
+                if conversation.messages:
+                    pipe.ltrim(messages_key, 0, len(conversation.messages) - 1)
+                else:
+                    pipe.delete(messages_key)
+            elif new_messages:
+                pipe.rpush(
+                    messages_key, *(serialization.pack_message(m) for m in new_messages)
+                )
+            # Misma caducidad que la limpieza del backend en memoria
+            pipe.expireat(conv_key, expires_at)
+            pipe.expireat(messages_key, expires_at)
+            await pipe.execute()
+        return True
+
+    async def cleanup_old_conversations(self):
+        """Las claves caducan solas en Redis; solo quedan los archivos sin uso."""
+        await document_service.cleanup_expired()
 
 
 # Instancia global
-storage_service = StorageService()
+storage_service = RedisStorageService() if redis_enabled() else StorageService()
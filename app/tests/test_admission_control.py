@@ -0,0 +1,115 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import patch
+
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.config import settings
+from app.services import ai_service as ai_service_module
+from app.services.admission_control import AdmissionController, RateLimiter
+
+
+def _request(peer: str, forwarded: str = None) -> Request:
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 1234)})
+
+
+class TestAdmissionControl(unittest.IsolatedAsyncioTestCase):
+    """Pruebas para el control de admisión y el límite por IP"""
+
+    async def _request(self, controller, seconds=0.05):
+        async with controller.slot():
+            await asyncio.sleep(seconds)
+        return "ok"
+
+    async def test_excess_requests_are_shed_fast(self):
+        controller = AdmissionController(max_in_flight=2, max_queue=1, queue_timeout=1)
+        started = time.monotonic()
+        results = await asyncio.gather(
+            *(self._request(controller) for _ in range(5)), return_exceptions=True
+        )
+        rejected = [r for r in results if isinstance(r, HTTPException)]
+        # 2 en curso + 1 en cola admitidas; las demás rechazadas sin esperar
+        self.assertEqual(results.count("ok"), 3)
+        self.assertEqual(len(rejected), 2)
+        self.assertEqual(rejected[0].status_code, 503)
+        self.assertIn("Retry-After", rejected[0].headers)
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    async def test_queue_deadline(self):
+        controller = AdmissionController(
+            max_in_flight=1, max_queue=5, queue_timeout=0.01
+        )
+        results = await asyncio.gather(
+            self._request(controller, 0.1),
+            self._request(controller),
+            return_exceptions=True,
+        )
+        self.assertEqual(results[0], "ok")
+        self.assertEqual(results[1].status_code, 503)
+        self.assertEqual(controller.snapshot()["waiting"], 0)
+
+    async def test_try_slot_never_waits(self):
+        controller = AdmissionController(max_in_flight=1, max_queue=5, queue_timeout=1)
+        async with controller.try_slot() as admitted:
+            self.assertTrue(admitted)
+            # Las llamadas al LLM dentro del bloque usan el mismo lugar
+            async with controller.slot():
+                self.assertEqual(controller.snapshot()["in_flight"], 1)
+
+            async def other():
+                async with controller.try_slot() as other_admitted:
+                    return other_admitted
+
+            self.assertFalse(await asyncio.create_task(other()))
+        self.assertEqual(
+            controller.snapshot(), {"in_flight": 0, "waiting": 0, "rejected": 0}
+        )
+
+    def test_token_bucket(self):
+        limiter = RateLimiter(rate_per_minute=60, burst=3)
+        allowed = [limiter.allow("10.0.0.1")[0] for _ in range(4)]
+        self.assertEqual(allowed, [True, True, True, False])
+        # Cada IP tiene su propio bucket
+        self.assertTrue(limiter.allow("10.0.0.2")[0])
+
+    def test_forwarded_for_only_from_trusted_proxy(self):
+        with patch.object(settings, "TRUSTED_PROXIES", ["10.0.0.1"]):
+            # Cliente directo: la cabecera se ignora
+            self.assertEqual(
+                RateLimiter.client_ip(_request("203.0.113.7", "1.2.3.4")),
+                "203.0.113.7",
+            )
+            # Desde el proxy: la última IP añadida que no es de un proxy
+            self.assertEqual(
+                RateLimiter.client_ip(
+                    _request("10.0.0.1", "1.2.3.4, 198.51.100.9, 10.0.0.1")
+                ),
+                "198.51.100.9",
+            )
+            self.assertEqual(RateLimiter.client_ip(_request("10.0.0.1")), "10.0.0.1")
+
+    async def test_slot_taken_per_llm_call(self):
+        controller = AdmissionController(max_in_flight=1, max_queue=0, queue_timeout=1)
+        service = ai_service_module.ai_service
+        with patch.object(ai_service_module, "admission_controller", controller):
+            async with controller.slot():
+                with self.assertRaises(HTTPException) as ctx:
+                    await service._call_llm_api([{"role": "user", "content": "Hola"}])
+            self.assertEqual(ctx.exception.status_code, 503)
+            # Con lugar libre la llamada ocupa uno mientras dura
+            with patch.object(service, "_post_llm_api") as post:
+
+                async def fake_post(*args):
+                    self.assertEqual(controller.snapshot()["in_flight"], 1)
+                    return "ok"
+
+                post.side_effect = fake_post
+                self.assertEqual(await service._call_llm_api([]), "ok")
+            self.assertEqual(controller.snapshot()["in_flight"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,192 @@
+import asyncio
+import socket
+import unittest
+from unittest.mock import patch
+
+from app.utils import alerts
+from app.utils.alerts import (
+    NotificationDispatcher,
+    NotificationTransport,
+    SmtpTransport,
+    send_completion_notification,
+    send_error_alert,
+)
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:  # Dependencia solo de pruebas
+    Controller = None
+
+
+class _Sink:
+    """Servidor SMTP de pruebas: guarda los mensajes y las sesiones."""
+
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        self.messages.append(envelope.content.decode("utf-8", "replace"))
+        return "250 OK"
+
+
+class _FailingTransport(NotificationTransport):
+    async def send(self, messages):
+        raise ConnectionError("sin red")
+
+
+class _RecordingTransport(NotificationTransport):
+    def __init__(self):
+        self.subjects = []
+
+    async def send(self, messages):
+        self.subjects.extend(msg["Subject"] for msg in messages)
+        return len(messages)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@unittest.skipUnless(Controller, "aiosmtpd no instalado")
+class TestSmtpNotifications(unittest.IsolatedAsyncioTestCase):
+    """Pruebas del envío de correos contra un servidor SMTP local"""
+
+    def setUp(self):
+        self.sink = _Sink()
+        self.controller = Controller(self.sink, hostname="127.0.0.1", port=_free_port())
+        self.controller.start()
+        self.transport = SmtpTransport(
+            "127.0.0.1", self.controller.port, starttls=False
+        )
+        self.patches = [
+            patch.object(alerts, "SMTP_USER", "bot@hydrous.test"),
+            patch.object(alerts, "ALERT_RECIPIENTS", ["ops@hydrous.test"]),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.controller.stop()
+
+    async def test_batch_over_one_connection(self):
+        dispatcher = NotificationDispatcher(self.transport, batch_size=10)
+        self.assertTrue(
+            send_error_alert("LLM", "Timeout", {"intentos": 3}, dispatcher=dispatcher)
+        )
+        # Repetida: se agrupa en lugar de enviarse
+        self.assertFalse(send_error_alert("LLM", "Timeout", dispatcher=dispatcher))
+        self.assertTrue(
+            send_completion_notification(
+                {"name": "Textiles SA", "sector": "Industrial"},
+                "prop-1",
+                dispatcher=dispatcher,
+            )
+        )
+        await dispatcher.stop()
+
+        self.assertEqual(len(self.sink.messages), 2)
+        self.assertIn("[ALERTA] Error en Chatbot Hydrous: LLM", self.sink.messages[0])
+        self.assertIn("Nueva propuesta generada: prop-1", self.sink.messages[1])
+        self.assertEqual(self.transport.connections, 1)
+        self.assertEqual(len(self.sink.sessions), 1)
+        self.assertEqual(dispatcher.snapshot()["sent"], 2)
+        self.assertEqual(dispatcher.snapshot()["throttled"], 1)
+
+    async def test_reconnects_after_close(self):
+        dispatcher = NotificationDispatcher(self.transport)
+        send_completion_notification({}, "prop-1", dispatcher=dispatcher)
+        await dispatcher.stop()
+        send_completion_notification({}, "prop-2", dispatcher=dispatcher)
+        await dispatcher.stop()
+        self.assertEqual(len(self.sink.messages), 2)
+        self.assertEqual(self.transport.connections, 2)
+
+
+class TestNotificationDispatcher(unittest.IsolatedAsyncioTestCase):
+    """Pruebas de la cola de notificaciones"""
+
+    def test_transport_requires_send(self):
+        with self.assertRaises(TypeError):
+            NotificationTransport()
+
+    async def test_throttle_reports_omitted(self):
+        dispatcher = NotificationDispatcher(_FailingTransport(), throttle_seconds=0.05)
+        self.assertEqual(dispatcher.throttle("LLM:Timeout"), 0)
+        dispatcher.record("LLM:Timeout")
+        self.assertIsNone(dispatcher.throttle("LLM:Timeout"))
+        self.assertIsNone(dispatcher.throttle("LLM:Timeout"))
+        dispatcher._throttle["LLM:Timeout"][0] -= 1
+        self.assertEqual(dispatcher.throttle("LLM:Timeout"), 2)
+
+    async def test_bounded_queue_and_failures(self):
+        dispatcher = NotificationDispatcher(_FailingTransport(), max_queue=1)
+        self.assertTrue(send_completion_notification({}, "p1", dispatcher=dispatcher))
+        self.assertFalse(send_completion_notification({}, "p2", dispatcher=dispatcher))
+        await dispatcher.stop()
+        self.assertEqual(
+            dispatcher.snapshot(),
+            {"queued": 0, "sent": 0, "failed": 1, "dropped": 1, "throttled": 0},
+        )
+
+    async def test_dropped_alert_is_not_throttled(self):
+        dispatcher = NotificationDispatcher(_FailingTransport(), max_queue=1)
+        self.assertTrue(send_completion_notification({}, "p1", dispatcher=dispatcher))
+        # Cola llena: la alerta se descarta y no silencia la siguiente
+        self.assertFalse(send_error_alert("LLM", "Timeout", dispatcher=dispatcher))
+        self.assertNotIn("LLM:Timeout", dispatcher._throttle)
+        self.assertEqual(dispatcher.throttle("LLM:Timeout"), 0)
+        await dispatcher.stop()
+        self.assertTrue(send_error_alert("LLM", "Timeout", dispatcher=dispatcher))
+        self.assertFalse(send_error_alert("LLM", "Timeout", dispatcher=dispatcher))
+        await dispatcher.stop()
+        self.assertEqual(dispatcher.snapshot()["dropped"], 1)
+        self.assertEqual(dispatcher.snapshot()["throttled"], 1)
+
+
+class TestDispatcherOutsideLoop(unittest.TestCase):
+    """Las alertas pueden encolarse sin event loop en marcha"""
+
+    def test_queued_until_started(self):
+        transport = _RecordingTransport()
+        dispatcher = NotificationDispatcher(transport, max_queue=2)
+        self.assertTrue(send_error_alert("Worker", "Fallo", dispatcher=dispatcher))
+        self.assertTrue(send_completion_notification({}, "p1", dispatcher=dispatcher))
+        self.assertFalse(send_completion_notification({}, "p2", dispatcher=dispatcher))
+        self.assertEqual(dispatcher.snapshot()["queued"], 2)
+
+        async def run():
+            await dispatcher.start()
+            await dispatcher.stop()
+
+        asyncio.run(run())
+        self.assertEqual(len(transport.subjects), 2)
+        self.assertIn("Worker", transport.subjects[0])
+        self.assertEqual(
+            dispatcher.snapshot(),
+            {"queued": 0, "sent": 2, "failed": 0, "dropped": 1, "throttled": 0},
+        )
+
+
+class TestDispatcherFromThread(unittest.IsolatedAsyncioTestCase):
+    async def test_enqueue_from_worker_thread(self):
+        transport = _RecordingTransport()
+        dispatcher = NotificationDispatcher(transport)
+        await dispatcher.start()
+        queued = await asyncio.to_thread(
+            send_error_alert, "Worker", "Fallo", dispatcher=dispatcher
+        )
+        self.assertTrue(queued)
+        await asyncio.sleep(0)
+        await dispatcher.stop()
+        self.assertEqual(len(transport.subjects), 1)
+        self.assertEqual(dispatcher.snapshot()["sent"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+
+from app.services.answer_normalizer import answer_normalizer
+from app.services.questionnaire_service import questionnaire_service
+
+
+class TestAnswerNormalizer(unittest.TestCase):
+    """Pruebas para la normalización de respuestas a datos tipados"""
+
+    def test_match_asked_question(self):
+        """El texto formulado por la IA se asocia al ID de la ruta"""
+        path = questionnaire_service.get_questionnaire_path("Industrial", "Textil")
+        self.assertEqual(
+            questionnaire_service.match_question(
+                "¿Cuánta agua residual generas aproximadamente?", path, "ITX_3"
+            ),
+            "ITX_4",
+        )
+        # Sin coincidencia suficiente se asume la siguiente pregunta
+        self.assertEqual(
+            questionnaire_service.match_question("¿Algo más?", path, "ITX_4"), "ITX_5"
+        )
+
+    def test_record_answers(self):
+        metadata = {"collected_data": {}}
+        answers = {
+            "INIT_0": "Textiles del Norte",
+            "INIT_1": "1",
+            "INIT_2": "textil",
+            "ITX_3": "9,000 m³ al mes",
+            "ITX_5": "2",
+            "ITX_8": "DQO 2000 mg/L, pH 9-11",
+            "ITX_9": "2 y 3",
+            "ITX_11": "Sí",
+            "ITX_10": "pozo propio",
+        }
+        for question_id, answer in answers.items():
+            answer_normalizer.record_answer(metadata, question_id, answer)
+
+        self.assertEqual(metadata["client_name"], "Textiles del Norte")
+        self.assertEqual(metadata["selected_sector"], "Industrial")
+        self.assertEqual(metadata["selected_subsector"], "Textil")
+
+        collected = metadata["collected_data"]
+        self.assertAlmostEqual(collected["ITX_3"], 300.0)
+        self.assertEqual(collected["ITX_5"], "20-49")
+        self.assertEqual(collected["ITX_8"], {"COD": 2000.0, "PH": 11.0})
+        self.assertEqual(
+            collected["ITX_9"], ["Teñido e impresión", "Enjuague y acabado"]
+        )
+        self.assertIs(collected["ITX_11"], True)
+        # Texto sin opción reconocible se conserva tal cual
+        self.assertEqual(collected["ITX_10"], "pozo propio")
+        self.assertEqual(
+            metadata["response_summaries"]["ITX_3"]["answer"], "9,000 m³ al mes"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
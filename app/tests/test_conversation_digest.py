@@ -0,0 +1,77 @@
+import unittest
+
+from app.models.conversation import Conversation
+from app.services import conversation_digest as digest_module
+from app.services.answer_normalizer import answer_normalizer
+from app.services.conversation_digest import conversation_digest
+from app.services.direct_proposal_generator import direct_proposal_generator
+
+
+class TestConversationDigest(unittest.TestCase):
+    """Pruebas para el resumen incremental de la conversación"""
+
+    def _record(self, metadata, answers):
+        for question_id, answer in answers.items():
+            value = answer_normalizer.record_answer(metadata, question_id, answer)
+            conversation_digest.update(metadata, question_id, value)
+
+    def test_digest_lines(self):
+        metadata = {"collected_data": {}}
+        self._record(
+            metadata,
+            {
+                "INIT_0": "Textiles del Norte",
+                "INIT_1": "Industrial",
+                "INIT_2": "Textil",
+                "ITX_3": "9,000 m³ al mes",
+                "ITX_11": "no",
+            },
+        )
+        # Una nueva respuesta a la misma pregunta reemplaza la línea
+        self._record(metadata, {"ITX_11": "sí"})
+
+        digest = conversation_digest.render(metadata)
+        self.assertEqual(
+            digest.split("\n"),
+            [
+                "- Cliente: Textiles del Norte",
+                "- Sector: Industrial / Textil",
+                "- Consumo aproximado de agua: 300 m³/día",
+                "- Necesitas también tratamiento para agua potable/purificada: Sí",
+            ],
+        )
+
+    def test_digest_is_bounded(self):
+        """Con muchas respuestas largas se omiten las más antiguas"""
+        metadata = {"collected_data": {}}
+        long_answer = "texto de relleno " * 50
+        self._record(metadata, {f"ITX_{n}": long_answer for n in range(1, 27)})
+        digest = conversation_digest.render(metadata)
+        self.assertLessEqual(len(digest), digest_module.DIGEST_MAX_CHARS)
+        self.assertIn("respuestas anteriores omitidas", digest)
+
+    def test_proposal_context_keeps_every_answer(self):
+        """La propuesta usa el resumen completo: no se pierden respuestas antiguas"""
+        metadata = {"collected_data": {}}
+        self._record(metadata, {"ITX_3": "300 m³/día"})
+        self._record(
+            metadata, {f"ITX_{n}": "texto de relleno " * 50 for n in range(5, 27)}
+        )
+        full = conversation_digest.render(metadata, max_chars=None)
+        self.assertIn("- Consumo aproximado de agua: 300 m³/día", full)
+        self.assertNotIn("omitidas", full)
+
+        conversation = Conversation(id="conv-1", metadata=metadata)
+        context = direct_proposal_generator._conversation_context(conversation)
+        self.assertIn("- Consumo aproximado de agua: 300 m³/día", context)
+
+    def test_rebuild_from_collected_data(self):
+        metadata = {"collected_data": {"ITX_4": 250.0}}
+        self.assertIn(
+            "- Generación aproximada de agua residual: 250 m³/día",
+            conversation_digest.render(metadata),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
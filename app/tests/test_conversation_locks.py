@@ -0,0 +1,117 @@
+import asyncio
+import copy
+import unittest
+from unittest.mock import patch
+
+from fastapi import BackgroundTasks, HTTPException
+
+from app.models.message import MessageCreate
+from app.routes import chat
+from app.services.ai_service import ai_service
+from app.services.conversation_locks import ConversationLockManager, IdempotencyCache
+from app.services.speculative_prefetch import speculative_prefetch
+from app.services.storage_service import storage_service
+
+
+class TestConversationLocks(unittest.IsolatedAsyncioTestCase):
+    """Pruebas para la serialización por conversación y la idempotencia"""
+
+    async def asyncSetUp(self):
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+
+    async def _respond(self, conversation):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        self.calls.append(conversation.messages[-1].content)
+        return f"Respuesta {len(self.calls)}"
+
+    async def _send(self, conversation_id, message, key=None):
+        data = MessageCreate(
+            conversation_id=conversation_id, message=message, idempotency_key=key
+        )
+        return await chat.send_message(data, BackgroundTasks())
+
+    async def test_messages_are_serialized(self):
+        conversation = await storage_service.create_conversation()
+        with patch.object(ai_service, "handle_conversation", self._respond):
+            await asyncio.gather(
+                self._send(conversation.id, "hola"),
+                self._send(conversation.id, "otra vez"),
+            )
+        self.assertEqual(self.max_active, 1)
+        self.assertEqual(len(conversation.messages), 4)
+
+    async def test_retry_returns_cached_response(self):
+        conversation = await storage_service.create_conversation()
+        with patch.object(ai_service, "handle_conversation", self._respond):
+            first, retry = await asyncio.gather(
+                self._send(conversation.id, "hola", key="k1"),
+                self._send(conversation.id, "hola", key="k1"),
+            )
+        self.assertEqual(first, retry)
+        self.assertEqual(self.calls, ["hola"])
+
+    async def test_failed_response_is_not_cached(self):
+        conversation = await storage_service.create_conversation()
+
+        async def _fail(conversation):
+            self.calls.append(conversation.messages[-1].content)
+            return "Lo siento, el servicio no está disponible."
+
+        with patch.object(ai_service, "handle_conversation", _fail):
+            await self._send(conversation.id, "hola", key="k1")
+        with patch.object(ai_service, "handle_conversation", self._respond):
+            retry = await self._send(conversation.id, "hola", key="k1")
+        # El reintento vuelve a llamar al LLM en lugar de repetir el fallo
+        self.assertEqual(self.calls, ["hola", "hola"])
+        self.assertEqual(retry["message"], "Respuesta 2")
+
+    async def test_rejected_turn_is_rolled_back(self):
+        """Un 503 (sin lugar para el LLM) deshace el turno completo"""
+        conversation = await storage_service.create_conversation()
+        conversation.metadata["current_question_id"] = "INIT_1"
+        before = copy.deepcopy(dict(conversation.metadata))
+        choices = speculative_prefetch._choices.get("INIT_1", {}).get("Industrial", 0)
+
+        async def _busy(conversation):
+            raise HTTPException(status_code=503, detail="Servicio saturado")
+
+        with patch.object(ai_service, "handle_conversation", _busy):
+            with self.assertRaises(HTTPException):
+                await self._send(conversation.id, "Industrial")
+        stored = await storage_service.get_conversation(conversation.id)
+        self.assertEqual(stored.messages, [])
+        self.assertEqual(dict(stored.metadata), before)
+        self.assertEqual(
+            speculative_prefetch._choices.get("INIT_1", {}).get("Industrial", 0),
+            choices,
+        )
+
+        # El reintento registra la respuesta y la elección una sola vez
+        with patch.object(ai_service, "handle_conversation", self._respond):
+            await self._send(conversation.id, "Industrial")
+        stored = await storage_service.get_conversation(conversation.id)
+        self.assertEqual(stored.metadata["selected_sector"], "Industrial")
+        self.assertEqual(
+            speculative_prefetch._choices["INIT_1"]["Industrial"], choices + 1
+        )
+
+    async def test_bounded_memory(self):
+        locks = ConversationLockManager()
+        async with locks.lock("a"):
+            self.assertEqual(len(locks), 1)
+        self.assertEqual(len(locks), 0)
+
+        cache = IdempotencyCache(max_entries=2)
+        for key in ("k1", "k2", "k3"):
+            await cache.put("c", key, {"id": key})
+        self.assertIsNone(await cache.get("c", "k1"))
+        self.assertEqual(await cache.get("c", "k3"), {"id": "k3"})
+
+
+if __name__ == "__main__":
+    unittest.main()
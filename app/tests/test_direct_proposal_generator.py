@@ -0,0 +1,151 @@
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from app.config import settings
+from app.prompts.proposal_sections import (
+    CONTINUATION_PROMPT,
+    NOT_AVAILABLE,
+    PROPOSAL_FOOTER,
+    PROPOSAL_HEADER,
+    PROPOSAL_SECTIONS,
+)
+from app.services.ai_service import ai_service
+from app.services.direct_proposal_generator import DirectProposalGenerator
+
+AI_SECTIONS = [s for s in PROPOSAL_SECTIONS if not s.get("static")]
+
+
+def _section_for(messages) -> dict:
+    """Sección que pide el prompt de una llamada al LLM"""
+    prompt = messages[0]["content"]
+    for section in AI_SECTIONS:
+        if f'la sección "{section["title"].strip("*")}"' in prompt:
+            return section
+    raise AssertionError("Prompt sin sección reconocible")
+
+
+class TestProposalBySections(unittest.IsolatedAsyncioTestCase):
+    """Pruebas de la generación de la propuesta por secciones en paralelo"""
+
+    async def asyncSetUp(self):
+        self.generator = DirectProposalGenerator()
+        self.active = 0
+        self.max_active = 0
+        self.completed = []
+        self.failing = set()
+
+    async def _call_llm_api(self, messages, **kwargs):
+        section = _section_for(messages)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            # Las primeras secciones tardan más: terminan en orden inverso
+            index = AI_SECTIONS.index(section)
+            await asyncio.sleep(0.002 * (len(AI_SECTIONS) - index))
+            if section["id"] in self.failing:
+                raise ConnectionError("sin red")
+            self.completed.append(section["id"])
+            return f"{section['title']}\nTexto de {section['id']}"
+        finally:
+            self.active -= 1
+
+    async def _generate(self):
+        with patch.object(ai_service, "_call_llm_api", self._call_llm_api):
+            return await self.generator._generate_proposal_by_sections("Cliente: Hotel")
+
+    @patch.object(settings, "PROPOSAL_SECTION_CONCURRENCY", 3)
+    async def test_concurrency_limit(self):
+        await self._generate()
+        self.assertEqual(self.max_active, 3)
+        self.assertEqual(len(self.completed), len(AI_SECTIONS))
+
+    @patch.object(settings, "PROPOSAL_SECTION_CONCURRENCY", 10)
+    async def test_sections_assembled_in_template_order(self):
+        text = await self._generate()
+        # Terminaron en otro orden, pero se ensamblan en el de la plantilla
+        self.assertNotEqual(self.completed, [s["id"] for s in AI_SECTIONS])
+        positions = [text.index(section["title"]) for section in PROPOSAL_SECTIONS]
+        self.assertEqual(positions, sorted(positions))
+        self.assertTrue(text.startswith(PROPOSAL_HEADER))
+        self.assertTrue(text.endswith(PROPOSAL_FOOTER))
+
+    @patch.object(settings, "PROPOSAL_SECTION_CONCURRENCY", 2)
+    async def test_failed_section_falls_back(self):
+        self.failing = {"process"}
+        text = await self._generate()
+        process = next(s for s in PROPOSAL_SECTIONS if s["id"] == "process")
+        self.assertIn(f"{process['title']}\n{process['fallback']}", text)
+        self.assertNotIn("Texto de process", text)
+        # El resto de secciones se generan con normalidad
+        for section in AI_SECTIONS:
+            if section["id"] != "process":
+                self.assertIn(f"Texto de {section['id']}", text)
+
+    @patch.object(settings, "PROPOSAL_SECTION_CONCURRENCY", 4)
+    async def test_fallbacks_carry_no_client_data(self):
+        """Sin IA, las secciones con datos del cliente no inventan cifras"""
+        self.failing = {section["id"] for section in AI_SECTIONS}
+        text = await self._generate()
+        for section_id in ("background", "parameters", "process", "equipment"):
+            section = next(s for s in PROPOSAL_SECTIONS if s["id"] == section_id)
+            self.assertIn(f"{section['title']}\n{NOT_AVAILABLE}", text)
+        self.assertNotIn("Industrias Agua Pura", text)
+        self.assertNotIn("m³/día", text)
+
+
+class TestStreamingFallback(unittest.IsolatedAsyncioTestCase):
+    """Un streaming cortado no vuelve a pagar la propuesta completa"""
+
+    async def asyncSetUp(self):
+        self.generator = DirectProposalGenerator()
+        self.calls = []
+        self.chunks = []
+
+    async def _stream_llm_api(self, messages, **kwargs):
+        for chunk in self.chunks:
+            yield chunk
+        raise ConnectionError("conexión cortada")
+
+    async def _call_llm_api(self, messages, **kwargs):
+        self.calls.append(messages)
+        return "Línea cortada completa\n## Fin"
+
+    async def _generate(self):
+        with tempfile.TemporaryDirectory() as tmp, patch.object(
+            settings, "UPLOAD_DIR", tmp
+        ), patch.object(
+            ai_service, "_stream_llm_api", self._stream_llm_api
+        ), patch.object(
+            ai_service, "_call_llm_api", self._call_llm_api
+        ):
+            return await self.generator._generate_proposal_streaming(
+                "Cliente: Hotel", "conv-1"
+            )
+
+    async def test_resumes_from_received_text(self):
+        self.chunks = ["## Introducción\nTexto ", "recibido\nLínea cor"]
+        text, pdf_path = await self._generate()
+        self.assertIsNone(pdf_path)
+        self.assertEqual(
+            text, "## Introducción\nTexto recibido\nLínea cortada completa\n## Fin"
+        )
+        # Una sola llamada que continúa desde la última línea completa
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(
+            self.calls[0][-2],
+            {"role": "assistant", "content": "## Introducción\nTexto recibido\n"},
+        )
+        self.assertEqual(self.calls[0][-1]["content"], CONTINUATION_PROMPT)
+
+    async def test_single_call_when_nothing_arrived(self):
+        text, pdf_path = await self._generate()
+        self.assertIsNone(pdf_path)
+        self.assertEqual(text, "Línea cortada completa\n## Fin")
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(len(self.calls[0]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
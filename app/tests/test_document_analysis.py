@@ -0,0 +1,176 @@
+import asyncio
+import csv
+import os
+import tempfile
+import unittest
+
+from app.services.document_analysis import (
+    LAB_LEXICON,
+    DocumentAnalysisQueue,
+    DocumentAnalyzer,
+    ParameterScanner,
+    TextExtractor,
+)
+from app.services.storage_service import storage_service
+
+LAB_REPORT = (
+    "Informe de laboratorio — muestra de efluente\n"
+    + "Observaciones generales del muestreo. " * 200
+    + "\npH: 7,25\nDQO: 1,250.5 mg/L\nSST 340 ppm\nConductividad eléctrica: 2.1 mS/cm\n"
+)
+EXPECTED = {
+    "pH": {"value": 7.25, "unit": ""},
+    "DQO": {"value": 1250.5, "unit": "mg/L"},
+    "SST": {"value": 340.0, "unit": "mg/L"},
+    "conductividad": {"value": 2100.0, "unit": "µS/cm"},
+}
+
+
+def _doc(path: str, filename: str, content_type: str = "") -> dict:
+    return {
+        "id": os.path.basename(path),
+        "filename": filename,
+        "content_type": content_type,
+        "path": path,
+        "conversation_id": None,
+        "extracted_info": {"type": "unknown", "summary": filename, "parameters": {}},
+    }
+
+
+class TestDocumentAnalysis(unittest.IsolatedAsyncioTestCase):
+    """Pruebas de los extractores y del análisis en segundo plano"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.analyzer = DocumentAnalyzer()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.tmp.name, name)
+
+    def test_scanner_across_chunk_boundaries(self):
+        # Cortes en cualquier punto, incluso dentro de un número o de una unidad
+        for size in (1, 3, 7, 64, 300):
+            scanner = ParameterScanner(LAB_LEXICON)
+            for i in range(0, len(LAB_REPORT), size):
+                scanner.feed(LAB_REPORT[i : i + size])
+            self.assertEqual(scanner.finish(), EXPECTED)
+
+    def test_dot_thousands_separator(self):
+        scanner = ParameterScanner(LAB_LEXICON)
+        scanner.feed(
+            "DQO: 1.250 mg/L\nDBO5: 1.100.000 mg/L\nSST: 2.500,5 ppm\npH 7.125\n"
+        )
+        parameters = scanner.finish()
+        self.assertEqual(parameters["DQO"], {"value": 1250.0, "unit": "mg/L"})
+        self.assertEqual(parameters["DBO"]["value"], 1100000.0)
+        self.assertEqual(parameters["SST"]["value"], 2500.5)
+        # El pH no tiene miles: "7.125" son decimales
+        self.assertEqual(parameters["pH"]["value"], 7.125)
+
+    def test_text_and_csv(self):
+        with open(self._path("informe.txt"), "w", encoding="utf-8") as f:
+            f.write(LAB_REPORT)
+        info = self.analyzer.analyze(_doc(self._path("informe.txt"), "informe.txt"))
+        self.assertEqual(info["parameters"], EXPECTED)
+        self.assertEqual(info["type"], "lab_analysis")
+
+        # Tabla con un parámetro por columna
+        with open(self._path("datos.csv"), "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f, delimiter=";")
+            writer.writerow(["Muestra", "pH", "DQO (mg/L)", "DBO5"])
+            writer.writerow(["Efluente", "8.1", "980", "410"])
+        info = self.analyzer.analyze(_doc(self._path("datos.csv"), "datos.csv"))
+        self.assertEqual(info["parameters"]["pH"]["value"], 8.1)
+        self.assertEqual(info["parameters"]["DQO"]["value"], 980.0)
+        self.assertEqual(info["parameters"]["DBO"]["value"], 410.0)
+
+    def test_extractor_requires_iter_text(self):
+        class NoText(TextExtractor):
+            extensions = (".bin",)
+
+        with self.assertRaises(TypeError):
+            NoText()
+
+    def test_pdf(self):
+        from reportlab.pdfgen import canvas
+
+        pdf = canvas.Canvas(self._path("lab.pdf"))
+        pdf.drawString(72, 720, "Resultados: DQO 1500 mg/L")
+        pdf.showPage()
+        pdf.drawString(72, 720, "pH 6.9   SST 220 mg/L")
+        pdf.save()
+        info = self.analyzer.analyze(
+            _doc(self._path("lab.pdf"), "lab.pdf", "application/pdf")
+        )
+        self.assertEqual(info["parameters"]["DQO"]["value"], 1500.0)
+        self.assertEqual(info["parameters"]["pH"]["value"], 6.9)
+        self.assertEqual(info["parameters"]["SST"]["value"], 220.0)
+
+    def test_docx_and_xlsx(self):
+        try:
+            import docx
+            from openpyxl import Workbook
+        except ImportError:
+            self.skipTest("python-docx u openpyxl no instalados")
+
+        document = docx.Document()
+        document.add_paragraph("Análisis de agua residual")
+        table = document.add_table(rows=2, cols=2)
+        table.cell(0, 0).text, table.cell(0, 1).text = "Parámetro", "Resultado"
+        table.cell(1, 0).text, table.cell(1, 1).text = "DQO", "760 mg/L"
+        document.save(self._path("lab.docx"))
+        info = self.analyzer.analyze(_doc(self._path("lab.docx"), "lab.docx"))
+        self.assertEqual(info["parameters"]["DQO"]["value"], 760.0)
+
+        workbook = Workbook()
+        workbook.active.append(["Parámetro", "Valor", "Unidad"])
+        workbook.active.append(["Conductividad", 1850, "µS/cm"])
+        workbook.save(self._path("lab.xlsx"))
+        info = self.analyzer.analyze(_doc(self._path("lab.xlsx"), "lab.xlsx"))
+        self.assertEqual(info["parameters"]["conductividad"]["value"], 1850.0)
+
+    def test_extraction_cached_by_hash(self):
+        with open(self._path("informe.txt"), "w", encoding="utf-8") as f:
+            f.write(LAB_REPORT)
+        calls = []
+        extractor = self.analyzer.extractor_for("informe.txt", "")
+        original = extractor.iter_text
+        extractor.iter_text = lambda path: calls.append(path) or original(path)
+
+        first = _doc(self._path("informe.txt"), "informe.txt")
+        first["sha256"] = "abc"
+        self.analyzer.analyze(first)
+        second = _doc(self._path("informe.txt"), "otro_nombre.txt")
+        second["sha256"] = "abc"
+        self.assertTrue(self.analyzer.from_cache(second))
+        self.analyzer.analyze(second)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(second["extracted_info"]["parameters"], EXPECTED)
+        # Copias independientes
+        second["extracted_info"]["parameters"].clear()
+        self.assertEqual(first["extracted_info"]["parameters"], EXPECTED)
+
+    async def test_results_attached_to_conversation(self):
+        conversation = await storage_service.create_conversation()
+        with open(self._path("informe.txt"), "w", encoding="utf-8") as f:
+            f.write(LAB_REPORT)
+        doc = _doc(self._path("informe.txt"), "informe.txt")
+        doc["conversation_id"] = conversation.id
+
+        queue = DocumentAnalysisQueue(self.analyzer, workers=2, max_queue=4)
+        await queue.start()
+        self.assertTrue(queue.submit(doc))
+        await queue.stop()
+
+        stored = await storage_service.get_conversation(conversation.id)
+        summary = stored.metadata["documents"][doc["id"]]
+        self.assertEqual(summary["status"], "done")
+        self.assertEqual(summary["parameters"]["DQO"]["value"], 1250.5)
+        self.assertEqual(queue.snapshot()["processed"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+from unittest.mock import patch
+
+from app.models.conversation import Conversation
+from app.models.message import Message
+from app.services import document_context as document_context_module
+from app.services.ai_service import ai_service
+from app.services.document_context import DocumentContext
+
+
+def _lab_doc(doc_id: str = "doc-1", filename: str = "analisis.pdf") -> dict:
+    return {
+        "id": doc_id,
+        "filename": filename,
+        "extracted_info": {
+            "type": "lab_analysis",
+            "parameters": {
+                "pH": {"value": 7.2, "unit": ""},
+                "DQO": {"value": 1250.5, "unit": "mg/L"},
+                "conductividad": {"value": 1800.0, "unit": "µS/cm"},
+            },
+        },
+    }
+
+
+class TestDocumentContext(unittest.TestCase):
+    """Pruebas de los datos de documentos en el prompt"""
+
+    def setUp(self):
+        self.context = DocumentContext()
+
+    def test_record_and_render(self):
+        metadata = {}
+        self.assertEqual(self.context.record(metadata, _lab_doc()), 3)
+        self.assertEqual(
+            metadata["document_facts"]["DQO"],
+            {
+                "value": {"value": 1250.5, "unit": "mg/L"},
+                "source": "analisis.pdf",
+                "doc_id": "doc-1",
+            },
+        )
+        text = self.context.render(metadata)
+        self.assertIn("- DQO: 1250.5 mg/L (analisis.pdf)", text)
+        self.assertIn("- pH: 7.2 (analisis.pdf)", text)
+
+    def test_skips_facts_already_answered(self):
+        metadata = {"collected_data": {"IAB_8": {"COD": 900.0}}}
+        self.context.record(metadata, _lab_doc())
+        text = self.context.render(metadata)
+        # La DQO ya la dio el usuario; el pH no
+        self.assertNotIn("DQO", text)
+        self.assertIn("pH", text)
+
+        metadata["collected_data"]["IAB_8"]["PH"] = 7.0
+        metadata["collected_data"]["IAB_9"] = "Sí"
+        self.assertNotIn("pH", self.context.render(metadata))
+        self.assertIn("conductividad", self.context.render(metadata))
+
+        # Los sólidos disueltos cubren la conductividad
+        metadata["collected_data"]["IAB_8"]["TDS"] = 1200.0
+        self.assertEqual(self.context.render(metadata), "")
+
+    def test_free_text_quality_answer_does_not_cover_facts(self):
+        metadata = {"collected_data": {"IAB_8": "no tengo el análisis a mano"}}
+        self.context.record(metadata, _lab_doc())
+        text = self.context.render(metadata)
+        for name in ("pH", "DQO", "conductividad"):
+            self.assertIn(name, text)
+
+    def test_confident_facts_answer_questions(self):
+        metadata = {}
+        self.assertFalse(self.context.answers_question(metadata, "IAB_7"))
+        self.context.record(metadata, _lab_doc())
+        # La conductividad (µS/cm) no cuenta como sólidos disueltos
+        self.assertEqual(
+            self.context.document_answers(metadata),
+            {"water_quality": {"PH": 7.2, "COD": 1250.5}},
+        )
+        self.assertTrue(self.context.answers_question(metadata, "IAB_7"))
+        self.assertTrue(self.context.answers_question(metadata, "IAB_8_COD"))
+        self.assertFalse(self.context.answers_question(metadata, "IAB_8_BOD"))
+        # Faltan DBO y SST para cubrir la estimación de calidad
+        self.assertFalse(self.context.answers_question(metadata, "IAB_8"))
+
+        doc = _lab_doc("doc-2")
+        doc["extracted_info"]["parameters"] = {
+            "DBO": {"value": 600.0, "unit": "mg/L"},
+            "SST": {"value": 350.0, "unit": "mg/L"},
+        }
+        self.context.record(metadata, doc)
+        self.assertTrue(self.context.answers_question(metadata, "IAB_8"))
+        self.assertFalse(self.context.answers_question(metadata, "IAB_3"))
+
+    def test_budget_keeps_most_recent(self):
+        metadata = {}
+        for i in range(40):
+            doc = _lab_doc(f"doc-{i}", f"informe_{i}.pdf")
+            doc["extracted_info"]["parameters"] = {
+                f"parametro_{i}": {"value": float(i), "unit": "mg/L"}
+            }
+            self.context.record(metadata, doc)
+        with patch.object(document_context_module, "DOCUMENT_CONTEXT_MAX_CHARS", 400):
+            text = self.context.render(metadata)
+        self.assertLessEqual(len(text), 450)
+        self.assertIn("parametro_39", text)
+        self.assertNotIn("parametro_0:", text)
+        self.assertIn("datos más antiguos omitidos", text)
+
+    def test_injected_into_dynamic_suffix(self):
+        conversation = Conversation()
+        conversation.add_message(Message.user("Hola"))
+        self.context.record(conversation.metadata, _lab_doc())
+        messages = ai_service._prepare_messages(conversation)
+        self.assertIn("DQO: 1250.5 mg/L", messages[-1]["content"])
+        self.assertNotIn("1250.5", messages[0]["content"])
+
+
+if __name__ == "__main__":
+    unittest.main()
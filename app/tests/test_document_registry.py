@@ -0,0 +1,100 @@
+import time
+import unittest
+
+from app.services import redis_backend
+from app.services.document_registry import DocumentRegistry, RedisDocumentRegistry
+from app.services.storage_service import RedisStorageService
+
+try:
+    import fakeredis
+except ImportError:  # Dependencia solo de pruebas
+    fakeredis = None
+
+
+def _doc(doc_id: str, conversation_id: str, sha256: str) -> dict:
+    return {
+        "id": doc_id,
+        "conversation_id": conversation_id,
+        "sha256": sha256,
+        "filename": f"{doc_id}.txt",
+        "extracted_info": {"type": "lab_analysis", "parameters": {}},
+    }
+
+
+async def _register(registry, doc_id, conversation_id, sha256, expires_at):
+    await registry.add_ref(sha256, conversation_id)
+    await registry.add(_doc(doc_id, conversation_id, sha256), expires_at)
+
+
+class TestDocumentRegistry(unittest.IsolatedAsyncioTestCase):
+    """Pruebas del registro de documentos en memoria"""
+
+    async def test_lookups_by_conversation(self):
+        registry = DocumentRegistry()
+        later = time.time() + 3600
+        await _register(registry, "d1", "conv-1", "aaa", later)
+        await _register(registry, "d2", "conv-1", "bbb", later)
+        await _register(registry, "d3", "conv-2", "aaa", later)
+
+        docs = await registry.for_conversation("conv-1")
+        self.assertEqual(sorted(d["id"] for d in docs), ["d1", "d2"])
+        self.assertEqual((await registry.find("conv-2", "aaa"))["id"], "d3")
+        self.assertIsNone(await registry.find("conv-2", "bbb"))
+        self.assertEqual((await registry.get("d2"))["sha256"], "bbb")
+        self.assertEqual(await registry.refs("aaa"), {"conv-1": 1, "conv-2": 1})
+
+    async def test_sweep_removes_expired_conversations(self):
+        registry = DocumentRegistry()
+        await _register(registry, "d1", "old", "aaa", time.time() - 1)
+        await _register(registry, "d2", "old", "bbb", time.time() - 1)
+        await _register(registry, "d3", "new", "aaa", time.time() + 3600)
+
+        # "aaa" sigue en uso por la conversación vigente
+        self.assertEqual(await registry.sweep(), ["bbb"])
+        self.assertEqual(await registry.for_conversation("old"), [])
+        self.assertIsNone(await registry.get("d1"))
+        self.assertEqual(len(registry), 1)
+        self.assertTrue(await registry.has_blob("aaa"))
+        self.assertFalse(await registry.has_blob("bbb"))
+
+
+@unittest.skipUnless(fakeredis, "fakeredis no instalado")
+class TestRedisDocumentRegistry(unittest.IsolatedAsyncioTestCase):
+    """Pruebas del registro de documentos en Redis (contra fakeredis)"""
+
+    async def asyncSetUp(self):
+        server = fakeredis.FakeServer()
+        redis_backend.set_redis(
+            fakeredis.aioredis.FakeRedis(server=server, decode_responses=True),
+            fakeredis.aioredis.FakeRedis(server=server),
+        )
+
+    async def asyncTearDown(self):
+        redis_backend.set_redis(None)
+
+    async def test_registry_shared_and_swept(self):
+        storage = RedisStorageService()
+        alive = await storage.create_conversation()
+        writer, reader = RedisDocumentRegistry(), RedisDocumentRegistry()
+        later = time.time() + 3600
+        await _register(writer, "d1", alive.id, "aaa", later)
+        await _register(writer, "d2", "gone", "aaa", later)
+        await _register(writer, "d3", "gone", "bbb", later)
+
+        doc = await reader.get("d1")
+        doc["extracted_info"]["status"] = "done"
+        await reader.save(doc)
+        self.assertEqual(
+            (await writer.find(alive.id, "aaa"))["extracted_info"]["status"], "done"
+        )
+        self.assertEqual(len(await reader.for_conversation("gone")), 2)
+
+        # "gone" no existe como conversación: sus referencias se eliminan
+        self.assertEqual(await reader.sweep(), ["bbb"])
+        self.assertEqual(await writer.refs("aaa"), {alive.id: 1})
+        self.assertEqual(await writer.remove_conversation(alive.id), ["aaa"])
+        self.assertIsNone(await reader.get("d1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import hashlib
+import io
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+from app.config import settings
+from app.services.document_registry import DocumentRegistry
+from app.services.document_service import DocumentService, DocumentTooLargeError
+
+LAB_REPORT = (
+    "Informe de laboratorio — muestra de efluente\n"
+    + "Observaciones generales del muestreo. " * 200
+    + "\npH: 7.25\nDQO: 1250.5 mg/L\nSST: 340\n"
+).encode("utf-8")
+
+
+def _upload(data: bytes, filename: str) -> UploadFile:
+    return UploadFile(
+        file=io.BytesIO(data),
+        filename=filename,
+        headers=Headers({"content-type": "text/plain"}),
+    )
+
+
+class TestDocumentService(unittest.IsolatedAsyncioTestCase):
+    """Pruebas de la subida por bloques de documentos"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.patches = [
+            patch.object(settings, "UPLOAD_DIR", self.tmp.name),
+            patch.object(settings, "UPLOAD_CHUNK_SIZE", 64),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.tmp.cleanup()
+
+    async def test_streamed_upload(self):
+        service = DocumentService(DocumentRegistry())
+        doc = await service.process_document(
+            _upload(LAB_REPORT, "analisis_laboratorio.txt"), "conv-1"
+        )
+        self.assertEqual(doc["size"], len(LAB_REPORT))
+        self.assertEqual(doc["sha256"], hashlib.sha256(LAB_REPORT).hexdigest())
+        self.assertEqual(doc["extracted_info"]["type"], "lab_analysis")
+        with open(doc["path"], "rb") as f:
+            self.assertEqual(f.read(), LAB_REPORT)
+
+    async def test_duplicate_uploads_share_one_file(self):
+        service = DocumentService(DocumentRegistry())
+        first = await service.process_document(
+            _upload(LAB_REPORT, "analisis.txt"), "conv-1"
+        )
+        again = await service.process_document(
+            _upload(LAB_REPORT, "analisis.txt"), "conv-1"
+        )
+        other = await service.process_document(
+            _upload(LAB_REPORT, "copia.txt"), "conv-2"
+        )
+        # Misma conversación: mismo registro; otra conversación: mismo archivo
+        self.assertIs(again, first)
+        self.assertNotEqual(other["id"], first["id"])
+        self.assertEqual(other["path"], first["path"])
+        self.assertEqual(
+            await service.registry.refs(first["sha256"]), {"conv-1": 2, "conv-2": 1}
+        )
+
+        self.assertEqual(await service.release_conversation("conv-1"), 0)
+        self.assertTrue(os.path.exists(first["path"]))
+        self.assertEqual(await service.release_conversation("conv-2"), 1)
+        self.assertFalse(os.path.exists(first["path"]))
+        self.assertEqual(len(service.registry), 0)
+
+    async def test_upload_during_cleanup_keeps_file(self):
+        service = DocumentService(DocumentRegistry())
+        first = await service.process_document(
+            _upload(LAB_REPORT, "analisis.txt"), "conv-1"
+        )
+        # La limpieza deja el archivo sin uso y, antes de borrarlo, otra
+        # conversación sube el mismo contenido
+        unreferenced = await service.registry.remove_conversation("conv-1")
+        self.assertEqual(unreferenced, [first["sha256"]])
+        other = await service.process_document(
+            _upload(LAB_REPORT, "copia.txt"), "conv-2"
+        )
+        self.assertEqual(await service._delete_blobs(unreferenced), 0)
+        with open(other["path"], "rb") as f:
+            self.assertEqual(f.read(), LAB_REPORT)
+
+    async def test_size_limit(self):
+        service = DocumentService(DocumentRegistry())
+        with patch.object(settings, "MAX_UPLOAD_SIZE", 1000):
+            with self.assertRaises(DocumentTooLargeError):
+                await service.process_document(
+                    _upload(LAB_REPORT, "analisis.txt"), "conv-1"
+                )
+        # El archivo parcial se elimina
+        self.assertEqual(os.listdir(self.tmp.name), [])
+        self.assertEqual(len(service.registry), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.routes import feedback
+from app.services.feedback_service import FeedbackLog, FeedbackQueueFull
+
+
+class TestFeedbackLog(unittest.IsolatedAsyncioTestCase):
+    """Pruebas del registro por lotes de la retroalimentación"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "feedback", "feedback.jsonl")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _lines(self):
+        with open(self.path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    async def test_batched_append(self):
+        log = FeedbackLog(self.path, batch_size=3, flush_interval=60, max_queue=100)
+        await log.start()
+        # Varias valoraciones en el mismo segundo no se pisan
+        ids = [log.submit("conv-1", rating) for rating in (5, 4, 3, 2)]
+        self.assertEqual(len(set(ids)), 4)
+        # El lote lleno (3) se escribe sin esperar a flush_interval
+        for _ in range(100):
+            if log.stats["batches"]:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(len(self._lines()), 3)
+
+        await log.stop()
+        self.assertEqual([e["id"] for e in self._lines()], ids)
+        # El resto se escribe al detener
+        self.assertEqual(
+            log.snapshot(), {"queued": 0, "written": 4, "batches": 2, "dropped": 0}
+        )
+
+    async def test_queue_full(self):
+        log = FeedbackLog(self.path, batch_size=10, flush_interval=60, max_queue=1)
+        log.submit("conv-1", 5)
+        with self.assertRaises(FeedbackQueueFull):
+            log.submit("conv-1", 4)
+        await log.stop()
+        self.assertEqual(len(self._lines()), 1)
+
+    async def test_query_aggregates(self):
+        log = FeedbackLog(self.path, batch_size=100, flush_interval=60, max_queue=100)
+        for conversation_id, rating in [("conv-a", 5), ("conv-a", 4), ("conv-b", 1), ("conv-b", 5)]:
+            log.submit(conversation_id, rating)
+
+        stats = await log.query()
+        self.assertEqual(stats["count"], 4)
+        self.assertEqual(stats["average"], 3.75)
+        self.assertEqual(stats["ratings"], {"1": 1, "2": 0, "3": 0, "4": 1, "5": 2})
+        self.assertEqual(len(stats["by_day"]), 1)
+        # Sin filtro no se expone ninguna conversación
+        self.assertNotIn("by_conversation", stats)
+        self.assertNotIn("conv-a", str(stats))
+
+        only_a = await log.query(conversation_id="conv-a")
+        self.assertEqual(only_a["conversation_id"], "conv-a")
+        self.assertEqual(only_a["average"], 4.5)
+
+        # Otra consulta solo lee lo añadido desde la anterior
+        offset = log._offset
+        log.submit("conv-b", 2)
+        stats = await log.query()
+        self.assertEqual(stats["count"], 5)
+        self.assertGreater(log._offset, offset)
+        await log.stop()
+
+    async def test_stats_requires_admin_token(self):
+        app = FastAPI()
+        app.include_router(feedback.router, prefix="/feedback")
+        client = TestClient(app)
+        with patch.object(settings, "ADMIN_TOKEN", ""):
+            self.assertEqual(client.get("/feedback/stats").status_code, 403)
+        with patch.object(settings, "ADMIN_TOKEN", "s3cret"), patch.object(
+            feedback, "feedback_log", FeedbackLog(self.path, 10, 60, 10)
+        ):
+            response = client.get("/feedback/stats", headers={"X-Admin-Token": "nope"})
+            self.assertEqual(response.status_code, 403)
+            response = client.get(
+                "/feedback/stats", headers={"X-Admin-Token": "s3cret"}
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["count"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from reportlab.platypus import SimpleDocTemplate
+
+from app.config import settings
+from app.services.direct_proposal_generator import direct_proposal_generator
+from app.services.pdf_service import pdf_service
+from app.utils import pdf_theme
+from app.utils.incremental_pdf import IncrementalDocTemplate
+from app.utils.markdown_flowables import MarkdownFlowableParser, markdown_to_flowables
+
+TEXT = ("## Sección\n**Encabezado**\n" + "Texto de prueba. " * 40 + "\n") * 30
+
+
+class TestIncrementalPdf(unittest.TestCase):
+    """Pruebas para la maquetación incremental de PDFs"""
+
+    def test_same_pages_as_full_build(self):
+        """Maquetar por fragmentos produce el mismo número de páginas"""
+        full_doc = SimpleDocTemplate(io.BytesIO(), **pdf_theme.PAGE_MARGINS)
+        full_doc.build(markdown_to_flowables(TEXT))
+
+        incremental_doc = IncrementalDocTemplate(io.BytesIO(), **pdf_theme.PAGE_MARGINS)
+        incremental_doc.start()
+        parser = MarkdownFlowableParser()
+        for i in range(0, len(TEXT), 50):
+            incremental_doc.add(parser.feed(TEXT[i : i + 50]))
+            # Solo se retienen flowables pendientes de su sucesor
+            self.assertLessEqual(len(incremental_doc._pending_flowables), 2)
+        incremental_doc.add(parser.close())
+        incremental_doc.finish()
+
+        self.assertGreater(full_doc.page, 1)
+        self.assertEqual(incremental_doc.page, full_doc.page)
+
+    def test_styles_are_per_document(self):
+        """Un documento que cambia un estilo no afecta al tema ni a otro documento"""
+        custom = MarkdownFlowableParser(
+            styles=pdf_theme.document_styles(normal={"fontSize": 20})
+        )
+        default = MarkdownFlowableParser()
+        self.assertEqual(custom.styles["normal"].fontSize, 20)
+        self.assertEqual(custom.styles["normal"].name, "HydrousNormal")
+        self.assertEqual(default.styles["normal"].fontSize, 10)
+        self.assertEqual(pdf_theme.STYLES["normal"].fontSize, 10)
+        # Solo se copia el estilo que cambia; el resto y el caso común se comparten
+        self.assertIs(custom.styles["list"], pdf_theme.STYLES["list"])
+        self.assertIs(default.styles, pdf_theme.STYLES)
+
+
+class TestBackToBackPdfs(unittest.IsolatedAsyncioTestCase):
+    """Generar varios PDFs seguidos reutiliza el tema sin redefinir estilos"""
+
+    async def test_two_pdfs_back_to_back(self):
+        with tempfile.TemporaryDirectory() as tmp, patch.object(
+            settings, "UPLOAD_DIR", tmp
+        ):
+            # Los generadores devuelven None si falla el render (p.ej. un
+            # KeyError por un estilo ya definido)
+            paths = [
+                direct_proposal_generator._generate_pdf(TEXT, "conv-1"),
+                direct_proposal_generator._generate_pdf(TEXT, "conv-2"),
+                await pdf_service.generate_direct_pdf("conv-3", TEXT),
+                await pdf_service.generate_direct_pdf("conv-4", TEXT),
+            ]
+            for path in paths:
+                self.assertIsNotNone(path)
+                self.assertGreater(os.path.getsize(path), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,26 @@
+import unittest
+
+from app.services.insight_service import insight_service
+
+
+class TestInsightService(unittest.TestCase):
+    """Pruebas para la biblioteca de datos relevantes por sector"""
+
+    def test_rotation_without_repeats(self):
+        metadata = {"selected_sector": "Industrial", "selected_subsector": "Textil"}
+        shown = [insight_service.get_insight(metadata) for _ in range(8)]
+        self.assertEqual(len(set(shown)), len(shown))
+        self.assertEqual(len(metadata["used_insights"]), 8)
+
+    def test_prefers_question_topic(self):
+        metadata = {"selected_sector": "Comercial", "selected_subsector": "Hotel"}
+        insight = insight_service.get_insight(metadata, "CHT_2")
+        # El primer dato del hotel habla de consumo; para el costo se elige uno de ahorro
+        self.assertIn("ahorrar", insight)
+
+    def test_unknown_sector(self):
+        self.assertIsNone(insight_service.get_insight({}))
+
+
+if __name__ == "__main__":
+    unittest.main()
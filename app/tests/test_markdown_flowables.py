@@ -0,0 +1,103 @@
+import unittest
+
+from reportlab.platypus import Paragraph, Table
+
+from app.utils.markdown_flowables import (
+    MarkdownFlowableParser,
+    format_inline,
+    iter_flowables,
+    markdown_to_flowables,
+)
+
+SAMPLE = """# Propuesta Hydrous
+
+**1. Project Background**
+| **Client Information** | **Details** |
+| ------------------ | --------------- |
+| **Client Name** | Hotel Azul |
+| **Flow** | 350 m³/día |
+Texto con **negrita** y TSS <50 mg/L & pH.
+- Equipo DAF
+✓ **Regulatory Compliance** -- cumple NOM-002
+---
+1. Site assessment
+"""
+
+
+class TestMarkdownFlowables(unittest.TestCase):
+    """Pruebas para el parser incremental de markdown a flowables"""
+
+    def _describe(self, flowables):
+        """Resumen comparable de una lista de flowables"""
+        described = []
+        for f in flowables:
+            if isinstance(f, Paragraph):
+                described.append(("p", f.style.name, f.text))
+            elif isinstance(f, Table):
+                described.append(("table", len(f._cellvalues), len(f._cellvalues[0])))
+        return described
+
+    def test_block_types(self):
+        """Encabezados, tablas, listas y párrafos se reconocen"""
+        described = self._describe(markdown_to_flowables(SAMPLE))
+        self.assertEqual(described[0], ("p", "HydrousTitle", "Propuesta Hydrous"))
+        self.assertEqual(
+            described[1], ("p", "HydrousHeading2", "1. Project Background")
+        )
+        # Encabezado + 2 filas, sin la fila separadora
+        self.assertEqual(described[2], ("table", 3, 2))
+        self.assertIn(
+            (
+                "p",
+                "HydrousNormal",
+                "Texto con <b>negrita</b> y TSS &lt;50 mg/L &amp; pH.",
+            ),
+            described,
+        )
+        self.assertIn(("p", "HydrousList", "• Equipo DAF"), described)
+        self.assertIn(
+            ("p", "HydrousList", "✓ <b>Regulatory Compliance</b> -- cumple NOM-002"),
+            described,
+        )
+        self.assertEqual(described[-1], ("p", "HydrousList", "1. Site assessment"))
+
+    def test_chunk_boundaries_do_not_change_output(self):
+        """El resultado es el mismo sin importar cómo se fragmente el texto"""
+        expected = self._describe(markdown_to_flowables(SAMPLE))
+        for size in (1, 3, 7, 64):
+            chunks = [SAMPLE[i : i + size] for i in range(0, len(SAMPLE), size)]
+            self.assertEqual(self._describe(iter_flowables(chunks)), expected)
+
+    def test_feed_yields_completed_lines_only(self):
+        """Una línea sin salto final no se emite hasta close()"""
+        parser = MarkdownFlowableParser()
+        self.assertEqual(list(parser.feed("## Sección")), [])
+        emitted = list(parser.feed(" 1\nTexto"))
+        self.assertEqual(len(emitted), 1)
+        self.assertEqual(len(list(parser.close())), 1)
+
+    def test_wide_tables_keep_every_column(self):
+        """Las tablas anchas conservan todas sus columnas dentro del ancho de página"""
+        parser = MarkdownFlowableParser(table_width=16)
+        text = (
+            "| Etapa | Equipo | Caudal | Costo | Eficiencia | Notas |\n"
+            "|---|---|---|---|---|---|\n"
+            "| DAF | Unidad 1 | 350 | 120000 | 90% | Retira grasas |\n"
+            "| MBBR | Reactor | 350 |\n"
+        )
+        table = [f for f in list(parser.feed(text)) + list(parser.close())][0]
+        self.assertIsInstance(table, Table)
+        self.assertEqual(len(table._cellvalues[0]), 6)
+        self.assertEqual(table._cellvalues[1][5].text, "Retira grasas")
+        self.assertEqual(table._colWidths, [16 / 6] * 6)
+        # Las filas cortas se completan con celdas vacías
+        self.assertEqual(table._cellvalues[2][5].text, "")
+
+    def test_format_inline(self):
+        self.assertEqual(
+            format_inline("*nota* y **dato**"), "<i>nota</i> y <b>dato</b>"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import copy
+import json
+import unittest
+
+from app.models.conversation import (
+    Conversation,
+    ConversationMetadata,
+    ConversationResponse,
+)
+from app.models.message import Message, MessageResponse
+
+
+class TestCompactModels(unittest.TestCase):
+    """Pruebas para los registros compactos de mensajes y conversaciones"""
+
+    def test_metadata_behaves_like_dict(self):
+        metadata = ConversationMetadata()
+        self.assertEqual(metadata["client_name"], "Cliente")
+        self.assertIsNone(metadata["pdf_path"])
+        # Campo conocido sin asignar: ausente, no None
+        self.assertNotIn("digest", metadata)
+        self.assertEqual(metadata.setdefault("digest", {}), {})
+        self.assertIn("digest", metadata)
+        # Claves no declaradas también se admiten
+        metadata["otra_clave"] = 1
+        self.assertEqual(metadata.to_dict()["otra_clave"], 1)
+        del metadata["otra_clave"]
+        self.assertNotIn("otra_clave", metadata)
+        with self.assertRaises(KeyError):
+            del metadata["otra_clave"]
+
+    def test_fields_match_annotations(self):
+        # FIELDS se mantiene a mano: cada campo tipado debe tener su slot
+        self.assertEqual(
+            ConversationMetadata.FIELDS, tuple(ConversationMetadata.__annotations__)
+        )
+
+    def test_default_containers_not_shared(self):
+        first, second = Conversation(), Conversation()
+        first.metadata["collected_data"]["ITX_1"] = "Textil"
+        self.assertEqual(second.metadata["collected_data"], {})
+
+    def test_message_round_trip(self):
+        message = Message.user("Hola")
+        restored = Message.from_dict(json.loads(json.dumps(message.to_dict())))
+        self.assertEqual(restored.id, message.id)
+        self.assertEqual(restored.created_at, message.created_at)
+        self.assertIs(restored.role, "user")
+        with self.assertRaises(ValueError):
+            Message(role="otro", content="x")
+
+    def test_deepcopy_and_response(self):
+        conversation = Conversation(metadata={"current_question_id": "ITX_1"})
+        conversation.add_message(Message.assistant("**PREGUNTA:** ..."))
+        clone = copy.deepcopy(conversation)
+        clone.metadata["current_question_id"] = "ITX_2"
+        self.assertEqual(conversation.metadata["current_question_id"], "ITX_1")
+        self.assertEqual(clone.messages[0].id, conversation.messages[0].id)
+
+        response = ConversationResponse(
+            id=conversation.id,
+            created_at=conversation.created_at,
+            messages=[MessageResponse.from_message(m) for m in conversation.messages],
+            metadata=conversation.metadata.to_dict(),
+        )
+        self.assertEqual(response.messages[0].role, "assistant")
+
+
+if __name__ == "__main__":
+    unittest.main()
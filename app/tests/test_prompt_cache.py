@@ -0,0 +1,120 @@
+import itertools
+import json
+import unittest
+from unittest.mock import patch
+
+import httpx
+
+from app.prompts import main_prompt_llm_driven
+from app.prompts.main_prompt_llm_driven import (
+    get_dynamic_state_suffix,
+    get_llm_driven_master_prompt,
+    get_static_prompt_prefix,
+)
+from app.services import ai_service as ai_service_module
+from app.services.ai_service import ai_service
+from app.utils.prompt_cache import PromptCacheStats, check_prefix_stability
+
+
+class TestPromptCache(unittest.TestCase):
+    """Pruebas para la división del prompt en prefijo estático y estado dinámico"""
+
+    def test_prefix_is_stable_across_turns(self):
+        self.assertTrue(check_prefix_stability())
+
+    def test_detects_unstable_prefix(self):
+        # Un dato que cambia en cada carga del prefijo estático
+        counter = itertools.count()
+        with patch.object(
+            main_prompt_llm_driven,
+            "load_proposal_format_content",
+            lambda: f"Formato generado #{next(counter)}",
+        ):
+            self.assertFalse(check_prefix_stability())
+        # La copia en memoria del prefijo no se altera
+        self.assertNotIn("Formato generado", get_static_prompt_prefix())
+
+        # Estado de la conversación en un mensaje anterior al historial
+        original = ai_service._prepare_messages
+
+        def leaky(conversation):
+            messages = original(conversation)
+            sector = conversation.metadata.get("selected_sector")
+            return (
+                messages[:1]
+                + [{"role": "system", "content": f"Sector: {sector}"}]
+                + messages[1:]
+            )
+
+        with patch.object(ai_service, "_prepare_messages", leaky):
+            self.assertFalse(check_prefix_stability())
+
+    def test_state_only_in_suffix(self):
+        metadata = {
+            "selected_sector": "Industrial",
+            "selected_subsector": "Subsector-XYZ",
+        }
+        prefix = get_static_prompt_prefix()
+        suffix = get_dynamic_state_suffix(metadata)
+        self.assertNotIn("Subsector-XYZ", prefix)
+        self.assertIn("Subsector-XYZ", suffix)
+        self.assertTrue(get_llm_driven_master_prompt(metadata).startswith(prefix))
+
+    def test_record_usage(self):
+        stats = PromptCacheStats()
+        self.assertEqual(stats.record(None), 0)
+        cached = stats.record(
+            {"prompt_tokens": 2000, "prompt_tokens_details": {"cached_tokens": 1536}}
+        )
+        stats.record({"prompt_tokens": 2000})
+        self.assertEqual(cached, 1536)
+        self.assertEqual(stats.snapshot()["calls"], 2)
+        self.assertAlmostEqual(stats.hit_rate, 1536 / 4000)
+
+
+class TestStreamUsage(unittest.IsolatedAsyncioTestCase):
+    """El modo streaming también registra los tokens cacheados"""
+
+    async def test_usage_from_final_chunk(self):
+        events = [
+            {"choices": [{"delta": {"content": "Hola"}}], "usage": None},
+            {
+                "choices": [],
+                "usage": {
+                    "prompt_tokens": 1000,
+                    "prompt_tokens_details": {"cached_tokens": 768},
+                },
+            },
+        ]
+        body = "".join(f"data: {json.dumps(event)}\n\n" for event in events)
+        body += "data: [DONE]\n\n"
+        requests = []
+
+        def handler(request):
+            requests.append(json.loads(request.content))
+            return httpx.Response(200, text=body)
+
+        real_client = httpx.AsyncClient
+        stats = PromptCacheStats()
+        with patch.object(ai_service, "api_key", "clave"), patch.object(
+            ai_service, "api_url", "https://llm.test/v1/chat/completions"
+        ), patch.object(
+            ai_service_module.httpx,
+            "AsyncClient",
+            lambda: real_client(transport=httpx.MockTransport(handler)),
+        ), patch.object(
+            ai_service_module, "prompt_cache_stats", stats
+        ):
+            chunks = [
+                chunk
+                async for chunk in ai_service._stream_llm_api(
+                    [{"role": "user", "content": "Hola"}]
+                )
+            ]
+        self.assertEqual(chunks, ["Hola"])
+        self.assertEqual(requests[0]["stream_options"], {"include_usage": True})
+        self.assertEqual(stats.snapshot()["cached_tokens"], 768)
+
+
+if __name__ == "__main__":
+    unittest.main()
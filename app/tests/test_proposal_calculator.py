@@ -0,0 +1,128 @@
+import unittest
+
+from app.models.conversation import Conversation
+from app.services.proposal_calculator import proposal_calculator, size_stage
+from app.utils.units import (
+    parse_flow_m3_per_day,
+    parse_number,
+    parse_unit_cost_usd_per_m3,
+)
+
+
+class TestUnits(unittest.TestCase):
+    """Pruebas para la interpretación de cantidades en respuestas libres"""
+
+    def test_flow_conversions(self):
+        self.assertAlmostEqual(parse_flow_m3_per_day("350 m3/dia"), 350)
+        self.assertAlmostEqual(parse_flow_m3_per_day("9,000 m³/mes"), 300)
+        self.assertAlmostEqual(parse_flow_m3_per_day("5 L/s"), 432)
+        self.assertAlmostEqual(
+            parse_flow_m3_per_day("3000", default_period_per_day=1 / 30), 100
+        )
+        self.assertAlmostEqual(parse_flow_m3_per_day("Aprox 1.200 m3 por día"), 1200)
+
+    def test_thousands_separators(self):
+        self.assertEqual(parse_number("Aprox 1.200 m3 por día"), 1200)
+        self.assertEqual(parse_number("1.200.000"), 1200000)
+        self.assertEqual(parse_number("1.250,5"), 1250.5)
+        self.assertEqual(parse_number("1,250.5"), 1250.5)
+        # Decimales, no miles
+        self.assertEqual(parse_number("0.500"), 0.5)
+        self.assertEqual(parse_number("7.25"), 7.25)
+        self.assertEqual(parse_number("1.2345"), 1.2345)
+
+    def test_unit_cost(self):
+        self.assertAlmostEqual(parse_unit_cost_usd_per_m3("36 MXN/m³"), 2.0)
+        self.assertAlmostEqual(parse_unit_cost_usd_per_m3("0.01 USD/galón"), 2.6417, 4)
+        # Importes por periodo, caudales y valores fuera de rango no son un costo por m³
+        self.assertIsNone(parse_unit_cost_usd_per_m3("15000 pesos al mes"))
+        self.assertIsNone(parse_unit_cost_usd_per_m3("50 gpm"))
+        self.assertIsNone(parse_unit_cost_usd_per_m3("15000 pesos"))
+
+
+class TestProposalCalculator(unittest.TestCase):
+    """Pruebas para el cálculo local de dimensionamiento y finanzas"""
+
+    def _conversation(self, summaries):
+        conversation = Conversation()
+        conversation.metadata.update(
+            selected_sector="Industrial",
+            selected_subsector="Textil",
+            response_summaries={
+                qid: {"question": "", "answer": answer}
+                for qid, answer in summaries.items()
+            },
+        )
+        return conversation
+
+    def test_size_stage_picks_cheapest_model(self):
+        """Para un caudal pequeño se elige el modelo chico, no varios grandes"""
+        small = size_stage("mbbr", 40)
+        self.assertEqual(small["units"], 1)
+        self.assertLess(small["cost_usd"], 35000)
+        large = size_stage("mbbr", 2000)
+        self.assertAlmostEqual(large["units"] * large["unit_capacity_m3_day"], 2000)
+
+    def test_calculation_is_deterministic(self):
+        conversation = self._conversation(
+            {
+                "ITX_2": "36 MXN/m3",
+                "ITX_3": "9,000 m³/mes",
+                "ITX_4": "240 m3/día",
+                "ITX_8": "DQO 2000 mg/L, SST 300, pH 9-11",
+            }
+        )
+        result = proposal_calculator.calculate(conversation)
+        self.assertEqual(result, proposal_calculator.calculate(conversation))
+
+        self.assertAlmostEqual(result["design_flow_m3_day"], 240)
+        self.assertEqual(result["flow_source"], "wastewater_generation")
+        self.assertAlmostEqual(result["roi"]["water_cost_usd_m3"], 2.0)
+        # DQO alta → etapa anaerobia
+        stages = [item["stage"] for item in result["equipment"]]
+        self.assertIn("uasb", stages)
+
+        capex = result["capex"]
+        self.assertAlmostEqual(
+            capex["total"],
+            capex["equipment"] + capex["installation"] + capex["engineering"],
+        )
+        low, high = capex["range"]
+        self.assertLess(low, capex["total"])
+        self.assertGreater(high, capex["total"])
+
+        sections = proposal_calculator.render_sections(result)
+        self.assertEqual(
+            set(sections), {"parameters", "process", "equipment", "financials", "roi"}
+        )
+        self.assertIn("| **COD (mg/L)** | 2000 |", sections["parameters"])
+
+    def test_document_values_complete_answers(self):
+        conversation = self._conversation({"ITX_8": "SST 300"})
+        conversation.metadata["document_facts"] = {
+            name: {"value": value, "source": "analisis.pdf", "doc_id": "doc-1"}
+            for name, value in (
+                ("DQO", {"value": 2000.0, "unit": "mg/L"}),
+                ("SST", {"value": 500.0, "unit": "mg/L"}),
+                ("consumo", "9000"),
+            )
+        }
+        result = proposal_calculator.calculate(conversation)
+        sections = proposal_calculator.render_sections(result)
+        self.assertIn("| **COD (mg/L)** | 2000 |", sections["parameters"])
+        # La respuesta del usuario prevalece sobre el documento
+        self.assertIn("| **TSS (mg/L)** | 300 |", sections["parameters"])
+        self.assertIn("uasb", [item["stage"] for item in result["equipment"]])
+        # El consumo de un recibo (sin periodo) no fija el caudal
+        self.assertEqual(result["flow_source"], "default")
+
+    def test_defaults_without_answers(self):
+        """Sin respuestas se usan caudal y calidad típicos del sector"""
+        result = proposal_calculator.calculate(self._conversation({}))
+        self.assertEqual(result["flow_source"], "default")
+        self.assertEqual(result["roi"]["water_cost_source"], "default")
+        self.assertTrue(result["equipment"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+from app.services.proposal_service import TEMPLATE_KEYS, ProposalService
+
+
+class TestProposalTemplate(unittest.TestCase):
+    """Pruebas para el rellenado de la plantilla pre-tokenizada"""
+
+    def setUp(self):
+        self.service = ProposalService()
+        template = (
+            "Cliente: [CLIENT_NAME] / [client_name]\n"
+            "Calidad: [N/A] [valor]\n"
+            "Pendiente: [MISSING_KEY]\n"
+            "Q&A: [RESUMEN_Q&A_TEXTO]\n"
+            "Diseño: [DISEÑO_PROCESO_TEXTO]\n"
+            "Ref: [123] [NH3_VALUE]"
+        )
+        self.service.template_segments, self.service.template_slots = (
+            self.service._compile_template(template)
+        )
+
+    def test_fill_template_single_pass(self):
+        """Los placeholders se sustituyen sin re-procesar los valores insertados"""
+        filled = self.service._fill_template(
+            {
+                "CLIENT_NAME": "Hotel [LOCATION]",
+                "LOCATION": "CDMX",
+                "RESUMEN_Q&A_TEXTO": ["a", "b"],
+                "DISEÑO_PROCESO_TEXTO": None,
+            }
+        )
+        self.assertIn("Cliente: Hotel [LOCATION] / Hotel [LOCATION]", filled)
+        self.assertIn("Q&A: a, b", filled)
+        self.assertIn("Diseño: [No especificado]", filled)
+
+    def test_unknown_placeholders(self):
+        """Los placeholders sin dato se marcan y el texto libre se conserva"""
+        filled = self.service._fill_template({})
+        self.assertIn("Pendiente: [Dato no disponible]", filled)
+        self.assertIn("Calidad: [N/A] [valor]", filled)
+        # Claves con dígitos se reconocen; un número entre corchetes no
+        self.assertIn("Ref: [123] [Dato no disponible]", filled)
+        filled = self.service._fill_template({"NH3_VALUE": 12})
+        self.assertIn("Ref: [123] 12", filled)
+
+    def test_template_keys_match_formatter(self):
+        """TEMPLATE_KEYS son exactamente las claves de _format_data_for_template"""
+        for metadata in (
+            {},
+            {"selected_sector": "Comercial", "selected_subsector": "Hotel"},
+            {"selected_sector": "Industrial", "selected_subsector": "Textil"},
+        ):
+            data = self.service._format_data_for_template({}, metadata)
+            self.assertEqual(set(data), TEMPLATE_KEYS)
+
+
+if __name__ == "__main__":
+    unittest.main()
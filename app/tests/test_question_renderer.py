@@ -0,0 +1,64 @@
+import unittest
+
+from app.services.question_renderer import question_renderer
+
+
+class TestQuestionRenderer(unittest.TestCase):
+    """Pruebas para la presentación local de preguntas"""
+
+    def test_render_options_and_explanation(self):
+        metadata = {"selected_sector": "Industrial"}
+        text = question_renderer.render("INIT_2", metadata)
+        self.assertTrue(text.startswith("**PREGUNTA:** Dentro del sector 'Industrial'"))
+        self.assertIn("2. Textil", text)
+        self.assertIn("*¿Por qué lo preguntamos?*", text)
+        # Las opciones abreviadas (...) no se muestran
+        self.assertNotIn("Ellipsis", question_renderer.render("ITX_5", metadata))
+
+    def test_next_question_follows_dependencies(self):
+        metadata = {
+            "selected_sector": "Industrial",
+            "selected_subsector": "Textil",
+            "current_question_id": "ITX_7",
+            "collected_data": {"ITX_7": True},
+        }
+        # ITX_8 solo aplica si no hay análisis de laboratorio
+        self.assertNotEqual(question_renderer.next_question_id(metadata), "ITX_8")
+        metadata["collected_data"]["ITX_7"] = False
+        self.assertEqual(question_renderer.next_question_id(metadata), "ITX_8")
+
+    def test_next_question_skips_document_answers(self):
+        metadata = {
+            "selected_sector": "Industrial",
+            "selected_subsector": "Textil",
+            "current_question_id": "ITX_6",
+            "collected_data": {},
+            "document_facts": {
+                "DQO": {
+                    "value": {"value": 900.0, "unit": "mg/L"},
+                    "source": "analisis.pdf",
+                    "doc_id": "doc-1",
+                }
+            },
+        }
+        # El análisis subido responde ITX_7 (y por tanto no aplica ITX_8)
+        self.assertEqual(question_renderer.next_question_id(metadata), "ITX_9")
+        metadata["document_facts"]["DQO"]["value"]["unit"] = "g/L"
+        self.assertEqual(question_renderer.next_question_id(metadata), "ITX_7")
+
+    def test_needs_clarification(self):
+        self.assertTrue(
+            question_renderer.needs_clarification("INIT_1", "quizá", "quizá")
+        )
+        self.assertFalse(
+            question_renderer.needs_clarification("INIT_1", "1", "Industrial")
+        )
+        self.assertTrue(
+            question_renderer.needs_clarification("ITX_1", "¿Para qué?", "¿Para qué?")
+        )
+        # Lista abreviada: se acepta texto libre
+        self.assertFalse(question_renderer.needs_clarification("ITX_5", "80", "80"))
+
+
+if __name__ == "__main__":
+    unittest.main()
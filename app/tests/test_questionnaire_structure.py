@@ -0,0 +1,71 @@
+import json
+import unittest
+
+from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.testclient import TestClient
+
+from app.routes import questionnaire
+from app.services.questionnaire_service import questionnaire_service
+
+
+class TestQuestionnaireStructure(unittest.TestCase):
+    """Pruebas del endpoint con la estructura estática del cuestionario"""
+
+    @classmethod
+    def setUpClass(cls):
+        app = FastAPI()
+        app.add_middleware(GZipMiddleware, minimum_size=1000)
+        app.include_router(questionnaire.router, prefix="/questionnaire")
+        cls.client = TestClient(app)
+
+    def test_structure_is_plain_json(self):
+        structure = questionnaire_service.get_public_structure()
+        text = json.dumps(structure)
+        self.assertNotIn("Ellipsis", text)
+        self.assertNotIn('"explanation": "..."', text)
+        # INIT_1 tiene la lista completa; otras preguntas la tienen abreviada con ...
+        questions = {
+            q["id"]: q
+            for subsectors in structure["sector_questionnaires"].values()
+            for qs in subsectors.values()
+            for q in qs
+        }
+        self.assertNotIn("open_options", structure["initial_questions"][1])
+        self.assertTrue(any(q.get("open_options") for q in questions.values()))
+
+    def test_etag_and_not_modified(self):
+        response = self.client.get(
+            "/questionnaire/structure", headers={"Accept-Encoding": "gzip"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertIn("max-age", response.headers["cache-control"])
+        etag = response.headers["etag"]
+        self.assertIn("initial_questions", response.json())
+        # Débil: el cuerpo comprimido y el sin comprimir comparten ETag
+        self.assertTrue(etag.startswith('W/"'))
+        identity = self.client.get(
+            "/questionnaire/structure", headers={"Accept-Encoding": "identity"}
+        )
+        self.assertNotIn("content-encoding", identity.headers)
+        self.assertEqual(identity.headers["etag"], etag)
+
+        cached = self.client.get(
+            "/questionnaire/structure", headers={"If-None-Match": etag}
+        )
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b"")
+
+    def test_weak_comparison(self):
+        etag = questionnaire.compiled_structure()[1]
+        opaque = etag[2:]
+        self.assertTrue(questionnaire._etag_matches(opaque, etag))
+        self.assertTrue(questionnaire._etag_matches(f'"otro", W/{opaque}', etag))
+        self.assertTrue(questionnaire._etag_matches("*", etag))
+        self.assertFalse(questionnaire._etag_matches('W/"otro"', etag))
+        self.assertFalse(questionnaire._etag_matches(None, etag))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fastapi import HTTPException
+
+from app.config import settings
+from app.models.message import Message
+from app.services import conversation_locks, proposal_jobs, redis_backend
+from app.services.admission_control import RedisRateLimiter
+from app.services.conversation_locks import (
+    RedisConversationLockManager,
+    RedisIdempotencyCache,
+)
+from app.services.direct_proposal_generator import direct_proposal_generator
+from app.services.proposal_jobs import RedisProposalJobs
+from app.services.storage_service import RedisStorageService
+
+try:
+    import fakeredis
+except ImportError:  # Dependencia solo de pruebas
+    fakeredis = None
+
+try:
+    import lupa  # Scripts Lua en fakeredis
+except ImportError:
+    lupa = None
+
+
+@unittest.skipUnless(fakeredis, "fakeredis no instalado")
+class TestRedisBackend(unittest.IsolatedAsyncioTestCase):
+    """Pruebas del estado compartido en Redis (contra fakeredis)"""
+
+    async def asyncSetUp(self):
+        server = fakeredis.FakeServer()
+        redis_backend.set_redis(
+            fakeredis.aioredis.FakeRedis(server=server, decode_responses=True),
+            fakeredis.aioredis.FakeRedis(server=server),
+        )
+
+    async def asyncTearDown(self):
+        redis_backend.set_redis(None)
+
+    async def test_conversation_shared_between_workers(self):
+        worker_a, worker_b = RedisStorageService(), RedisStorageService()
+        conversation = await worker_a.create_conversation()
+        conversation.add_message(Message.user("Hola"))
+        conversation.metadata["collected_data"] = {"ITX_3": 300.0}
+        await worker_a.save_conversation(conversation)
+        await worker_a.add_message_to_conversation(
+            conversation.id, Message.assistant("**PREGUNTA:** ¿Sector?")
+        )
+
+        loaded = await worker_b.get_conversation(conversation.id)
+        self.assertEqual([m.role for m in loaded.messages], ["user", "assistant"])
+        self.assertEqual(loaded.metadata["collected_data"], {"ITX_3": 300.0})
+        self.assertEqual(loaded.created_at, conversation.created_at)
+        # Guardar de nuevo no duplica el historial
+        await worker_b.save_conversation(loaded)
+        reloaded = await worker_a.get_conversation(conversation.id)
+        self.assertEqual(len(reloaded.messages), 2)
+        self.assertIsNone(await worker_a.get_conversation("no-existe"))
+
+        # Un mensaje deshecho (503 sin lugar para el LLM) se quita también en Redis
+        reloaded.messages.pop()
+        await worker_b.save_conversation(reloaded)
+        loaded = await worker_a.get_conversation(conversation.id)
+        self.assertEqual([m.role for m in loaded.messages], ["user"])
+
+    @unittest.skipUnless(lupa, "lupa no instalado")
+    async def test_lock_excludes_other_workers(self):
+        events = []
+
+        async def worker(name):
+            # Un gestor por worker: solo Redis los coordina
+            async with RedisConversationLockManager().lock("conv-1"):
+                events.append(f"{name}-in")
+                await asyncio.sleep(0.05)
+                events.append(f"{name}-out")
+
+        await asyncio.gather(worker("a"), worker("b"))
+        self.assertEqual(events[1], events[0].replace("in", "out"))
+
+    @unittest.skipUnless(lupa, "lupa no instalado")
+    @patch.object(conversation_locks, "REDIS_LOCK_TIMEOUT", 0.1)
+    @patch.object(conversation_locks, "REDIS_LOCK_RENEW_INTERVAL", 0.03)
+    async def test_lock_lease_renewed_while_held(self):
+        redis = redis_backend.get_redis()
+        async with RedisConversationLockManager().lock("conv-1"):
+            # Dura varias veces la caducidad sin que el lock se pierda
+            await asyncio.sleep(0.3)
+            self.assertIsNotNone(await redis.get(redis_backend.key("lock", "conv-1")))
+        self.assertIsNone(await redis.get(redis_backend.key("lock", "conv-1")))
+
+    @unittest.skipUnless(lupa, "lupa no instalado")
+    @patch.object(conversation_locks, "REDIS_LOCK_WAIT", 0.1)
+    async def test_lock_wait_times_out(self):
+        redis = redis_backend.get_redis()
+        lock_key = redis_backend.key("lock", "conv-1")
+        # Lock de otro worker
+        await redis.set(lock_key, "otro-token", px=60000)
+        with self.assertRaises(HTTPException) as ctx:
+            async with RedisConversationLockManager().lock("conv-1"):
+                pass
+        self.assertEqual(ctx.exception.status_code, 409)
+        self.assertIn("Retry-After", ctx.exception.headers)
+        # No se borra un lock ajeno
+        self.assertEqual(await redis.get(lock_key), "otro-token")
+
+    @unittest.skipUnless(lupa, "lupa no instalado")
+    async def test_release_keeps_original_error(self):
+        redis = redis_backend.get_redis()
+        lock_key = redis_backend.key("lock", "conv-1")
+        with self.assertRaises(ValueError):
+            async with RedisConversationLockManager().lock("conv-1"):
+                # El lock caducó y lo tomó otro worker
+                await redis.set(lock_key, "otro-token")
+                raise ValueError("fallo de la petición")
+        self.assertEqual(await redis.get(lock_key), "otro-token")
+
+        with self.assertRaises(ValueError), patch.object(
+            redis, "eval", side_effect=ConnectionError("sin red")
+        ):
+            async with RedisConversationLockManager().lock("conv-2"):
+                raise ValueError("fallo de la petición")
+
+    @unittest.skipUnless(lupa, "lupa no instalado")
+    @patch.object(proposal_jobs, "PROPOSAL_JOB_POLL", 0.01)
+    async def test_proposal_generated_once_and_shared(self):
+        calls = []
+
+        async def generate(conversation):
+            calls.append(conversation.id)
+            await asyncio.sleep(0.05)
+            path = direct_proposal_generator.pdf_output_path(conversation.id)
+            with open(path, "wb") as f:
+                f.write(b"%PDF-propuesta")
+            conversation.metadata["pdf_path"] = path
+            return path
+
+        conversation = await RedisStorageService().create_conversation()
+        with tempfile.TemporaryDirectory() as tmp, patch.object(
+            settings, "UPLOAD_DIR", tmp
+        ), patch.object(
+            direct_proposal_generator, "generate_complete_proposal", generate
+        ):
+            # Un worker por instancia: la última respuesta y una descarga a la vez
+            paths = await asyncio.gather(
+                RedisProposalJobs().generate(conversation),
+                RedisProposalJobs().pdf_path(conversation),
+            )
+            self.assertEqual(calls, [conversation.id])
+            self.assertTrue(all(paths))
+
+            # Otra instancia sin el archivo en su disco lo trae de Redis
+            os.remove(paths[0])
+            path = await RedisProposalJobs().pdf_path(conversation)
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), b"%PDF-propuesta")
+            self.assertEqual(calls, [conversation.id])
+
+    async def test_idempotency_and_rate_limit(self):
+        cache = RedisIdempotencyCache()
+        await cache.put("c", "k1", {"id": "m1", "message": "hola"})
+        self.assertEqual(await cache.get("c", "k1"), {"id": "m1", "message": "hola"})
+
+        limiter = RedisRateLimiter(rate_per_minute=2, burst=1)
+        allowed = [(await limiter.check("10.0.0.1"))[0] for _ in range(4)]
+        self.assertEqual(allowed, [True, True, True, False])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+
+from app.models.conversation import Conversation, ConversationResponse
+from app.models.message import Message, MessageResponse
+from app.utils import serialization
+
+
+def _conversation() -> Conversation:
+    conversation = Conversation(
+        metadata={
+            "current_question_id": "ITX_5",
+            "collected_data": {
+                "ITX_3": 300.0,
+                "ITX_4": ["DQO", "SST"],
+                "ITX_6": True,
+                "ITX_7": {"DQO": 1200},
+            },
+            "client_name": "Textiles ñandú",
+            "otra_clave": None,
+        }
+    )
+    conversation.add_message(Message.user("Hola 💧"))
+    conversation.add_message(Message.assistant("**PREGUNTA:** ¿Sector?"))
+    return conversation
+
+
+class TestSerialization(unittest.TestCase):
+    """Pruebas de ida y vuelta de los formatos de almacenamiento y de la API"""
+
+    def assertSameConversation(self, restored, original):
+        self.assertEqual(restored.id, original.id)
+        self.assertEqual(restored.ts, original.ts)
+        self.assertEqual(restored.metadata.to_dict(), original.metadata.to_dict())
+        self.assertEqual(
+            [m.to_dict() for m in restored.messages],
+            [m.to_dict() for m in original.messages],
+        )
+
+    def test_msgpack_round_trip(self):
+        conversation = _conversation()
+        restored = serialization.unpack_conversation(
+            serialization.pack_conversation(conversation)
+        )
+        self.assertSameConversation(restored, conversation)
+        self.assertIs(restored.messages[0].role, "user")
+
+    def test_message_and_metadata_round_trip(self):
+        conversation = _conversation()
+        message = conversation.messages[1]
+        restored = serialization.unpack_message(serialization.pack_message(message))
+        self.assertEqual(restored.to_dict(), message.to_dict())
+        metadata = serialization.unpack_metadata(
+            serialization.pack_metadata(conversation.metadata)
+        )
+        self.assertEqual(metadata, conversation.metadata.to_dict())
+
+    def test_json_matches_pydantic_response(self):
+        conversation = _conversation()
+        expected = ConversationResponse(
+            id=conversation.id,
+            created_at=conversation.created_at,
+            messages=[MessageResponse.from_message(m) for m in conversation.messages],
+            metadata=conversation.metadata.to_dict(),
+        )
+        payload = serialization.dumps_json(
+            serialization.conversation_payload(conversation)
+        )
+        self.assertEqual(ConversationResponse.model_validate_json(payload), expected)
+
+    def test_json_fallback_types(self):
+        data = serialization.loads_json(
+            serialization.dumps_json({"a": {1, 2}, "b": (1,), "c": object})
+        )
+        self.assertEqual(sorted(data["a"]), [1, 2])
+        self.assertEqual(data["b"], [1])
+        self.assertIsInstance(data["c"], str)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from app.config import settings
+from app.models.conversation import Conversation
+from app.services import speculative_prefetch as speculative_prefetch_module
+from app.services.admission_control import AdmissionController
+from app.services.ai_service import ai_service
+from app.services.speculative_prefetch import SpeculativePrefetch
+
+
+class TestSpeculativePrefetch(unittest.IsolatedAsyncioTestCase):
+    """Pruebas para el prefetch especulativo del siguiente turno"""
+
+    async def asyncSetUp(self):
+        self.prefetch = SpeculativePrefetch()
+        self.conversation = Conversation()
+        self.conversation.metadata.update(current_question_id="INIT_1")
+
+    async def _respond(self, conversation):
+        await asyncio.sleep(0.01)
+        conversation.metadata["current_question_id"] = "INIT_2"
+        return f"Respuesta para {conversation.metadata['selected_sector']}"
+
+    @patch.object(settings, "SPECULATIVE_PREFETCH", True)
+    async def test_hit_applies_updates(self):
+        with patch.object(ai_service, "handle_conversation", self._respond):
+            self.prefetch.schedule(self.conversation)
+            response = await self.prefetch.take(
+                self.conversation, "INIT_1", "Industrial"
+            )
+        self.assertEqual(response, "Respuesta para Industrial")
+        self.assertEqual(self.conversation.metadata["current_question_id"], "INIT_2")
+        self.assertEqual(self.prefetch.stats["hits"], 1)
+        # La especulación trabaja sobre su propia copia
+        self.assertEqual(self.conversation.messages, [])
+        self.assertEqual(self.conversation.metadata["collected_data"], {})
+
+    @patch.object(settings, "SPECULATIVE_PREFETCH", True)
+    @patch.object(settings, "QUESTION_MODE", "local")
+    async def test_skipped_with_local_questions(self):
+        """Con preguntas locales el siguiente turno no llama al LLM"""
+        with patch.object(ai_service, "handle_conversation", self._respond):
+            self.prefetch.schedule(self.conversation)
+        self.assertEqual(self.prefetch.stats["scheduled"], 0)
+        self.assertIsNone(
+            await self.prefetch.take(self.conversation, "INIT_1", "Industrial")
+        )
+
+    @patch.object(settings, "SPECULATIVE_PREFETCH", True)
+    async def test_miss_cancels_pending_work(self):
+        with patch.object(ai_service, "handle_conversation", self._respond):
+            self.prefetch.schedule(self.conversation)
+            response = await self.prefetch.take(
+                self.conversation, "INIT_1", "Residencial"
+            )
+        self.assertIsNone(response)
+        self.assertEqual(self.prefetch.stats["cancelled"], 2)
+        self.assertEqual(self.conversation.metadata["current_question_id"], "INIT_1")
+
+    @patch.object(settings, "SPECULATIVE_PREFETCH", True)
+    async def test_uses_only_free_admission_slots(self):
+        controller = AdmissionController(max_in_flight=1, max_queue=5, queue_timeout=1)
+        with patch.object(
+            speculative_prefetch_module, "admission_controller", controller
+        ), patch.object(ai_service, "handle_conversation", self._respond):
+            # Con el único lugar ocupado la especulación se omite, no espera
+            async with controller.slot():
+                self.prefetch.schedule(self.conversation)
+                await asyncio.sleep(0.02)
+                self.assertEqual(controller.snapshot()["waiting"], 0)
+            self.assertEqual(self.prefetch.stats["skipped"], 2)
+            response = await self.prefetch.take(
+                self.conversation, "INIT_1", "Industrial"
+            )
+            self.assertIsNone(response)
+
+            # Con lugar libre se especula y se sirve el resultado
+            self.prefetch.schedule(self.conversation)
+            response = await self.prefetch.take(
+                self.conversation, "INIT_1", "Industrial"
+            )
+            self.assertEqual(response, "Respuesta para Industrial")
+        self.assertEqual(controller.snapshot()["in_flight"], 0)
+
+    @patch.object(settings, "SPECULATIVE_PREFETCH", True)
+    async def test_failures_are_logged_and_discarded(self):
+        async def fail(conversation):
+            raise RuntimeError("sin red")
+
+        with patch.object(ai_service, "handle_conversation", fail):
+            with self.assertLogs("hydrous", "WARNING") as logs:
+                self.prefetch.schedule(self.conversation)
+                await asyncio.sleep(0.01)
+        self.assertEqual(self.prefetch.stats["failed"], 2)
+        self.assertIn("sin red", logs.output[0])
+        response = await self.prefetch.take(self.conversation, "INIT_1", "Industrial")
+        self.assertIsNone(response)
+
+    async def test_disabled_by_default(self):
+        self.prefetch.schedule(self.conversation)
+        self.assertEqual(self.prefetch.stats["scheduled"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
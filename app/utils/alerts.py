@@ -1,12 +1,32 @@
-# Crear archivo app/utils/alerts.py
+# app/utils/alerts.py
+"""
+Alertas y notificaciones por correo, sin bloquear el event loop.
 
+send_error_alert() y send_completion_notification() solo encolan el mensaje
+(cola acotada). Una tarea en segundo plano los envía por lotes a través de un
+transporte intercambiable; el SMTP reutiliza una sola conexión (STARTTLS y
+login una vez) y la cierra tras NOTIFICATION_IDLE_TIMEOUT segundos sin
+mensajes. Las alertas de error repetidas se agrupan: la misma alerta se envía
+como mucho una vez cada ALERT_THROTTLE_SECONDS y la siguiente indica cuántas
+se omitieron.
+
+Pueden llamarse desde el event loop, desde otro hilo (el mensaje se pasa al
+loop del envío con call_soon_threadsafe) o desde código síncrono sin loop en
+marcha (el mensaje espera, dentro del mismo límite, a que arranque el envío).
+"""
+
+import abc
+import asyncio
 import logging
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import List, Dict, Any, Optional
 import os
+import smtplib
+import threading
+import time
+from collections import deque
 from datetime import datetime
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Any, Dict, List, Optional
 
 logger = logging.getLogger("hydrous-alerts")
 
@@ -15,131 +35,417 @@ SMTP_SERVER = os.environ.get("SMTP_SERVER", "")
 SMTP_PORT = int(os.environ.get("SMTP_PORT", "587"))
 SMTP_USER = os.environ.get("SMTP_USER", "")
 SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD", "")
-ALERT_RECIPIENTS = os.environ.get("ALERT_RECIPIENTS", "").split(",")
+SMTP_STARTTLS = os.environ.get("SMTP_STARTTLS", "true").lower() == "true"
+ALERT_RECIPIENTS = [
+    r.strip() for r in os.environ.get("ALERT_RECIPIENTS", "").split(",") if r.strip()
+]
 
+# Envío en segundo plano
+NOTIFICATION_QUEUE_SIZE = int(os.environ.get("NOTIFICATION_QUEUE_SIZE", "100"))
+NOTIFICATION_BATCH_SIZE = int(os.environ.get("NOTIFICATION_BATCH_SIZE", "20"))
+NOTIFICATION_IDLE_TIMEOUT = float(os.environ.get("NOTIFICATION_IDLE_TIMEOUT", "60"))
+ALERT_THROTTLE_SECONDS = float(os.environ.get("ALERT_THROTTLE_SECONDS", "300"))
 
-def send_error_alert(
-    error_type: str, description: str, details: Optional[Dict[str, Any]] = None
-) -> bool:
-    """
-    Envía una alerta por correo sobre un error crítico
 
-    Args:
-        error_type: Tipo de error
-        description: Descripción del error
-        details: Detalles adicionales
+# --- Transportes ---
 
-    Returns:
-        bool: True si se envió correctamente, False en caso contrario
+
+class NotificationTransport(abc.ABC):
+    """Interfaz de envío: recibe un lote y devuelve cuántos mensajes se enviaron."""
+
+    @abc.abstractmethod
+    async def send(self, messages: List[MIMEMultipart]) -> int:
+        """Envía el lote; devuelve cuántos mensajes se enviaron."""
+
+    async def close(self):
+        """Libera la conexión (si la hay); el siguiente envío la reabre."""
+
+
+class LoggingTransport(NotificationTransport):
+    """Solo registra los mensajes (desarrollo, o correo sin configurar)."""
+
+    async def send(self, messages: List[MIMEMultipart]) -> int:
+        for msg in messages:
+            logger.warning(f"Correo sin configurar; no se envía: {msg['Subject']}")
+        return len(messages)
+
+
+class SmtpTransport(NotificationTransport):
+    """
+    SMTP con una única conexión reutilizada entre envíos. smtplib es bloqueante,
+    así que cada lote se envía en un hilo; solo la tarea del dispatcher usa la
+    conexión, de modo que nunca hay dos hilos con ella a la vez.
     """
-    if not SMTP_SERVER or not SMTP_USER or not ALERT_RECIPIENTS:
-        logger.warning("No se puede enviar alerta: configuración de correo incompleta")
-        return False
 
-    try:
-        # Crear mensaje
-        msg = MIMEMultipart()
-        msg["From"] = SMTP_USER
-        msg["To"] = ", ".join(ALERT_RECIPIENTS)
-        msg["Subject"] = f"[ALERTA] Error en Chatbot Hydrous: {error_type}"
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        user: str = "",
+        password: str = "",
+        starttls: bool = True,
+        timeout: float = 10.0,
+    ):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self._smtp: Optional[smtplib.SMTP] = None
+        self.connections = 0
 
-        # Cuerpo del mensaje
-        body = f"""
-        <html>
-        <body>
-            <h2>Alerta de Error en Chatbot Hydrous</h2>
-            <p><strong>Tipo de Error:</strong> {error_type}</p>
-            <p><strong>Fecha y Hora:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-            <p><strong>Descripción:</strong> {description}</p>
-        """
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                smtp.starttls()
+            if self.user and self.password:
+                smtp.login(self.user, self.password)
+        except BaseException:
+            smtp.close()
+            raise
+        self._smtp = smtp
+        self.connections += 1
+        return smtp
 
-        if details:
-            body += "<h3>Detalles adicionales:</h3><ul>"
-            for key, value in details.items():
-                body += f"<li><strong>{key}:</strong> {value}</li>"
-            body += "</ul>"
+    def _send_one(self, msg: MIMEMultipart):
+        try:
+            (self._smtp or self._connect()).send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # El servidor cerró la conexión reutilizada: se reabre una vez
+            self._quit()
+            self._connect().send_message(msg)
 
-        body += """
-            <p>Este es un mensaje automático generado por el sistema de monitoreo del Chatbot Hydrous.</p>
-        </body>
-        </html>
+    def _send_batch(self, messages: List[MIMEMultipart]) -> int:
+        sent = 0
+        for msg in messages:
+            try:
+                self._send_one(msg)
+                sent += 1
+            except smtplib.SMTPResponseException as e:
+                # Rechazo de este mensaje; la conexión sigue sirviendo
+                logger.error(f"Mensaje rechazado ({msg['Subject']}): {e}")
+            except (smtplib.SMTPException, OSError) as e:
+                logger.error(f"Error de conexión SMTP: {e}")
+                self._quit()
+        return sent
+
+    def _quit(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is None:
+            return
+        try:
+            smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            smtp.close()
+
+    async def send(self, messages: List[MIMEMultipart]) -> int:
+        return await asyncio.to_thread(self._send_batch, messages)
+
+    async def close(self):
+        await asyncio.to_thread(self._quit)
+
+
+# --- Cola de envío ---
+
+
+class NotificationDispatcher:
+    """Cola acotada de mensajes, envío por lotes y agrupación de alertas repetidas."""
+
+    def __init__(
+        self,
+        transport: NotificationTransport,
+        max_queue: int = NOTIFICATION_QUEUE_SIZE,
+        batch_size: int = NOTIFICATION_BATCH_SIZE,
+        idle_timeout: float = NOTIFICATION_IDLE_TIMEOUT,
+        throttle_seconds: float = ALERT_THROTTLE_SECONDS,
+    ):
+        # Intercambiable en cualquier momento (p.ej. por pruebas o otro proveedor)
+        self.transport = transport
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.idle_timeout = idle_timeout
+        self.throttle_seconds = throttle_seconds
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Mensajes encolados fuera del loop del envío, hasta que este los recoge
+        self._pending: deque = deque()
+        self._pending_lock = threading.Lock()
+        # clave de la alerta -> (último envío, alertas omitidas desde entonces)
+        self._throttle: Dict[str, List[float]] = {}
+        self.stats = {"sent": 0, "failed": 0, "dropped": 0, "throttled": 0}
+
+    def _running_loop(self) -> Optional[asyncio.AbstractEventLoop]:
+        """Loop en el que corre el envío, o None si no está en marcha."""
+        if self._task and not self._loop.is_closed():
+            return self._loop
+        return None
+
+    def _ensure_started(self):
+        """Arranca el envío en el loop actual (requiere un loop en marcha)."""
+        loop = asyncio.get_running_loop()
+        if self._running_loop() is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(self.max_queue)
+        self._task = loop.create_task(self._run())
+        self._drain_pending()
+
+    async def start(self):
+        """Arranca el envío y encola lo recibido sin loop en marcha."""
+        self._ensure_started()
+
+    async def stop(self, timeout: float = 5.0):
+        """Envía lo pendiente (como máximo `timeout` s) y cierra el transporte."""
+        if not self._task:
+            return
+        self._drain_pending()
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Notificaciones detenidas con {self._queue.qsize()} sin enviar"
+            )
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.transport.close()
+
+    def throttle(self, key: str) -> Optional[int]:
         """
+        None si la alerta `key` se envió hace menos de throttle_seconds (se
+        cuenta como omitida); si no, cuántas se omitieron desde el último envío.
+        No registra el envío: eso lo hace record() una vez encolada.
+        """
+        entry = self._throttle.get(key)
+        if entry and time.monotonic() - entry[0] < self.throttle_seconds:
+            entry[1] += 1
+            self.stats["throttled"] += 1
+            return None
+        return int(entry[1]) if entry else 0
+
+    def record(self, key: str):
+        """Registra que la alerta `key` se acaba de encolar."""
+        now = time.monotonic()
+        if len(self._throttle) > 1000:
+            self._throttle = {
+                k: v
+                for k, v in self._throttle.items()
+                if now - v[0] < self.throttle_seconds
+            }
+        self._throttle[key] = [now, 0]
 
-        msg.attach(MIMEText(body, "html"))
+    def enqueue(self, msg: MIMEMultipart) -> bool:
+        """
+        Encola un mensaje; False si la cola está llena. Fuera del loop del envío
+        el mensaje queda pendiente y se pasa a la cola en cuanto el loop puede.
+        """
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        loop = self._running_loop()
+        if current is not None and loop in (None, current):
+            self._ensure_started()
+            return self._put(msg)
 
-        # Enviar correo
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(SMTP_USER, SMTP_PASSWORD)
-        server.send_message(msg)
-        server.quit()
+        with self._pending_lock:
+            if len(self._pending) >= self.max_queue:
+                return self._drop(msg)
+            self._pending.append(msg)
+        if loop is not None:
+            loop.call_soon_threadsafe(self._drain_pending)
+        return True
 
-        logger.info(f"Alerta enviada: {error_type}")
+    def _put(self, msg: MIMEMultipart) -> bool:
+        try:
+            self._queue.put_nowait(msg)
+        except asyncio.QueueFull:
+            return self._drop(msg)
         return True
 
-    except Exception as e:
-        logger.error(f"Error al enviar alerta: {e}")
+    def _drop(self, msg: MIMEMultipart) -> bool:
+        self.stats["dropped"] += 1
+        logger.warning(f"Cola de notificaciones llena: {msg['Subject']} descartado")
         return False
 
+    def _drain_pending(self):
+        """Pasa a la cola los mensajes pendientes (en el loop del envío)."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, deque()
+        for msg in pending:
+            self._put(msg)
 
-def send_completion_notification(client_info: Dict[str, Any], proposal_id: str) -> bool:
-    """
-    Envía una notificación cuando se completa un cuestionario
+    async def _run(self):
+        while True:
+            try:
+                first = await asyncio.wait_for(self._queue.get(), self.idle_timeout)
+            except asyncio.TimeoutError:
+                # Sin mensajes: se libera la conexión hasta el próximo envío
+                await self.transport.close()
+                continue
+            batch = [first]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                sent = await self.transport.send(batch)
+            except Exception as e:
+                logger.error(f"Error al enviar notificaciones: {e}")
+                sent = 0
+            self.stats["sent"] += sent
+            self.stats["failed"] += len(batch) - sent
+            for _ in batch:
+                self._queue.task_done()
 
-    Args:
-        client_info: Información del cliente
-        proposal_id: ID de la propuesta generada
+    def snapshot(self) -> Dict[str, int]:
+        return {
+            "queued": (self._queue.qsize() if self._queue else 0) + len(self._pending),
+            **self.stats,
+        }
 
-    Returns:
-        bool: True si se envió correctamente, False en caso contrario
-    """
-    if not SMTP_SERVER or not SMTP_USER or not ALERT_RECIPIENTS:
-        logger.warning(
-            "No se puede enviar notificación: configuración de correo incompleta"
+
+def _default_transport() -> NotificationTransport:
+    if SMTP_SERVER and SMTP_USER and ALERT_RECIPIENTS:
+        return SmtpTransport(
+            SMTP_SERVER, SMTP_PORT, SMTP_USER, SMTP_PASSWORD, starttls=SMTP_STARTTLS
         )
-        return False
+    return LoggingTransport()
 
-    try:
-        # Crear mensaje
-        msg = MIMEMultipart()
-        msg["From"] = SMTP_USER
-        msg["To"] = ", ".join(ALERT_RECIPIENTS)
-        msg["Subject"] = f"Nueva propuesta generada: {proposal_id}"
 
-        # Cuerpo del mensaje
-        body = f"""
+# Instancia global
+notification_dispatcher = NotificationDispatcher(_default_transport())
+
+
+# --- Mensajes ---
+
+
+def _message(subject: str, body: str) -> MIMEMultipart:
+    msg = MIMEMultipart()
+    msg["From"] = SMTP_USER
+    msg["To"] = ", ".join(ALERT_RECIPIENTS)
+    msg["Subject"] = subject
+    msg.attach(MIMEText(body, "html"))
+    return msg
+
+
+def build_error_alert(
+    error_type: str,
+    description: str,
+    details: Optional[Dict[str, Any]] = None,
+    repeated: int = 0,
+) -> MIMEMultipart:
+    """Correo de alerta de error (repeated: alertas iguales omitidas antes)."""
+    body = f"""
+        <html>
+        <body>
+            <h2>Alerta de Error en Chatbot Hydrous</h2>
+            <p><strong>Tipo de Error:</strong> {error_type}</p>
+            <p><strong>Fecha y Hora:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
+            <p><strong>Descripción:</strong> {description}</p>
+        """
+
+    if repeated:
+        body += f"<p><strong>Repeticiones omitidas desde la última alerta:</strong> {repeated}</p>"
+
+    if details:
+        body += "<h3>Detalles adicionales:</h3><ul>"
+        for key, value in details.items():
+            body += f"<li><strong>{key}:</strong> {value}</li>"
+        body += "</ul>"
+
+    body += """
+            <p>Este es un mensaje automático generado por el sistema de monitoreo del Chatbot Hydrous.</p>
+        </body>
+        </html>
+        """
+    return _message(f"[ALERTA] Error en Chatbot Hydrous: {error_type}", body)
+
+
+def build_completion_notification(
+    client_info: Dict[str, Any], proposal_id: str
+) -> MIMEMultipart:
+    """Correo de aviso de una nueva propuesta."""
+    body = f"""
         <html>
         <body>
             <h2>Nueva Propuesta de Tratamiento de Agua</h2>
             <p>Se ha generado una nueva propuesta a través del chatbot.</p>
-            
+
             <h3>Información del Cliente:</h3>
             <ul>
                 <li><strong>Empresa:</strong> {client_info.get('name', 'No especificado')}</li>
                 <li><strong>Sector:</strong> {client_info.get('sector', 'No especificado')} - {client_info.get('subsector', 'No especificado')}</li>
                 <li><strong>Ubicación:</strong> {client_info.get('location', 'No especificada')}</li>
             </ul>
-            
+
             <p><strong>ID de Propuesta:</strong> {proposal_id}</p>
             <p><strong>Fecha y Hora:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-            
+
             <p>Puede acceder al sistema administrativo para ver los detalles completos de esta propuesta.</p>
         </body>
         </html>
         """
+    return _message(f"Nueva propuesta generada: {proposal_id}", body)
 
-        msg.attach(MIMEText(body, "html"))
 
-        # Enviar correo
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(SMTP_USER, SMTP_PASSWORD)
-        server.send_message(msg)
-        server.quit()
+# --- API ---
 
-        logger.info(f"Notificación enviada: nueva propuesta {proposal_id}")
-        return True
 
-    except Exception as e:
-        logger.error(f"Error al enviar notificación: {e}")
+def send_error_alert(
+    error_type: str,
+    description: str,
+    details: Optional[Dict[str, Any]] = None,
+    dispatcher: Optional[NotificationDispatcher] = None,
+) -> bool:
+    """
+    Encola una alerta por correo sobre un error crítico
+
+    Args:
+        error_type: Tipo de error
+        description: Descripción del error
+        details: Detalles adicionales
+        dispatcher: Cola de envío (por defecto la global)
+
+    Returns:
+        bool: True si se encoló, False si se omitió (repetida o cola llena)
+    """
+    dispatcher = dispatcher or notification_dispatcher
+    key = f"{error_type}:{description}"
+    repeated = dispatcher.throttle(key)
+    if repeated is None:
+        logger.info(f"Alerta repetida omitida: {error_type}")
         return False
+    queued = dispatcher.enqueue(
+        build_error_alert(error_type, description, details, repeated)
+    )
+    if queued:
+        # Solo cuenta como enviada si se encoló: con la cola llena, la
+        # siguiente alerta igual no queda silenciada
+        dispatcher.record(key)
+        logger.info(f"Alerta encolada: {error_type}")
+    return queued
+
+
+def send_completion_notification(
+    client_info: Dict[str, Any],
+    proposal_id: str,
+    dispatcher: Optional[NotificationDispatcher] = None,
+) -> bool:
+    """
+    Encola una notificación cuando se completa un cuestionario
+
+    Args:
+        client_info: Información del cliente
+        proposal_id: ID de la propuesta generada
+        dispatcher: Cola de envío (por defecto la global)
+
+    Returns:
+        bool: True si se encoló, False si la cola está llena
+    """
+    dispatcher = dispatcher or notification_dispatcher
+    queued = dispatcher.enqueue(build_completion_notification(client_info, proposal_id))
+    if queued:
+        logger.info(f"Notificación encolada: nueva propuesta {proposal_id}")
+    return queued
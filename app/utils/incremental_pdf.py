@@ -0,0 +1,75 @@
+# app/utils/incremental_pdf.py
+"""
+Documento ReportLab que se maqueta de forma incremental.
+
+SimpleDocTemplate.build() necesita todos los flowables antes de empezar. Esta
+variante expone start()/add()/finish() para ir maquetando páginas a medida que
+llegan los flowables (p.ej. desde un LLM en streaming), de modo que al final solo
+queda cerrar el documento.
+"""
+from typing import Iterable
+
+from reportlab.platypus import Flowable, Frame, PageTemplate, SimpleDocTemplate
+
+
+def _do_nothing(canvas, doc):
+    pass
+
+
+class IncrementalDocTemplate(SimpleDocTemplate):
+    """SimpleDocTemplate con maquetación incremental (start → add* → finish)."""
+
+    def start(self, onFirstPage=_do_nothing, onLaterPages=_do_nothing):
+        """Prepara las plantillas de página y abre el canvas (equivale al inicio de build)."""
+        self._calc()
+        frame = Frame(
+            self.leftMargin, self.bottomMargin, self.width, self.height, id="normal"
+        )
+        self.addPageTemplates(
+            [
+                PageTemplate(
+                    id="First", frames=frame, onPage=onFirstPage, pagesize=self.pagesize
+                ),
+                PageTemplate(
+                    id="Later",
+                    frames=frame,
+                    onPage=onLaterPages,
+                    pagesize=self.pagesize,
+                ),
+            ]
+        )
+        self._startBuild()
+        self.canv._doctemplate = self
+        self._pending_flowables = []
+        self.flowables_laid_out = 0
+
+    def add(self, flowables: Iterable[Flowable]):
+        """Añade flowables y maqueta todos los que ya no dependen de los siguientes."""
+        self._pending_flowables.extend(flowables)
+        self._layout(self._retained_count())
+
+    def finish(self):
+        """Maqueta lo pendiente y escribe el PDF."""
+        try:
+            self._layout(0)
+        finally:
+            del self.canv._doctemplate
+        self._endBuild()
+
+    def _retained_count(self) -> int:
+        """
+        Número de flowables finales que se retienen: el último, más la racha previa
+        con keepWithNext, porque su colocación depende del flowable que venga después.
+        """
+        pending = self._pending_flowables
+        index = len(pending) - 1
+        while index > 0 and pending[index - 1].getKeepWithNext():
+            index -= 1
+        return len(pending) - max(index, 0)
+
+    def _layout(self, retain: int):
+        pending = self._pending_flowables
+        while len(pending) > retain:
+            self.clean_hanging()
+            self.handle_flowable(pending)
+            self.flowables_laid_out += 1
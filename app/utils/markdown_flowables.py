@@ -0,0 +1,174 @@
+# app/utils/markdown_flowables.py
+"""
+Parser incremental de markdown de propuestas a flowables de ReportLab.
+
+Consume el texto por fragmentos (por ejemplo, directamente de una respuesta del
+LLM en streaming) y produce flowables a medida que se completan líneas y tablas.
+Soporta encabezados, líneas "**Título**", listas (-, *, •, ✓, 1.), tablas con
+pipes y negrita/cursiva en línea.
+"""
+
+import re
+from typing import AsyncIterable, Iterable, Iterator, List, Mapping, Optional
+from xml.sax.saxutils import escape
+
+from reportlab.lib.units import cm
+from reportlab.platypus import Flowable, Paragraph, Spacer, Table
+
+from app.utils import pdf_theme
+
+# --- Expresiones precompiladas ---
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)$")
+_BOLD_LINE_RE = re.compile(r"^\*\*([^*]+)\*\*:?$")
+_BULLET_RE = re.compile(r"^[-*•]\s+(.*)$")
+_CHECK_RE = re.compile(r"^✓\s*(.*)$")
+_NUMBERED_RE = re.compile(r"^(\d+)[.)]\s+(.*)$")
+_RULE_RE = re.compile(r"^(?:-{3,}|\*{3,}|_{3,})$")
+_TABLE_SEPARATOR_RE = re.compile(r"^\|?\s*:?-{2,}:?\s*(?:\|\s*:?-{2,}:?\s*)*\|?$")
+_BOLD_RE = re.compile(r"\*\*(.+?)\*\*")
+_ITALIC_RE = re.compile(r"(?<![*\w])\*(?!\s)([^*]+?)\*(?![*\w])")
+
+
+def format_inline(text: str) -> str:
+    """Escapa XML y convierte negrita/cursiva markdown a etiquetas de ReportLab."""
+    text = escape(text)
+    text = _BOLD_RE.sub(r"<b>\1</b>", text)
+    return _ITALIC_RE.sub(r"<i>\1</i>", text)
+
+
+class MarkdownFlowableParser:
+    """Convierte markdown en flowables de forma incremental (feed/close)."""
+
+    def __init__(
+        self,
+        styles: Mapping = pdf_theme.STYLES,
+        table_style=pdf_theme.TABLE_STYLE,
+        table_width: float = pdf_theme.TABLE_WIDTH,
+    ):
+        # Compartidos y de solo lectura (ver pdf_theme.document_styles)
+        self.styles = styles
+        self.table_style = table_style
+        self.table_width = table_width
+        self._pending = ""  # Línea incompleta del último fragmento
+        self._table_rows: List[List[str]] = []
+
+    def feed(self, chunk: str) -> Iterator[Flowable]:
+        """Procesa un fragmento de texto y produce los flowables de las líneas completas."""
+        if not chunk:
+            return
+        self._pending += chunk
+        if "\n" not in self._pending:
+            return
+        *lines, self._pending = self._pending.split("\n")
+        for line in lines:
+            yield from self._process_line(line)
+
+    def close(self) -> Iterator[Flowable]:
+        """Procesa lo que quede en el buffer y cierra una tabla abierta."""
+        if self._pending:
+            line, self._pending = self._pending, ""
+            yield from self._process_line(line)
+        yield from self._flush_table()
+
+    # --- Procesamiento por línea ---
+
+    def _process_line(self, raw_line: str) -> Iterator[Flowable]:
+        line = raw_line.strip()
+        if line.startswith("|"):
+            if not _TABLE_SEPARATOR_RE.match(line):
+                self._table_rows.append(self._split_cells(line))
+            return
+
+        # Cualquier otra línea cierra una tabla abierta
+        yield from self._flush_table()
+        if not line or _RULE_RE.match(line):
+            return
+
+        heading = _HEADING_RE.match(line)
+        if heading:
+            style = "title" if len(heading.group(1)) == 1 else "heading2"
+            yield Paragraph(format_inline(heading.group(2)), self.styles[style])
+            return
+
+        bold_line = _BOLD_LINE_RE.match(line)
+        if bold_line:
+            yield Paragraph(format_inline(bold_line.group(1)), self.styles["heading2"])
+            return
+
+        check = _CHECK_RE.match(line)
+        if check:
+            yield Paragraph(f"✓ {format_inline(check.group(1))}", self.styles["list"])
+            return
+
+        bullet = _BULLET_RE.match(line)
+        if bullet:
+            yield Paragraph(f"• {format_inline(bullet.group(1))}", self.styles["list"])
+            return
+
+        numbered = _NUMBERED_RE.match(line)
+        if numbered:
+            yield Paragraph(
+                f"{numbered.group(1)}. {format_inline(numbered.group(2))}",
+                self.styles["list"],
+            )
+            return
+
+        yield Paragraph(format_inline(line), self.styles["normal"])
+
+    @staticmethod
+    def _split_cells(line: str) -> List[str]:
+        cells = line.strip().strip("|").split("|")
+        return [cell.strip() for cell in cells]
+
+    def _flush_table(self) -> Iterator[Flowable]:
+        if not self._table_rows:
+            return
+        rows, self._table_rows = self._table_rows, []
+        table = self._build_table(rows)
+        if table is not None:
+            yield table
+            yield Spacer(1, 0.2 * cm)
+
+    def _build_table(self, rows: List[List[str]]) -> Optional[Table]:
+        # No se descarta ninguna columna: el ancho se reparte entre todas y las
+        # celdas (Paragraph) ajustan el texto en varias líneas
+        num_cols = max(len(row) for row in rows)
+        if num_cols == 0:
+            return None
+
+        header_style = self.styles["table_header"]
+        cell_style = self.styles["table_cell"]
+        data = []
+        for row_index, row in enumerate(rows):
+            # Normalizar filas irregulares al número de columnas de la tabla
+            cells = (row + [""] * num_cols)[:num_cols]
+            style = header_style if row_index == 0 else cell_style
+            data.append(
+                [Paragraph(format_inline("" if c == "-" else c), style) for c in cells]
+            )
+
+        col_widths = [self.table_width / num_cols] * num_cols
+        return Table(data, repeatRows=1, colWidths=col_widths, style=self.table_style)
+
+
+def iter_flowables(chunks: Iterable[str]) -> Iterator[Flowable]:
+    """Genera flowables a partir de un iterable de fragmentos de texto."""
+    parser = MarkdownFlowableParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+async def aiter_flowables(chunks: AsyncIterable[str]):
+    """Versión asíncrona de iter_flowables (p.ej. para respuestas en streaming)."""
+    parser = MarkdownFlowableParser()
+    async for chunk in chunks:
+        for flowable in parser.feed(chunk):
+            yield flowable
+    for flowable in parser.close():
+        yield flowable
+
+
+def markdown_to_flowables(text: str) -> List[Flowable]:
+    """Convierte un texto markdown completo en una lista de flowables."""
+    return list(iter_flowables([text]))
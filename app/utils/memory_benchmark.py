@@ -0,0 +1,102 @@
+# app/utils/memory_benchmark.py
+"""
+Mide la memoria por conversación de la representación interna (Message y
+Conversation con __slots__) frente a la anterior basada en modelos Pydantic,
+que se replica aquí solo para comparar:
+
+    python -m app.utils.memory_benchmark [conversaciones] [mensajes]
+"""
+
+import sys
+import tracemalloc
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+from pydantic import BaseModel, Field
+
+from app.models.conversation import Conversation
+from app.models.message import Message
+
+
+class LegacyMessage(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    role: str
+    content: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class LegacyConversation(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    messages: List[LegacyMessage] = []
+    metadata: Dict[str, Any] = Field(default_factory=dict)
+
+
+def _metadata(i: int) -> Dict[str, Any]:
+    return {
+        "current_question_id": "ITX_5",
+        "collected_data": {"ITX_1": "Textil", "ITX_3": 300.0},
+        "selected_sector": "Industrial",
+        "selected_subsector": "Textil",
+        "questionnaire_path": [],
+        "is_complete": False,
+        "has_proposal": False,
+        "proposal_text": None,
+        "pdf_path": None,
+        "client_name": f"Cliente {i}",
+        "last_error": None,
+    }
+
+
+def _contents(i: int, n_messages: int) -> List[tuple]:
+    # Textos nuevos en cada conversación, como los que llegan por la API
+    return [
+        (
+            ("assistant", f"**PREGUNTA:** Pregunta {j} de la conversación {i}. " * 3)
+            if j % 2 == 0
+            else ("user", f"Respuesta {j}-{i}")
+        )
+        for j in range(n_messages)
+    ]
+
+
+def build_legacy(i: int, n_messages: int) -> LegacyConversation:
+    conversation = LegacyConversation(metadata=_metadata(i))
+    for role, content in _contents(i, n_messages):
+        conversation.messages.append(LegacyMessage(role=role, content=content))
+    return conversation
+
+
+def build_compact(i: int, n_messages: int) -> Conversation:
+    conversation = Conversation(metadata=_metadata(i))
+    for role, content in _contents(i, n_messages):
+        conversation.add_message(Message(role=role, content=content))
+    return conversation
+
+
+def bytes_per_conversation(
+    build: Callable[[int, int], Any], n_conversations: int, n_messages: int
+) -> float:
+    """Bytes asignados (tracemalloc) por conversación, incluidos los textos."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    conversations = [build(i, n_messages) for i in range(n_conversations)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del conversations
+    return (after - before) / n_conversations
+
+
+def run(n_conversations: int = 1000, n_messages: int = 20) -> Dict[str, float]:
+    legacy = bytes_per_conversation(build_legacy, n_conversations, n_messages)
+    compact = bytes_per_conversation(build_compact, n_conversations, n_messages)
+    return {"legacy": legacy, "compact": compact, "ratio": compact / legacy}
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    result = run(*args)
+    print(f"Pydantic (anterior): {result['legacy']:.0f} bytes/conversación")
+    print(f"__slots__ (actual):  {result['compact']:.0f} bytes/conversación")
+    print(f"Relación: {result['ratio']:.2f}")
@@ -0,0 +1,186 @@
+# app/utils/pdf_theme.py
+"""
+Tema de renderizado compartido para los PDFs de propuestas.
+
+Se construye una sola vez al importar el módulo: fuentes registradas, estilos de
+párrafo y estilos de tabla. Los generadores de PDF reutilizan estos objetos en
+lugar de crearlos en cada render y NO deben modificarlos; un documento que
+necesite cambiar algún estilo lo pide a document_styles().
+"""
+
+import logging
+import os
+from types import MappingProxyType
+from typing import Any, Mapping, Tuple
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import cm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import TableStyle
+
+logger = logging.getLogger("hydrous")
+
+# --- Colores y medidas ---
+PRIMARY_COLOR = colors.HexColor("#0056b3")
+HEADER_BACKGROUND = colors.HexColor("#f2f2f2")
+GRID_COLOR = colors.HexColor("#cccccc")
+FOOTER_COLOR = colors.HexColor("#555555")
+
+PAGE_SIZE = A4
+PAGE_MARGINS = {
+    "rightMargin": 1.5 * cm,
+    "leftMargin": 1.5 * cm,
+    "topMargin": 2 * cm,
+    "bottomMargin": 2 * cm,
+}
+# Ancho fijo disponible para tablas
+TABLE_WIDTH = 16 * cm
+
+# Fuentes TTF con soporte Unicode (✓, ≤, ³...). Si no están disponibles se usa Helvetica.
+_FONT_DIRS = [
+    os.getenv("PDF_FONT_DIR", ""),
+    "/usr/share/fonts/truetype/dejavu",
+    "/usr/share/fonts/dejavu",
+    "/Library/Fonts",
+]
+_FONT_FILES = ("DejaVuSans.ttf", "DejaVuSans-Bold.ttf")
+
+
+def _register_fonts() -> Tuple[str, str]:
+    """Registra la familia de fuentes del tema una sola vez. Devuelve (normal, negrita)."""
+    for font_dir in _FONT_DIRS:
+        if not font_dir:
+            continue
+        regular_path = os.path.join(font_dir, _FONT_FILES[0])
+        bold_path = os.path.join(font_dir, _FONT_FILES[1])
+        if os.path.exists(regular_path) and os.path.exists(bold_path):
+            try:
+                pdfmetrics.registerFont(TTFont("HydrousSans", regular_path))
+                pdfmetrics.registerFont(TTFont("HydrousSans-Bold", bold_path))
+                pdfmetrics.registerFontFamily(
+                    "HydrousSans",
+                    normal="HydrousSans",
+                    bold="HydrousSans-Bold",
+                    italic="HydrousSans",
+                    boldItalic="HydrousSans-Bold",
+                )
+                logger.info(f"Fuentes PDF registradas desde: {font_dir}")
+                return "HydrousSans", "HydrousSans-Bold"
+            except Exception as e:
+                logger.warning(f"No se pudieron registrar fuentes en {font_dir}: {e}")
+    logger.info("Fuentes TTF no encontradas, usando Helvetica para PDFs.")
+    return "Helvetica", "Helvetica-Bold"
+
+
+FONT_REGULAR, FONT_BOLD = _register_fonts()
+
+
+def _build_styles() -> Mapping[str, ParagraphStyle]:
+    """Construye los estilos de párrafo del tema."""
+    sample = getSampleStyleSheet()
+    normal = ParagraphStyle(
+        name="HydrousNormal",
+        parent=sample["Normal"],
+        fontName=FONT_REGULAR,
+        fontSize=10,
+        spaceAfter=6,
+        leading=12,
+    )
+    styles = {
+        # Título principal
+        "title": ParagraphStyle(
+            name="HydrousTitle",
+            parent=sample["Heading1"],
+            fontName=FONT_BOLD,
+            fontSize=16,
+            textColor=PRIMARY_COLOR,
+            spaceAfter=10,
+            alignment=TA_CENTER,
+        ),
+        # Encabezados de sección
+        "heading2": ParagraphStyle(
+            name="HydrousHeading2",
+            parent=sample["Heading2"],
+            fontName=FONT_BOLD,
+            fontSize=14,
+            textColor=PRIMARY_COLOR,
+            spaceAfter=8,
+            spaceBefore=12,
+        ),
+        # Texto normal
+        "normal": normal,
+        # Listas
+        "list": ParagraphStyle(
+            name="HydrousList",
+            parent=normal,
+            leftIndent=15,
+            spaceAfter=3,
+            bulletIndent=8,
+        ),
+        # Celdas de tabla (Paragraph para que el texto haga salto de línea)
+        "table_header": ParagraphStyle(
+            name="HydrousTableHeader",
+            parent=normal,
+            fontName=FONT_BOLD,
+            textColor=PRIMARY_COLOR,
+            spaceAfter=0,
+        ),
+        "table_cell": ParagraphStyle(
+            name="HydrousTableCell",
+            parent=normal,
+            fontSize=9,
+            leading=11,
+            spaceAfter=0,
+        ),
+    }
+    return MappingProxyType(styles)
+
+
+STYLES = _build_styles()
+
+
+def document_styles(**overrides: Mapping[str, Any]) -> Mapping[str, ParagraphStyle]:
+    """
+    Estilos para un documento que cambia alguno, p.ej.
+    document_styles(normal={"fontSize": 11}): solo se clonan los estilos de
+    `overrides` (clave -> atributos); el resto se comparte con STYLES.
+    """
+    if not overrides:
+        return STYLES
+    styles = dict(STYLES)
+    for key, attributes in overrides.items():
+        styles[key] = STYLES[key].clone(STYLES[key].name, **attributes)
+    return MappingProxyType(styles)
+
+
+# Estilo común para las tablas de la propuesta
+TABLE_STYLE = TableStyle(
+    [
+        # Encabezado
+        ("BACKGROUND", (0, 0), (-1, 0), HEADER_BACKGROUND),
+        ("TEXTCOLOR", (0, 0), (-1, 0), PRIMARY_COLOR),
+        ("FONTNAME", (0, 0), (-1, 0), FONT_BOLD),
+        ("FONTSIZE", (0, 0), (-1, 0), 10),
+        ("BOTTOMPADDING", (0, 0), (-1, 0), 6),
+        # Cuerpo
+        ("FONTNAME", (0, 1), (-1, -1), FONT_REGULAR),
+        ("FONTSIZE", (0, 1), (-1, -1), 9),
+        ("GRID", (0, 0), (-1, -1), 0.25, GRID_COLOR),
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ("PADDING", (0, 0), (-1, -1), 4),
+    ]
+)
+
+
+def draw_page_footer(canvas, doc):
+    """Añade número de página al pie de página."""
+    canvas.saveState()
+    canvas.setFont(FONT_REGULAR, 9)
+    canvas.setFillColor(FOOTER_COLOR)
+    footer_text = f"Página {canvas.getPageNumber()} | Hydrous Management Group"
+    canvas.drawCentredString(doc.width / 2 + doc.leftMargin, 1 * cm, footer_text)
+    canvas.restoreState()
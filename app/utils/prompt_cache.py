@@ -0,0 +1,135 @@
+# app/utils/prompt_cache.py
+"""
+Soporte para el caché de prompts del proveedor del LLM.
+
+El proveedor reutiliza los tokens de un prefijo ya visto solo si es idéntico
+byte a byte, por eso el prompt maestro se divide en un prefijo estático y un
+sufijo con el estado de la conversación. Este módulo registra los tokens
+cacheados que informa la API y permite comprobar que el prefijo no cambia entre
+turnos:
+
+    python -m app.utils.prompt_cache
+"""
+
+import logging
+import sys
+from typing import Any, Dict, List, Optional
+
+from app.utils.serialization import dumps_json
+
+logger = logging.getLogger("hydrous")
+
+
+class PromptCacheStats:
+    """Acumula los tokens de prompt enviados y los que el proveedor sirvió del caché."""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def record(self, usage: Optional[Dict[str, Any]]) -> int:
+        """
+        Registra el bloque "usage" de una respuesta de la API. Devuelve los tokens
+        cacheados de esa llamada (0 si el proveedor no los informa).
+        """
+        if not usage:
+            return 0
+        details = usage.get("prompt_tokens_details") or {}
+        cached = int(details.get("cached_tokens") or 0)
+        prompt = int(usage.get("prompt_tokens") or 0)
+        self.calls += 1
+        self.prompt_tokens += prompt
+        self.cached_tokens += cached
+        logger.info(f"Tokens de prompt: {prompt} (cacheados: {cached})")
+        return cached
+
+    @property
+    def hit_rate(self) -> float:
+        if not self.prompt_tokens:
+            return 0.0
+        return self.cached_tokens / self.prompt_tokens
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "hit_rate": round(self.hit_rate, 4),
+        }
+
+
+# Instancia global
+prompt_cache_stats = PromptCacheStats()
+
+
+def _simulated_conversations() -> List[Any]:
+    """Conversaciones en distintos momentos del cuestionario."""
+    from app.models.conversation import Conversation
+    from app.models.message import Message
+
+    first = Conversation()
+
+    middle = Conversation()
+    middle.metadata.update(
+        selected_sector="Industrial",
+        current_question_asked_summary="¿Cuál es el costo del agua?",
+        last_user_message_content="Industrial",
+    )
+    middle.add_message(Message.assistant("**PREGUNTA:** ¿En qué sector opera?"))
+    middle.add_message(Message.user("Industrial"))
+
+    long = Conversation()
+    long.metadata.update(
+        selected_sector="Industrial",
+        selected_subsector="Textil",
+        collected_data={"ITX_3": 300.0},
+    )
+    for i in range(10):
+        long.add_message(Message.assistant(f"**PREGUNTA:** Pregunta {i}"))
+        long.add_message(Message.user(f"Respuesta {i}"))
+
+    return [first, middle, long]
+
+
+def _cacheable_prefix(messages: List[Dict[str, str]]) -> bytes:
+    """
+    Bytes de los mensajes de sistema que preceden al primer elemento dinámico
+    (el historial o, sin historial, el sufijo con el estado).
+    """
+    end = next(
+        (i for i, message in enumerate(messages) if message["role"] != "system"),
+        len(messages) - 1,
+    )
+    return dumps_json(messages[:end])
+
+
+def check_prefix_stability(conversations: Optional[List[Any]] = None) -> bool:
+    """
+    Prepara los mensajes de varias conversaciones y comprueba que su prefijo
+    cacheable sea idéntico byte a byte. El prefijo estático se vuelve a generar
+    desde la plantilla para cada conversación (sin la copia en memoria), de modo
+    que un dato que varíe entre turnos o conversaciones se detecta.
+    """
+    from app.prompts import main_prompt_llm_driven
+    from app.services.ai_service import ai_service
+
+    cached_prefix = main_prompt_llm_driven._static_prompt_prefix
+    prefixes = set()
+    try:
+        for conversation in conversations or _simulated_conversations():
+            main_prompt_llm_driven._static_prompt_prefix = None
+            messages = ai_service._prepare_messages(conversation)
+            prefixes.add(_cacheable_prefix(messages))
+    finally:
+        main_prompt_llm_driven._static_prompt_prefix = cached_prefix
+    if len(prefixes) != 1:
+        logger.error(f"El prefijo del prompt varía entre turnos ({len(prefixes)})")
+        return False
+    return True
+
+
+if __name__ == "__main__":
+    stable = check_prefix_stability()
+    print("Prefijo estable" if stable else "Prefijo INESTABLE")
+    sys.exit(0 if stable else 1)
@@ -0,0 +1,170 @@
+# app/utils/serialization.py
+"""
+Serialización de conversaciones para el almacenamiento y las respuestas de la API.
+
+- JSON (API, caché de idempotencia): orjson, con soporte directo de datetime y
+  de los registros internos (Message, ConversationMetadata), sin pasar por la
+  validación de Pydantic.
+- Binario (backend Redis): msgpack. Cada mensaje es una fila
+  (uuid en 16 bytes, rol, texto, ts) y la metadata un mapa.
+
+Comparación de tiempos con una conversación grande:
+
+    python -m app.utils.serialization [mensajes]
+"""
+
+import json
+import sys
+import time
+from collections.abc import Mapping
+from datetime import date, datetime
+from typing import Any, Dict, List
+
+import msgpack
+import orjson
+
+from app.models.conversation import Conversation, ConversationMetadata
+from app.models.message import Message
+
+
+def _default(obj: Any) -> Any:
+    """Tipos que ni orjson ni msgpack conocen (equivale a json.dumps(default=str))."""
+    if isinstance(obj, Message):
+        return obj.to_dict()
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    return str(obj)
+
+
+# --- JSON ---
+
+
+def dumps_json(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def loads_json(data: Any) -> Any:
+    return orjson.loads(data)
+
+
+def message_payload(message: Message) -> Dict[str, Any]:
+    """Mensaje con el formato de MessageResponse."""
+    return {
+        "id": message.id,
+        "role": message.role,
+        "content": message.content,
+        "created_at": message.created_at,
+    }
+
+
+def conversation_payload(conversation: Conversation) -> Dict[str, Any]:
+    """Conversación con el formato de ConversationResponse."""
+    return {
+        "id": conversation.id,
+        "created_at": conversation.created_at,
+        "messages": [message_payload(m) for m in conversation.messages],
+        "metadata": conversation.metadata.to_dict(),
+    }
+
+
+# --- msgpack ---
+
+
+def pack(obj: Any) -> bytes:
+    return msgpack.packb(obj, default=_default, use_bin_type=True)
+
+
+def unpack(data: bytes) -> Any:
+    return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+def pack_message(message: Message) -> bytes:
+    return pack(message.to_row())
+
+
+def unpack_message(data: bytes) -> Message:
+    return Message.from_row(unpack(data))
+
+
+def pack_metadata(metadata: ConversationMetadata) -> bytes:
+    return pack(metadata.to_dict())
+
+
+def unpack_metadata(data: bytes) -> Dict[str, Any]:
+    return unpack(data)
+
+
+def pack_conversation(conversation: Conversation) -> bytes:
+    return pack(
+        (
+            conversation.id,
+            conversation.ts,
+            conversation.metadata.to_dict(),
+            [m.to_row() for m in conversation.messages],
+        )
+    )
+
+
+def unpack_conversation(data: bytes) -> Conversation:
+    conversation_id, ts, metadata, rows = unpack(data)
+    return Conversation(
+        id=conversation_id,
+        ts=ts,
+        metadata=metadata,
+        messages=[Message.from_row(row) for row in rows],
+    )
+
+
+def _timeit(fn, repeat: int = 20) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def compare(n_messages: int = 400) -> List[str]:
+    """Tiempo de ida y vuelta (ms) y tamaño de cada formato para una conversación."""
+    from app.models.conversation import ConversationResponse
+    from app.models.message import MessageResponse
+
+    conversation = Conversation(
+        metadata={"collected_data": {"ITX_1": "Textil", "ITX_3": 300.0}}
+    )
+    for i in range(n_messages):
+        role = "assistant" if i % 2 == 0 else "user"
+        conversation.add_message(Message(role, f"**PREGUNTA:** Texto {i}. " * 8))
+
+    def pydantic_round_trip():
+        response = ConversationResponse(
+            id=conversation.id,
+            created_at=conversation.created_at,
+            messages=[MessageResponse.from_message(m) for m in conversation.messages],
+            metadata=conversation.metadata.to_dict(),
+        )
+        return ConversationResponse.model_validate_json(response.model_dump_json())
+
+    def json_round_trip():
+        data = {
+            "ts": conversation.ts,
+            "metadata": json.dumps(conversation.metadata.to_dict(), default=str),
+            "messages": [json.dumps(m.to_dict()) for m in conversation.messages],
+        }
+        return [Message.from_dict(json.loads(m)) for m in data["messages"]]
+
+    lines = [
+        f"Pydantic (API):   {_timeit(pydantic_round_trip):7.2f} ms",
+        f"orjson (API):     {_timeit(lambda: loads_json(dumps_json(conversation_payload(conversation)))):7.2f} ms",
+        f"json (Redis):     {_timeit(json_round_trip):7.2f} ms",
+        f"msgpack (Redis):  {_timeit(lambda: unpack_conversation(pack_conversation(conversation))):7.2f} ms",
+        f"Tamaño JSON / msgpack: {len(dumps_json(conversation_payload(conversation)))}"
+        f" / {len(pack_conversation(conversation))} bytes",
+    ]
+    return lines
+
+
+if __name__ == "__main__":
+    print("\n".join(compare(*[int(a) for a in sys.argv[1:2]])))
@@ -0,0 +1,176 @@
+# app/utils/units.py
+"""
+Interpretación local de cantidades en respuestas libres: números, caudales,
+costos unitarios del agua y parámetros de calidad (p.ej. "350 m3/dia",
+"10,000 m³/mes", "5 L/s", "60 MXN/m³", "DQO 1200 mg/L").
+"""
+
+import re
+from typing import Dict, Optional, Tuple
+
+# Tipo de cambio por defecto para convertir costos en MXN a USD
+MXN_PER_USD = 18.0
+
+# Rango plausible de un costo unitario de agua; fuera de él la respuesta no es
+# un precio por m³ (p.ej. un importe mensual sin volumen)
+UNIT_COST_USD_PER_M3_RANGE = (0.01, 50.0)
+
+# Número con separador de miles opcional y decimales con punto o coma. Un punto
+# seguido de exactamente tres dígitos es separador de miles ("1.200" → 1200),
+# salvo tras un cero ("0.500" → 0.5)
+_NUMBER_RE = re.compile(
+    r"(?<![\w.])([1-9]\d{0,2}(?:\.\d{3})+(?![\d.])|\d{1,3}(?:[,\s]\d{3})+|\d+)"
+    r"(?:[.,](\d+))?"
+)
+
+# Unidades de volumen → factor a m³
+_VOLUME_UNITS = [
+    (re.compile(r"m\s*(?:3|³)|metros?\s+c[uú]bicos?|mts?3", re.IGNORECASE), 1.0),
+    (re.compile(r"megalitros?", re.IGNORECASE), 1000.0),
+    (
+        re.compile(r"\bgal(?:ones|ón|on|lons?)?\b|\bgpd\b|\bgpm\b", re.IGNORECASE),
+        0.00378541,
+    ),
+    (re.compile(r"\blitros?\b|\bl\b|\blts?\b|\blps\b", re.IGNORECASE), 0.001),
+]
+
+# Periodos → número de periodos por día
+_PERIOD_UNITS = [
+    (
+        re.compile(r"/\s*s\b|\bseg(?:undo)?s?\b|\blps\b|por\s+segundo", re.IGNORECASE),
+        86400.0,
+    ),
+    (re.compile(r"\bgpm\b|/\s*min\b|\bminutos?\b", re.IGNORECASE), 1440.0),
+    (re.compile(r"/\s*h\b|\bhoras?\b|\bhr\b", re.IGNORECASE), 24.0),
+    (
+        re.compile(
+            r"/\s*d\b|\bd[ií]as?\b|\bdiari[oa]s?\b|\bday\b|\bgpd\b", re.IGNORECASE
+        ),
+        1.0,
+    ),
+    (re.compile(r"\bsemana(?:l|s)?\b|\bweek\b", re.IGNORECASE), 1 / 7),
+    (re.compile(r"\bmes(?:es)?\b|\bmensual(?:es)?\b|\bmonth\b", re.IGNORECASE), 1 / 30),
+    (re.compile(r"\baños?\b|\banual(?:es)?\b|\byear\b", re.IGNORECASE), 1 / 365),
+]
+
+_MXN_RE = re.compile(r"\bmxn\b|\bpesos?\b|\bmn\b", re.IGNORECASE)
+
+# Nombres con que se suele escribir cada parámetro de calidad en respuestas libres
+_PARAMETER_ALIASES = {
+    "TSS": r"SST|TSS|s[oó]lidos\s+suspendidos",
+    "COD": r"DQO|COD",
+    "BOD": r"DBO5?|BOD5?",
+    "FOG": r"GyA|G&A|FOG|grasas(?:\s+y\s+aceites)?",
+    "TDS": r"SDT|TDS|s[oó]lidos\s+disueltos",
+    "PH": r"pH",
+}
+_PARAMETER_VALUE_RES = {
+    key: re.compile(
+        rf"(?:{aliases})\b[^\d\n]{{0,25}}(\d[\d.,]*(?:\s*-\s*\d[\d.,]*)?)",
+        re.IGNORECASE,
+    )
+    for key, aliases in _PARAMETER_ALIASES.items()
+}
+
+
+def _match_to_float(match: re.Match) -> float:
+    integer_part = re.sub(r"[,.\s]", "", match.group(1))
+    decimals = match.group(2)
+    return float(f"{integer_part}.{decimals}" if decimals else integer_part)
+
+
+def parse_number(text: str) -> Optional[float]:
+    """Devuelve el primer número del texto (admite 10,000 / 10 000 / 1.200 / 3,5 / 3.5)."""
+    if not text:
+        return None
+    match = _NUMBER_RE.search(text)
+    return _match_to_float(match) if match else None
+
+
+def _volume_factor(text: str) -> Optional[float]:
+    for pattern, factor in _VOLUME_UNITS:
+        if pattern.search(text):
+            return factor
+    return None
+
+
+def parse_periods_per_day(text: str) -> Optional[float]:
+    """Número de periodos por día del periodo mencionado en el texto (p.ej. "/mes" → 1/30)."""
+    for pattern, per_day in _PERIOD_UNITS:
+        if pattern.search(text):
+            return per_day
+    return None
+
+
+def parse_flow_m3_per_day(
+    text: str, default_period_per_day: float = 1.0
+) -> Optional[float]:
+    """
+    Convierte un caudal libre a m³/día. Si no se indica volumen se asume m³;
+    si no se indica periodo se usa default_period_per_day (1.0 = por día).
+    """
+    value = parse_number(text)
+    if value is None:
+        return None
+    volume_factor = _volume_factor(text) or 1.0
+    per_day = parse_periods_per_day(text)
+    if per_day is None:
+        per_day = default_period_per_day
+    return value * volume_factor * per_day
+
+
+def parse_unit_cost_usd_per_m3(
+    text: str, mxn_per_usd: float = MXN_PER_USD
+) -> Optional[float]:
+    """
+    Convierte un costo unitario de agua (p.ej. "60 MXN/m³", "0.01 USD/galón") a
+    USD/m³. Devuelve None si el texto indica un periodo o un caudal ("15000 pesos
+    al mes", "50 gpm") o si el resultado no es un precio por m³ plausible.
+    """
+    value = parse_number(text)
+    if value is None or parse_periods_per_day(text) is not None:
+        return None
+    if _MXN_RE.search(text):
+        value /= mxn_per_usd
+    volume_factor = _volume_factor(text)
+    if volume_factor:
+        value /= volume_factor
+    low, high = UNIT_COST_USD_PER_M3_RANGE
+    return value if low <= value <= high else None
+
+
+def format_quantity(value: float, unit: str) -> str:
+    """Formatea una cantidad con separador de miles y su unidad."""
+    if value >= 100 or float(value).is_integer():
+        return f"{value:,.0f} {unit}"
+    return f"{value:,.2f} {unit}"
+
+
+def split_range(text: str) -> Tuple[Optional[float], Optional[float]]:
+    """Interpreta rangos tipo "200-400" o "<50". Devuelve (mínimo, máximo)."""
+    numbers = [_match_to_float(m) for m in _NUMBER_RE.finditer(text or "")]
+    if not numbers:
+        return None, None
+    if len(numbers) == 1:
+        return (None, numbers[0]) if "<" in text else (numbers[0], numbers[0])
+    return min(numbers[:2]), max(numbers[:2])
+
+
+def upper_value(text: str) -> Optional[float]:
+    """Valor conservador (el máximo) de un rango tipo "200-400" o "<50"."""
+    low, high = split_range(text or "")
+    return high if high is not None else low
+
+
+def parse_quality_parameters(text: str) -> Dict[str, float]:
+    """
+    Extrae parámetros de calidad de un texto libre (p.ej. "DQO 2000 mg/L, pH 9-11").
+    Devuelve {TSS/COD/BOD/FOG/TDS/PH: valor}; de los rangos se toma el máximo.
+    """
+    values: Dict[str, float] = {}
+    for key, pattern in _PARAMETER_VALUE_RES.items():
+        match = pattern.search(text or "")
+        value = upper_value(match.group(1)) if match else None
+        if value is not None:
+            values[key] = value
+    return values